@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# analytics.py — análise de DTMC com N estados (densas ou esparsas)
+import numpy as np
+
+
+def _is_sparse(P):
+    # scipy.sparse sem importar scipy: matrizes esparsas têm tocsr()
+    return hasattr(P, 'tocsr')
+
+
+def as_matrix(P):
+    """Matriz densa (ndarray float) ou esparsa CSR, conforme a entrada."""
+    if _is_sparse(P):
+        return P.tocsr().astype(float)
+    return np.asarray(P, dtype=float)
+
+
+def rates_vector(rates, n):
+    """Aceita dict {estado: Mbps} ou sequência; devolve vetor de tamanho n."""
+    if isinstance(rates, dict):
+        r = np.zeros(n)
+        for s, v in rates.items():
+            r[int(s)] = v
+        return r
+    r = np.asarray(rates, dtype=float)
+    if r.shape != (n,):
+        raise ValueError(f"rates deve ter {n} elementos, recebeu {r.shape}")
+    return r
+
+
+def initial_distribution(p0, n):
+    """p0 pode ser um estado (int) ou um vetor de probabilidades."""
+    if np.isscalar(p0):
+        v = np.zeros(n)
+        v[int(p0)] = 1.0
+        return v
+    return np.asarray(p0, dtype=float)
+
+
+def _left_mul(p, P):
+    # p @ P para P densa ou esparsa; p pode ser 1-D ou um lote (M x n)
+    if _is_sparse(P):
+        return np.asarray((P.T @ np.asarray(p).T).T)
+    return p @ P
+
+
+def stationary(P, method='auto', tol=1e-12, max_iter=100000):
+    """
+    Distribuição estacionária π (πP = π, Σπ = 1).
+    method: 'solve' (sistema linear), 'power' (iteração de potência) ou 'auto'
+    (solve para densas; para esparsas, spsolve se houver scipy, senão power).
+    """
+    P = as_matrix(P)
+    n = P.shape[0]
+    if method == 'auto':
+        method = 'solve'
+    if method == 'solve':
+        if _is_sparse(P):
+            try:
+                import scipy.sparse as sp
+                from scipy.sparse.linalg import spsolve
+            except ImportError:
+                return stationary(P, 'power', tol, max_iter)
+            # (P^T - I) com a última equação trocada por Σπ = 1
+            A = (P.T - sp.identity(n, format='csr')).tolil()
+            A[n - 1, :] = np.ones(n)
+            b = np.zeros(n)
+            b[-1] = 1.0
+            pi = spsolve(A.tocsc(), b)
+        else:
+            A = P.T - np.eye(n)
+            A[-1, :] = 1.0
+            b = np.zeros(n)
+            b[-1] = 1.0
+            pi = np.linalg.solve(A, b)
+        pi = np.clip(np.real(pi), 0.0, None)
+        return pi / pi.sum()
+    if method == 'power':
+        pi = np.full(n, 1.0 / n)
+        for _ in range(max_iter):
+            # passo "preguiçoso" (I+P)/2: converge também para cadeias periódicas
+            nxt = 0.5 * (pi + _left_mul(pi, P))
+            if np.abs(nxt - pi).sum() < tol:
+                pi = nxt
+                break
+            pi = nxt
+        return pi / pi.sum()
+    raise ValueError(f"método desconhecido: {method}")
+
+
+def k_step(P, k, p0=0):
+    """
+    Distribuição após k passos: p0 P^k. p0 pode ser estado, vetor ou lote (M x n).
+    Densa: P^k por quadrados sucessivos (log2 k produtos). Esparsa: k produtos
+    vetor-matriz, que não enchem a matriz.
+    """
+    P = as_matrix(P)
+    p = initial_distribution(p0, P.shape[0])
+    if _is_sparse(P):
+        for _ in range(int(k)):
+            p = _left_mul(p, P)
+        return p
+    return p @ np.linalg.matrix_power(P, int(k))
+
+
+def k_step_series(P, k, p0=0):
+    """Distribuições p0 P^t para t = 0..k-1, em uma matriz (k x n)."""
+    P = as_matrix(P)
+    p = initial_distribution(p0, P.shape[0])
+    out = np.empty((int(k), P.shape[0]))
+    for t in range(int(k)):
+        out[t] = p
+        p = _left_mul(p, P)
+    return out
+
+
+def deviation_vector(P, rates, pi=None):
+    """
+    g = Z r, com Z = (I - P + 1π)^-1 (matriz fundamental). Só para densas.
+    """
+    P = as_matrix(P)
+    if _is_sparse(P):
+        P = P.toarray()
+    n = P.shape[0]
+    pi = stationary(P) if pi is None else pi
+    r = rates_vector(rates, n)
+    return np.linalg.solve(np.eye(n) - P + np.outer(np.ones(n), pi), r)
+
+
+def expected_cumulative(P, rates, horizon, p0=0, pi=None):
+    """
+    Soma esperada de r(X_t) para t = 0..horizon-1 em forma fechada:
+        Σ p0 P^t r = n·π·r + (p0 - p0 P^n)·Z r
+    (Z = matriz fundamental). Custo independe do horizonte, salvo P^n.
+    Para esparsas grandes, cai na soma direta de k_step_series.
+    """
+    P = as_matrix(P)
+    n_states = P.shape[0]
+    r = rates_vector(rates, n_states)
+    p = initial_distribution(p0, n_states)
+    horizon = int(horizon)
+    if horizon <= 0:
+        return 0.0
+    if _is_sparse(P):
+        return float(k_step_series(P, horizon, p).dot(r).sum())
+    pi = stationary(P) if pi is None else pi
+    g = deviation_vector(P, r, pi)
+    pn = k_step(P, horizon, p)
+    return float(horizon * pi.dot(r) + (p - pn).dot(g))
+
+
+def expected_average(P, rates, horizon, p0=0):
+    """Taxa média esperada nos `horizon` primeiros passos."""
+    return expected_cumulative(P, rates, horizon, p0) / horizon if horizon > 0 else 0.0
+
+
+def main():
+    # mesmas contas de markov_exemplos/markov.m (dtmc do pacote queueing)
+    P = [[0.7, 0.2, 0.1], [0.3, 0.4, 0.3], [0.2, 0.3, 0.5]]
+    print("Distribuição estacionária π:")
+    print(stationary(P))
+    print("Distribuição após 2 passos:")
+    print(k_step(P, 2, [1, 0, 0]))
+    P = np.asarray(P)
+    print("Probabilidade de retornar ao estado 1 passando por 2:")
+    print(P[0, 1] * P[1, 0])
+    print("Probabilidade de retornar ao estado 1 passando por 3:")
+    print(P[0, 2] * P[2, 0])
+    rates = [0, 10, 50]
+    print(f"Taxa média teórica (estacionária): {stationary(P).dot(rates):.3f} Mbps")
+    print(f"Taxa média teórica (50 passos iniciando em 0): {expected_average(P, rates, 50):.3f} Mbps")
+
+
+if __name__ == '__main__':
+    main()
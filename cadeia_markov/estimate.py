@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# estimate.py — estima a matriz de transição a partir dos logs gravados
+import argparse
+import math
+import os
+import numpy as np
+from log_reader import ColumnReader
+
+CHUNK_ROWS = 65536
+
+
+def iter_state_chunks(path, chunk_rows=CHUNK_ROWS):
+    """
+    Lê um log em blocos e devolve (run_ids, steps, states) como arrays.
+    Só as colunas run_id/step/state são extraídas (log_reader.ColumnReader);
+    a saída bruta do iperf é pulada sem ser carregada.
+    Logs antigos sem run_id (traffic_log.csv, loopback.csv) usam o nome do
+    arquivo como run_id e a ordem das linhas como step.
+    """
+    reader = ColumnReader(path, columns=('run_id', 'step', 'state'))
+    if 'state' not in reader.header:
+        return
+    default_run = os.path.basename(path)
+    runs, steps, states = [], [], []
+    n = 0
+    for row, _ in reader.rows():
+        if not row['state']:
+            continue
+        n += 1
+        runs.append(row['run_id'] or default_run)
+        steps.append(int(row['step']) if row['step'] else n)
+        states.append(int(float(row['state'])))
+        if len(states) >= chunk_rows:
+            yield np.array(runs), np.array(steps), np.array(states)
+            runs, steps, states = [], [], []
+    if states:
+        yield np.array(runs), np.array(steps), np.array(states)
+
+
+class TransitionCounter:
+    """
+    Acumula contagens de transição por run_id de forma incremental (bloco a
+    bloco), guardando só o último (run, step, state) para emendar blocos.
+    Só conta pares de passos consecutivos do mesmo run.
+    """
+
+    def __init__(self, n_states):
+        self.n = n_states
+        self.counts = {}  # run_id -> matriz n x n de contagens
+        self.last = None  # (run_id, step, state) da última linha vista
+
+    def _grow(self, n):
+        if n <= self.n:
+            return
+        for run, c in self.counts.items():
+            g = np.zeros((n, n), dtype=np.int64)
+            g[:self.n, :self.n] = c
+            self.counts[run] = g
+        self.n = n
+
+    def add(self, runs, steps, states):
+        if len(states) == 0:
+            return
+        self._grow(int(states.max()) + 1)
+        if self.last is not None:
+            runs = np.concatenate(([self.last[0]], runs))
+            steps = np.concatenate(([self.last[1]], steps))
+            states = np.concatenate(([self.last[2]], states))
+        self.last = (runs[-1], steps[-1], states[-1])
+
+        ok = (runs[1:] == runs[:-1]) & (steps[1:] == steps[:-1] + 1)
+        src, dst, run = states[:-1][ok], states[1:][ok], runs[1:][ok]
+        for r in np.unique(run):
+            sel = run == r
+            c = self.counts.get(r)
+            if c is None:
+                c = self.counts[r] = np.zeros((self.n, self.n), dtype=np.int64)
+            flat = np.bincount(src[sel] * self.n + dst[sel], minlength=self.n * self.n)
+            c += flat.reshape(self.n, self.n)
+
+    def end_file(self):
+        # não emenda o fim de um arquivo com o começo do próximo
+        self.last = None
+
+    def total(self):
+        c = np.zeros((self.n, self.n), dtype=np.int64)
+        for m in self.counts.values():
+            c += m
+        return c
+
+
+def count_transitions(paths, n_states=3, chunk_rows=CHUNK_ROWS):
+    """Contagens por run_id (dict) a partir de um ou mais arquivos de log."""
+    counter = TransitionCounter(n_states)
+    for path in paths:
+        for runs, steps, states in iter_state_chunks(path, chunk_rows):
+            counter.add(runs, steps, states)
+        counter.end_file()
+    return counter
+
+
+def wilson_interval(k, n, z=1.96):
+    """IC de Wilson para proporções binomiais (vetorizado; n = 0 -> [0, 1])."""
+    k = np.asarray(k, dtype=float)
+    n = np.asarray(n, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = np.where(n > 0, k / n, 0.0)
+        denom = 1 + z * z / n
+        center = (p + z * z / (2 * n)) / denom
+        half = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+        lo = np.where(n > 0, center - half, 0.0)
+        hi = np.where(n > 0, center + half, 1.0)
+    return np.clip(lo, 0, 1), np.clip(hi, 0, 1)
+
+
+def _gammaincc(a, x):
+    # Q(a, x) regularizada (série / fração contínua, Numerical Recipes)
+    if x <= 0:
+        return 1.0
+    if x < a + 1:
+        term = total = 1.0 / a
+        ap = a
+        for _ in range(10000):
+            ap += 1
+            term *= x / ap
+            total += term
+            if abs(term) < abs(total) * 1e-15:
+                break
+        return max(0.0, 1.0 - total * math.exp(-x + a * math.log(x) - math.lgamma(a)))
+    b = x + 1 - a
+    c = 1 / 1e-300
+    d = 1 / b
+    h = d
+    for i in range(1, 10000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = 1e-300 if abs(d) < 1e-300 else d
+        c = b + an / c
+        c = 1e-300 if abs(c) < 1e-300 else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return math.exp(-x + a * math.log(x) - math.lgamma(a)) * h
+
+
+def chi2_sf(x, dof):
+    """P(X > x) para X ~ qui-quadrado(dof)."""
+    if dof <= 0:
+        return 1.0
+    return _gammaincc(dof / 2.0, x / 2.0)
+
+
+def estimate(counts, P=None, z=1.96):
+    """
+    MLE da matriz de transição a partir das contagens, com IC de Wilson por
+    entrada e, se P for dado, teste de aderência qui-quadrado por linha
+    (graus de liberdade: entradas com P > 0, menos 1, nas linhas visitadas).
+    Transições observadas onde P == 0 invalidam P (p-valor 0).
+    """
+    C = np.asarray(counts, dtype=float)
+    n_i = C.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        P_hat = np.where(n_i[:, None] > 0, C / n_i[:, None], 0.0)
+    lo, hi = wilson_interval(C, n_i[:, None], z)
+    out = {'counts': C.astype(np.int64), 'row_totals': n_i.astype(np.int64),
+           'P_hat': P_hat, 'ci_low': lo, 'ci_high': hi}
+    if P is None:
+        return out
+
+    P = np.asarray(P, dtype=float)
+    m = max(P.shape[0], C.shape[0])
+    Pm = np.zeros((m, m))
+    Pm[:P.shape[0], :P.shape[1]] = P
+    Cm = np.zeros((m, m))
+    Cm[:C.shape[0], :C.shape[1]] = C
+    n_m = Cm.sum(axis=1)
+    expected = n_m[:, None] * Pm
+    visited = n_m > 0
+    support = (Pm > 0) & visited[:, None]
+    impossible = int(Cm[(Pm == 0) & visited[:, None]].sum())
+    chi2 = float((((Cm - expected) ** 2)[support] / expected[support]).sum())
+    dof = int(support.sum() - visited.sum())
+    out.update({
+        'expected': expected,
+        'chi2': chi2,
+        'dof': dof,
+        'p_value': 0.0 if impossible else chi2_sf(chi2, dof),
+        'impossible_transitions': impossible,
+        # com poucas amostras o qui-quadrado é só indicativo
+        'min_expected': float(expected[support].min()) if support.any() else 0.0,
+    })
+    return out
+
+
+def _print_estimate(title, est):
+    print(f"=== {title} ===")
+    print(f"Transições: {int(est['row_totals'].sum())}  por estado: {est['row_totals'].tolist()}")
+    np.set_printoptions(precision=3, suppress=True)
+    print("P estimada (MLE):")
+    print(est['P_hat'])
+    print("IC 95% (Wilson) inferior / superior:")
+    print(est['ci_low'])
+    print(est['ci_high'])
+    if 'chi2' in est:
+        print(f"Qui-quadrado = {est['chi2']:.3f}  gl = {est['dof']}  p = {est['p_value']:.4f}"
+              f"  (menor esperado = {est['min_expected']:.1f})")
+        if est['impossible_transitions']:
+            print(f"Transições impossíveis sob P: {est['impossible_transitions']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estima P a partir dos logs (state por passo)")
+    parser.add_argument('logs', nargs='+', help="CSV(s) de log do gerador")
+    parser.add_argument('--by-run', action='store_true', help="estimativa separada por run_id")
+    parser.add_argument('--matrix', default=None, help="CSV com a P configurada (padrão: a 3x3 do exemplo)")
+    args = parser.parse_args()
+
+    P = [[0.7,0.2,0.1],[0.3,0.4,0.3],[0.2,0.3,0.5]]
+    if args.matrix:
+        P = np.loadtxt(args.matrix, delimiter=',', ndmin=2)
+    counter = count_transitions(args.logs, n_states=len(P))
+    if args.by_run:
+        for run, c in sorted(counter.counts.items()):
+            _print_estimate(f"run {run}", estimate(c, P))
+    _print_estimate(f"todos os runs ({len(counter.counts)})", estimate(counter.total(), P))
+
+
+if __name__ == '__main__':
+    main()
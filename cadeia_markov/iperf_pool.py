@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# iperf_pool.py — clientes iperf3 lançados antecipadamente, em rodízio de portas
+import itertools
+import json
+import math
+import subprocess
+import threading
+import time
+
+
+def iperf_seconds(epoch_duration):
+    """-t do iperf3 é inteiro (2.5 viraria 2, 0.5 viraria 0 = sem limite): arredonda para cima."""
+    return str(max(1, math.ceil(epoch_duration)))
+
+
+def supports_json_stream(binary='iperf3'):
+    """iperf3 >= 3.17 tem --json-stream (um evento JSON por linha, sem esperar o fim)."""
+    try:
+        out = subprocess.run([binary, '--help'], capture_output=True, text=True, timeout=5)
+    except Exception:
+        return False
+    return '--json-stream' in (out.stdout or '') + (out.stderr or '')
+
+
+def stream_to_json(stdout):
+    """Converte a saída --json-stream no mesmo formato do -J (só o bloco 'end')."""
+    for line in reversed((stdout or '').splitlines()):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            ev = json.loads(line)
+        except ValueError:
+            continue
+        if ev.get('event') == 'end':
+            return json.dumps({'end': ev.get('data', {})})
+    return ''
+
+
+class IperfClient:
+    """
+    Um processo iperf3 em andamento. Uma thread lê o stdout e marca o instante
+    do primeiro byte, para medir a latência spawn -> primeiro byte.
+    """
+
+    def __init__(self, cmd, port, json_stream=False):
+        self.cmd = cmd
+        self.port = port
+        self.json_stream = json_stream
+        self.t_spawn = time.time()
+        self.t_first_byte = None
+        self.first_byte = threading.Event()
+        self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        self._chunks = []
+        self._err = []
+        self._reader = threading.Thread(target=self._read_stdout, daemon=True)
+        self._reader.start()
+        # stderr também é drenado em paralelo: um PIPE cheio travaria o iperf3
+        self._err_reader = threading.Thread(target=self._read_stderr, daemon=True)
+        self._err_reader.start()
+
+    def _read_stdout(self):
+        for line in self.proc.stdout:
+            if self.t_first_byte is None:
+                self.t_first_byte = time.time()
+                self.first_byte.set()
+            self._chunks.append(line)
+        self.first_byte.set()  # libera quem espera mesmo se o processo morreu sem saída
+
+    def _read_stderr(self):
+        for line in self.proc.stderr:
+            self._err.append(line)
+
+    def startup_latency(self, seconds=None, t_exit=None):
+        """
+        Latência spawn -> primeiro byte. Com --json-stream o primeiro evento sai
+        logo após a conexão; com -J puro só há saída no fim, então estima-se
+        pelo tempo de parede menos a duração do teste (`seconds`).
+        """
+        if self.json_stream and self.t_first_byte is not None:
+            return self.t_first_byte - self.t_spawn
+        if seconds and t_exit:
+            return max(0.0, (t_exit - self.t_spawn) - seconds)
+        return None
+
+    def wait(self, timeout=None):
+        """Espera o fim do processo. Retorna (returncode, stdout_json, stdout_bruto, stderr)."""
+        try:
+            self.proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.kill()
+            raise
+        self._reader.join()
+        self._err_reader.join()
+        stderr = ''.join(self._err)
+        raw = ''.join(self._chunks)
+        out = stream_to_json(raw) if self.json_stream else raw
+        return self.proc.returncode, out, raw, stderr
+
+    def kill(self):
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+
+
+class IperfPipeline:
+    """
+    Lança clientes iperf3 em rodízio sobre um conjunto de portas do servidor
+    (um `iperf3 -s -p P` por porta), para que a próxima época possa conectar
+    enquanto a atual ainda termina no servidor anterior.
+    """
+
+    def __init__(self, server_ip, ports, binary='iperf3', json_stream=None):
+        self.server_ip = server_ip
+        self.ports = list(ports)
+        self.binary = binary
+        self.json_stream = supports_json_stream(binary) if json_stream is None else json_stream
+        self._ports = itertools.cycle(self.ports)
+
+    def launch(self, rate, epoch_duration):
+        port = next(self._ports)
+        cmd = [
+            self.binary,
+            "-c", self.server_ip,
+            "-p", str(port),
+            "-u",
+            "-b", f"{rate}M",
+            "-t", iperf_seconds(epoch_duration),
+            "-J"
+        ]
+        if self.json_stream:
+            cmd.append("--json-stream")
+        return IperfClient(cmd, port, json_stream=self.json_stream)
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# log_reader.py — leitura em fluxo dos CSVs do gerador, só com as colunas úteis
+import argparse
+import json
+import os
+
+# colunas usadas nos agregados; o resto (iperf_stdout_snippet, iperf_stderr...) é pulado
+COLUMNS = ('run_id', 'step', 'state', 'rate_Mbps', 'bytes_sent', 'duration_s',
+           'wall_start', 'wall_end')
+ALIASES = {'timestamp': 'wall_end'}  # logs antigos (loopback.csv, traffic_log.csv)
+
+
+READ_SIZE = 1 << 20
+
+
+def _skip_quoted(buf, p):
+    """
+    Índice logo após o campo entre aspas que começa em p (ou -1 se incompleto).
+    Procura direto os candidatos a fechamento ('",', '"\n' ou '"\r') e confere a
+    paridade da sequência de aspas que termina ali: ímpar = aspa de fechamento,
+    par = aspas escapadas ("") dentro do campo (o JSON do iperf tem muitas).
+    """
+    q = p + 1
+    while True:
+        # '"\n' só é procurado antes do próximo '",' (evita varrer o buffer inteiro)
+        c = buf.find(b'",', q)
+        bound = c if c >= 0 else len(buf)
+        n = buf.find(b'"\n', q, bound)
+        r = buf.find(b'"\r', q, n if n >= 0 else bound)  # arquivos com \r\n
+        cand = r if r >= 0 else (n if n >= 0 else c)
+        if cand < 0:
+            return -1  # precisa de mais dados
+        k = cand
+        while k > p + 1 and buf[k - 1] == 0x22:
+            k -= 1
+        if (cand - k) % 2 == 0:
+            return cand + 1
+        q = cand + 1
+
+
+def _scan_quoted(buf, pos, wanted, out):
+    """
+    Percorre um registro que tem aspas, campo a campo. Campos entre aspas
+    (a saída bruta do iperf, multilinha) são pulados com um único find() até
+    a aspa de fechamento. Devolve o índice do início do próximo registro,
+    ou -1 se o registro ainda não está completo no buffer.
+    """
+    i = 0
+    p = pos
+    while True:
+        if p < len(buf) and buf[p] == 0x22:
+            end = _skip_quoted(buf, p)
+            if end < 0:
+                return -1
+            if i in wanted:
+                out[wanted[i]] = buf[p + 1:end - 1].replace(b'""', b'"').decode(errors='replace')
+            sep = buf[end:end + 1]
+            if sep == b',':
+                p = end + 1
+                i += 1
+                continue
+            nl = buf.find(b'\n', end)
+            return -1 if nl < 0 else nl + 1  # '\r' ou fim do registro
+        comma = buf.find(b',', p)
+        nl = buf.find(b'\n', p)
+        if nl < 0:
+            return -1
+        if 0 <= comma < nl:
+            if i in wanted:
+                out[wanted[i]] = buf[p:comma].decode()
+            p = comma + 1
+            i += 1
+            continue
+        if i in wanted:
+            out[wanted[i]] = buf[p:nl].rstrip(b'\r').decode()
+        return nl + 1
+
+
+def iter_picked(f, wanted, n_out, offset):
+    """
+    Lê registros CSV de `f` (binário, já posicionado em `offset`) em blocos
+    grandes e devolve (valores, offset_depois_do_registro), só com os campos
+    de `wanted` (índice da coluna -> posição na saída). Linhas sem aspas vão
+    pelo caminho rápido (split). Um registro final sem '\n' (arquivo ainda
+    sendo escrito) não é entregue.
+    """
+    buf = b''
+    pos = 0
+    eof = False
+    while True:
+        if not eof:
+            chunk = f.read(READ_SIZE)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+        while True:
+            nl = buf.find(b'\n', pos)
+            if nl < 0:
+                break
+            if buf.find(b'"', pos, nl) < 0:
+                rec = buf[pos:nl]
+                start, pos = pos, nl + 1
+                if not rec.strip():
+                    offset += pos - start
+                    continue
+                parts = rec.rstrip(b'\r').split(b',')
+                out = [None] * n_out
+                for i, j in wanted.items():
+                    if i < len(parts):
+                        out[j] = parts[i].decode()
+                offset += pos - start
+                yield out, offset
+                continue
+            out = [None] * n_out
+            nxt = _scan_quoted(buf, pos, wanted, out)
+            if nxt < 0:
+                break
+            offset += nxt - pos
+            pos = nxt
+            yield out, offset
+        if eof:
+            return
+
+
+class ColumnReader:
+    """
+    Lê um CSV de log em fluxo devolvendo dicts só com `columns`.
+    Pode retomar de um offset em bytes (ver LogAggregator).
+    """
+
+    def __init__(self, path, columns=COLUMNS):
+        self.path = path
+        self.columns = tuple(columns)
+        with open(path, 'rb') as f:
+            first = f.readline()
+        self.header_size = len(first)
+        header = [ALIASES.get(h, h) for h in first.decode().strip().split(',')]
+        self.header = header
+        self.wanted = {header.index(c): pos for pos, c in enumerate(self.columns) if c in header}
+
+    def rows(self, offset=None):
+        """Gera (row, offset_depois_da_linha)."""
+        offset = self.header_size if not offset else offset
+        if not self.wanted:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for vals, offset in iter_picked(f, self.wanted, len(self.columns), offset):
+                yield dict(zip(self.columns, vals)), offset
+
+
+def _num(v, default=0.0):
+    try:
+        return float(v) if v not in (None, '') else default
+    except ValueError:
+        return default
+
+
+class LogAggregator:
+    """
+    Agregados incrementais por run e globais: bytes totais, throughput
+    (bytes*8)/tempo como no README, e Mbps obtido por estado. Guarda, por
+    arquivo, até onde já leu; update() só processa as linhas novas.
+    """
+
+    def __init__(self):
+        self.runs = {}     # run_id -> agregados
+        self.offsets = {}  # caminho -> offset já processado
+
+    def _run(self, run_id):
+        r = self.runs.get(run_id)
+        if r is None:
+            r = self.runs[run_id] = {
+                'rows': 0, 'bytes': 0, 'duration_s': 0.0,
+                'wall_first': None, 'wall_last': None, 'states': {},
+            }
+        return r
+
+    def add(self, row, default_run):
+        run = self._run(row.get('run_id') or default_run)
+        nbytes = int(_num(row.get('bytes_sent')))
+        dur = _num(row.get('duration_s'))
+        run['rows'] += 1
+        run['bytes'] += nbytes
+        run['duration_s'] += dur
+        ws = _num(row.get('wall_start'), None)
+        we = _num(row.get('wall_end'), None)
+        first = ws if ws is not None else we
+        if first is not None and (run['wall_first'] is None or first < run['wall_first']):
+            run['wall_first'] = first
+        if we is not None and (run['wall_last'] is None or we > run['wall_last']):
+            run['wall_last'] = we
+        state = row.get('state')
+        if state not in (None, ''):
+            st = run['states'].setdefault(str(int(float(state))), [0, 0, 0.0])  # linhas, bytes, s
+            st[0] += 1
+            st[1] += nbytes
+            st[2] += dur
+
+    def update(self, path):
+        """Processa o que foi acrescentado a `path` desde a última chamada."""
+        key = os.path.abspath(path)
+        offset = self.offsets.get(key, 0)
+        if offset and os.path.getsize(path) < offset:
+            offset = 0  # arquivo truncado/recriado: relê do início
+        reader = ColumnReader(path)
+        default_run = os.path.basename(path)
+        n = 0
+        for row, offset in reader.rows(offset):
+            self.add(row, default_run)
+            n += 1
+        if n or key not in self.offsets:
+            self.offsets[key] = offset or reader.header_size
+        return n
+
+    @staticmethod
+    def _summary(r):
+        wall = (r['wall_last'] - r['wall_first']) if r['wall_first'] is not None and r['wall_last'] is not None else 0.0
+        per_state = {s: (b * 8 / d / 1e6 if d > 0 else 0.0) for s, (_, b, d) in sorted(r['states'].items())}
+        return {
+            'rows': r['rows'],
+            'bytes': r['bytes'],
+            'duration_s': r['duration_s'],
+            'wall_s': wall,
+            # README: (bytes * 8) / tempo — tempo de tráfego e tempo de parede
+            'throughput_Mbps': r['bytes'] * 8 / r['duration_s'] / 1e6 if r['duration_s'] > 0 else 0.0,
+            'wall_throughput_Mbps': r['bytes'] * 8 / wall / 1e6 if wall > 0 else 0.0,
+            'state_Mbps': per_state,
+        }
+
+    def run_summaries(self):
+        return {run: self._summary(r) for run, r in self.runs.items()}
+
+    def global_summary(self):
+        g = {'rows': 0, 'bytes': 0, 'duration_s': 0.0, 'wall_first': None, 'wall_last': None, 'states': {}}
+        for r in self.runs.values():
+            g['rows'] += r['rows']
+            g['bytes'] += r['bytes']
+            g['duration_s'] += r['duration_s']
+            for s, (k, b, d) in r['states'].items():
+                st = g['states'].setdefault(s, [0, 0, 0.0])
+                st[0] += k
+                st[1] += b
+                st[2] += d
+        out = self._summary(g)
+        # tempo de parede global = soma dos runs (runs diferentes não se sobrepõem no tempo útil)
+        out['wall_s'] = sum(self._summary(r)['wall_s'] for r in self.runs.values())
+        out['wall_throughput_Mbps'] = out['bytes'] * 8 / out['wall_s'] / 1e6 if out['wall_s'] > 0 else 0.0
+        out['runs'] = len(self.runs)
+        return out
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({'runs': self.runs, 'offsets': self.offsets}, f)
+
+    @classmethod
+    def load(cls, path):
+        agg = cls()
+        if os.path.isfile(path):
+            with open(path) as f:
+                data = json.load(f)
+            agg.runs = data.get('runs', {})
+            agg.offsets = data.get('offsets', {})
+        return agg
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agregados dos logs do gerador, lidos em fluxo")
+    parser.add_argument('logs', nargs='+')
+    parser.add_argument('--state', default=None,
+                        help="JSON com agregados/offsets de leituras anteriores (atualizado no fim)")
+    parser.add_argument('--by-run', action='store_true')
+    args = parser.parse_args()
+
+    agg = LogAggregator.load(args.state) if args.state else LogAggregator()
+    for path in args.logs:
+        n = agg.update(path)
+        print(f"{path}: {n} linhas novas")
+    if args.state:
+        agg.save(args.state)
+
+    if args.by_run:
+        for run, s in sorted(agg.run_summaries().items()):
+            print(f"[{run}] linhas={s['rows']} bytes={s['bytes']} "
+                  f"throughput={s['throughput_Mbps']:.3f} Mbps por estado={s['state_Mbps']}")
+    g = agg.global_summary()
+    print("=== Global ===")
+    print(f"Runs: {g['runs']}  linhas: {g['rows']}")
+    print(f"Total bytes: {g['bytes']}")
+    print(f"Throughput (bytes*8 / tempo de tráfego): {g['throughput_Mbps']:.3f} Mbps")
+    print(f"Throughput (bytes*8 / tempo de parede): {g['wall_throughput_Mbps']:.3f} Mbps")
+    print(f"Mbps obtido por estado: {g['state_Mbps']}")
+
+
+if __name__ == '__main__':
+    main()
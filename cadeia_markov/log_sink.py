@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# log_sink.py — escrita de logs em lote, fora do caminho de medição
+import atexit
+import csv
+import gzip
+import json
+import os
+import signal
+import threading
+import numpy as np
+
+
+def side_file(out_file, suffix):
+    # traffic_log.csv -> traffic_log<suffix>
+    base, _ = os.path.splitext(out_file)
+    return base + suffix
+
+
+class LogSink:
+    """
+    Acumula linhas em memória e grava em lote numa thread própria, por
+    tamanho (batch_size) ou tempo (flush_interval). write() só faz append
+    numa lista: nenhum I/O acontece no passo de medição.
+
+    raw_fields: colunas volumosas (saída bruta do iperf) que vão para um
+    JSONL gzip separado (raw_file), chaveado por run_id/step, em vez do CSV.
+    columnar: None, 'npz' ou 'parquet' — cópia colunar das colunas em
+    columnar_fields, gravada em columnar_file no close().
+    """
+
+    def __init__(self, out_file, fieldnames, batch_size=256, flush_interval=5.0,
+                 raw_fields=(), raw_file=None, columnar=None, columnar_file=None,
+                 columnar_fields=None):
+        self.out_file = out_file
+        self.raw_fields = tuple(raw_fields)
+        self.fieldnames = [f for f in fieldnames if f not in self.raw_fields]
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.raw_file = raw_file or (side_file(out_file, '.raw.jsonl.gz') if self.raw_fields else None)
+        self.columnar = columnar
+        self.columnar_file = columnar_file
+        self.columnar_fields = list(columnar_fields or [])
+        self.columns = {f: [] for f in self.columnar_fields}
+
+        self.buffer = []
+        self.lock = threading.Lock()  # protege buffer
+        self.io_lock = threading.Lock()  # serializa gravações em disco
+        self.wake = threading.Event()
+        self.closed = True
+        self.thread = None
+        self._start()
+
+    def _start(self):
+        self.closed = False
+        self.thread = threading.Thread(target=self._flusher, daemon=True)
+        self.thread.start()
+        # só enquanto aberto: um sink fechado não fica preso (com o buffer) até o fim do processo
+        atexit.register(self.close)
+
+    def write(self, row):
+        if self.closed:
+            self._start()  # reaproveitado após close() (ex.: novo run do mesmo gerador)
+        with self.lock:
+            self.buffer.append(row)
+            n = len(self.buffer)
+        if n >= self.batch_size:
+            self.wake.set()
+
+    def _flusher(self):
+        while not self.closed:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+
+    def _csv_fieldnames(self):
+        # ao acrescentar num CSV existente, segue o cabeçalho que já está lá
+        if os.path.isfile(self.out_file) and os.path.getsize(self.out_file) > 0:
+            with open(self.out_file, newline='') as f:
+                header = next(csv.reader(f), None)
+            if header:
+                return header, True
+        return self.fieldnames, False
+
+    def flush(self):
+        with self.lock:
+            rows, self.buffer = self.buffer, []
+        if not rows:
+            return
+        with self.io_lock:
+            fieldnames, file_exists = self._csv_fieldnames()
+            with open(self.out_file, 'a', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+                if not file_exists:
+                    writer.writeheader()
+                writer.writerows(rows)
+
+            if self.raw_fields:
+                with gzip.open(self.raw_file, 'at', encoding='utf-8') as f:
+                    for r in rows:
+                        payload = {k: r.get(k) for k in self.raw_fields if r.get(k)}
+                        if payload:
+                            payload['run_id'] = r.get('run_id')
+                            payload['step'] = r.get('step')
+                            f.write(json.dumps(payload) + '\n')
+
+            for name, col in self.columns.items():
+                col.extend(r.get(name) for r in rows)
+
+    def _write_columnar(self):
+        if not self.columnar or not self.columnar_file or not self.columns:
+            return
+        arrays = {}
+        for name, col in self.columns.items():
+            if not col:
+                continue
+            if all(isinstance(v, str) for v in col):
+                arrays[name] = np.array(col)
+            else:
+                arrays[name] = np.array([np.nan if v is None else v for v in col], dtype=float)
+        if not arrays:
+            return
+        if self.columnar == 'parquet':
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                print("pyarrow não instalado; gravando .npz no lugar do parquet")
+            else:
+                pq.write_table(pa.table(arrays), self.columnar_file)
+                return
+        np.savez_compressed(side_file(self.columnar_file, '.npz'), **arrays)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        atexit.unregister(self.close)
+        self.wake.set()
+        self.thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+        self._write_columnar()
+
+    def install_signal_handlers(self):
+        """
+        Garante o flush quando o processo é encerrado por sinal (só na thread
+        principal). O handler só levanta SystemExit: se o sinal chegar com a
+        thread principal dentro de write() (segurando self.lock), flushar aqui
+        travaria; o `with` libera o lock ao desempilhar e o close() do atexit
+        (ou do finally do gerador) grava o que ficou no buffer.
+        """
+        def handler(signum, frame):
+            raise SystemExit(128 + signum)
+        for name in ('SIGTERM', 'SIGHUP'):  # SIGHUP não existe no Windows
+            sig = getattr(signal, name, None)
+            if sig is not None:
+                signal.signal(sig, handler)
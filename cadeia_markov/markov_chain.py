@@ -1,10 +1,12 @@
 import numpy as np
-import pandas as pd
 import subprocess
 import time
 import re
 import json
 import csv
+from trajectory import cumulative_table, sample_trajectory
+from log_reader import LogAggregator
+from iperf_pool import iperf_seconds
 
 class MarkovTrafficGenerator:
     def __init__(self, P, server_ip="127.0.0.1", port=5201, seed=None):
@@ -18,11 +20,20 @@ class MarkovTrafficGenerator:
         self.port = port
         self.current_state = 0  # Começa no estado 0 (ocioso)
         self.rng = np.random.default_rng(seed)
+        self.cum_P = cumulative_table(self.P)
+        self.states = None  # trajetória pré-amostrada (ver plan())
+        self.states_offset = 0
 
         # taxas associadas aos estados
         self.rates = {0: 0, 1: 10, 2: 50}  # Mbps
         self.logs = []
 
+    def plan(self, steps):
+        """Pré-amostra os estados de `steps` passos de uma vez"""
+        self.states = sample_trajectory(self.P, steps + 1, self.current_state, self.rng)
+        self.states_offset = len(self.logs)
+        return self.states
+
     def step(self, epoch_duration=5):
         """Executa um passo da DTMC e gera tráfego correspondente"""
         rate = self.rates[self.current_state]
@@ -39,7 +50,7 @@ class MarkovTrafficGenerator:
                     "-p", str(self.port),
                     "-u",  # UDP (para controle direto da taxa)
                     "-b", f"{rate}M",
-                    "-t", str(epoch_duration),
+                    "-t", iperf_seconds(epoch_duration),
                     "-J"  # saída JSON
                 ]
                 result = subprocess.run(cmd, capture_output=True, text=True)
@@ -64,10 +75,15 @@ class MarkovTrafficGenerator:
             "timestamp": time.time()
         })
 
-        # Transição para próximo estado
-        self.current_state = self.rng.choice([0, 1, 2], p=self.P[self.current_state])
+        # Transição para próximo estado (usa a trajetória pré-amostrada, se houver)
+        k = len(self.logs) - self.states_offset
+        if self.states is not None and k < len(self.states):
+            self.current_state = int(self.states[k])
+        else:
+            self.current_state = int(np.searchsorted(self.cum_P[self.current_state], self.rng.random(), side='right'))
 
     def run(self, steps=50, epoch_duration=5):
+        self.plan(steps)
         for i in range(steps):
             print(f"Step {i+1}/{steps} - Estado {self.current_state}")
             self.step(epoch_duration)
@@ -93,6 +109,8 @@ if __name__ == "__main__":
 
     print("Execução finalizada. Resultados salvos em loopback.csv")
 
-    df = pd.read_csv("loopback.csv")
-    soma_bytes = df["bytes_sent"].sum()
+    # leitura em fluxo, só com as colunas numéricas (ver log_reader.py)
+    agg = LogAggregator()
+    agg.update("loopback.csv")
+    soma_bytes = agg.global_summary()["bytes"]
     print("Soma dos bytes transmitidos:", soma_bytes)
\ No newline at end of file
@@ -1,22 +1,57 @@
 #!/usr/bin/env python3
 import argparse
-import csv
 import json
 import os
 import subprocess
 import time
 from datetime import datetime
 import numpy as np
+from trajectory import cumulative_table, sample_trajectory
+from udp_engine import UdpPacedSender
+from iperf_pool import IperfPipeline, iperf_seconds
+from log_sink import LogSink
+from analytics import expected_average, rates_vector, stationary
+from sim_backend import SimModel, simulate_epochs
+from monte_carlo import finite_horizon_distribution, place
+
+MC_MAX_CHAIN_STEPS = 200_000_000  # teto de cadeias x passos do Monte Carlo do resumo (~10 s)
 
 class MarkovTrafficGenerator:
     def __init__(self, P, server_ip='127.0.0.1', port=5201, seed=None,
-                 out_file='traffic_log.csv', run_id=None, append=True):
+                 out_file='traffic_log.csv', run_id=None, append=True, backend='iperf',
+                 pipeline_lead=0.5, columnar=None, inline_raw=False,
+                 rates=None, initial_state=0, sim_model=None, mc_chains=0, mc_workers=1):
         self.P = np.array(P)
         self.server_ip = server_ip
-        self.port = port
-        self.current_state = 0 # começa ocioso
+        # port pode ser uma porta só ou uma lista (pool de servidores iperf3)
+        self.ports = list(port) if isinstance(port, (list, tuple)) else [port]
+        self.port = self.ports[0]
+        # 'iperf' (subprocesso por época), 'iperf-pipeline' (iperf_pool) ou 'udp' (udp_engine)
+        self.backend = backend
+        self.udp_sender = None
+        self.iperf_pool = None
+        self.pipeline_lead = pipeline_lead  # s antes do fim da época para lançar o próximo cliente
+        self.pending = {}  # step -> IperfClient já lançado
+        self.sim_model = sim_model or SimModel()  # backend 'sim' (sem rede)
+        self.mc_chains = mc_chains  # cadeias do Monte Carlo no resumo do run (0 desliga)
+        self.mc_workers = mc_workers  # processos do Monte Carlo
+        self.last_startup = 0.0
+        self.initial_state = initial_state
+        self.current_state = initial_state # começa ocioso (estado 0) por padrão
         self.rng = np.random.default_rng(seed)
-        self.rates = {0: 0, 1: 10, 2: 50}  # # taxa de cada estado em Mbps
+        self.cum_P = cumulative_table(self.P)
+        self.states = None  # trajetória pré-amostrada (ver plan())
+        self.planned_steps = 0
+        # taxa de cada estado em Mbps (dict {estado: Mbps} ou lista com N entradas)
+        if rates is None:
+            rates = {0: 0, 1: 10, 2: 50}
+        self.rates = rates if isinstance(rates, dict) else dict(enumerate(rates))
+        n = self.P.shape[0]
+        if self.P.ndim != 2 or self.P.shape[1] != n:
+            raise ValueError(f"P deve ser quadrada, recebeu {self.P.shape}")
+        if sorted(int(s) for s in self.rates) != list(range(n)):
+            raise ValueError(f"rates deve ter uma taxa para cada um dos {n} estados de P, "
+                             f"recebeu estados {sorted(self.rates)}")
         self.out_file = out_file
         self.append = append
         self.run_id = run_id or datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -24,18 +59,34 @@ class MarkovTrafficGenerator:
             'run_id', 'step', 'state', 'rate_Mbps',
             'iperf_returncode', 'iperf_stderr', 'iperf_stdout_snippet',
             'duration_s', 'bytes_sent', 'achieved_Mbps',
-            'wall_start', 'wall_end', 'wall_duration'
+            'wall_start', 'wall_end', 'wall_duration', 'startup_s'
         ]
         if not self.append and os.path.isfile(self.out_file):
             os.remove(self.out_file)
+        # saída bruta do iperf vai para <out>.raw.jsonl.gz, salvo com inline_raw=True
+        raw_fields = () if inline_raw else ('iperf_stdout_snippet',)
+        self.sink = LogSink(
+            self.out_file, self.fieldnames, raw_fields=raw_fields,
+            columnar=columnar,
+            columnar_file=os.path.splitext(self.out_file)[0] + f"_{self.run_id}.parquet",
+            columnar_fields=[f for f in self.fieldnames
+                             if f not in ('iperf_stderr', 'iperf_stdout_snippet')])
+
+    def plan(self, steps):
+        """Pré-amostra os estados de `steps` passos (mais o estado seguinte ao último)."""
+        self.states = sample_trajectory(self.P, steps + 1, self.current_state, self.rng)
+        self.planned_steps = steps
+        return self.states
+
+    def _next_state(self, step_idx):
+        # consome a trajetória pré-amostrada; fora dela, sorteia pela tabela acumulada
+        if self.states is not None and step_idx < len(self.states):
+            return int(self.states[step_idx])
+        return int(np.searchsorted(self.cum_P[self.current_state], self.rng.random(), side='right'))
 
     def _write_row(self, row):
-        file_exists = os.path.isfile(self.out_file)
-        with open(self.out_file, 'a', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=self.fieldnames)
-            if not file_exists:
-                writer.writeheader()
-            writer.writerow(row)
+        # só bufferiza; o LogSink grava em lote numa thread própria
+        self.sink.write(row)
 
     def _parse_iperf_json(self, stdout):
         # retorna (bytes_sent, seconds) com fallback 0
@@ -69,6 +120,97 @@ class MarkovTrafficGenerator:
             seconds = float(m2.group(1)) if m2 else 0.0
             return bytes_sent, seconds
 
+    def _run_iperf(self, rate, epoch_duration, timeout_margin):
+        # retorna (returncode, stderr, stdout_snippet, bytes_sent, seconds, startup_s)
+        t_spawn = time.time()
+        cmd = [
+            "iperf3",
+            "-c", self.server_ip,
+            "-p", str(self.port),
+            "-u",
+            "-b", f"{rate}M",
+            "-t", iperf_seconds(epoch_duration),
+            "-J"
+        ]
+        try:
+            proc = subprocess.run(cmd, capture_output=True, text=True, timeout=epoch_duration + timeout_margin)
+            stderr = (proc.stderr or "")[:1000]  # corta para log
+            stdout_snippet = (proc.stdout or "")[:2000]
+            bytes_sent, real_duration = self._parse_iperf_json(proc.stdout)
+            # sem saída incremental, a partida é estimada como parede - duração do teste
+            startup = max(0.0, time.time() - t_spawn - real_duration) if real_duration > 0 else None
+            return proc.returncode, stderr, stdout_snippet, bytes_sent, real_duration, startup
+        except subprocess.TimeoutExpired as e:
+            return -1, f"timeout: {e}", "", 0, 0.0, None
+        except Exception as e:
+            return -2, f"exception: {e}", "", 0, 0.0, None
+
+    def _next_busy_step(self, step_idx):
+        # próximo passo planejado com taxa > 0 (os ociosos entre eles são instantâneos)
+        if self.states is None:
+            return None
+        for k in range(step_idx + 1, self.planned_steps + 1):
+            rate = self.rates.get(int(self.states[k - 1]), 0)
+            if rate > 0:
+                return k, rate
+        return None
+
+    def _run_iperf_pipelined(self, step_idx, rate, epoch_duration, timeout_margin):
+        # cliente desta época (lançado antecipadamente, se possível) + pré-lançamento do próximo
+        if self.iperf_pool is None:
+            self.iperf_pool = IperfPipeline(self.server_ip, self.ports)
+        try:
+            client = self.pending.pop(step_idx, None) or self.iperf_pool.launch(rate, epoch_duration)
+        except Exception as e:
+            return -2, f"exception: {e}", "", 0, 0.0, None
+
+        # com uma porta só o servidor iperf3 (um teste por vez) recusaria o cliente antecipado
+        nxt = self._next_busy_step(step_idx) if len(self.ports) > 1 else None
+        if nxt is not None and nxt[0] not in self.pending:
+            if client.json_stream:
+                client.first_byte.wait(timeout=timeout_margin)
+                t_first = client.t_first_byte or time.time()
+            else:
+                t_first = client.t_spawn + self.last_startup
+            delay = t_first + epoch_duration - self.pipeline_lead - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                self.pending[nxt[0]] = self.iperf_pool.launch(nxt[1], epoch_duration)
+            except Exception:
+                pass  # a próxima época tenta lançar de novo, sem antecipação
+
+        try:
+            remaining = client.t_spawn + epoch_duration + timeout_margin - time.time()
+            returncode, out, raw, stderr = client.wait(timeout=max(remaining, 0.1))
+        except subprocess.TimeoutExpired as e:
+            return -1, f"timeout: {e}", "", 0, 0.0, None
+        t_exit = time.time()
+        bytes_sent, real_duration = self._parse_iperf_json(out)
+        startup = client.startup_latency(real_duration, t_exit)
+        if startup is not None:
+            self.last_startup = startup
+        return returncode, (stderr or "")[:1000], raw[:2000], bytes_sent, real_duration, startup
+
+    def _run_udp(self, rate, epoch_duration):
+        # backend em processo: mesmo socket para o run inteiro, só troca a taxa
+        if self.udp_sender is None:
+            self.udp_sender = UdpPacedSender(self.server_ip, self.port)
+        try:
+            bytes_sent, real_duration = self.udp_sender.send_epoch(rate, epoch_duration)
+            return 0, "", "", bytes_sent, real_duration, 0.0
+        except Exception as e:
+            return -2, f"exception: {e}", "", 0, 0.0, None
+
+    def close(self):
+        if self.udp_sender is not None:
+            self.udp_sender.close()
+            self.udp_sender = None
+        self.sink.close()
+        for client in self.pending.values():
+            client.kill()
+        self.pending.clear()
+
     def step(self, step_idx, epoch_duration=5, timeout_margin=10):
         rate = self.rates.get(self.current_state, 0)
         wall_start = time.time()
@@ -77,29 +219,18 @@ class MarkovTrafficGenerator:
         returncode = None
         stderr = ""
         stdout_snippet = ""
+        startup = None
 
         if rate > 0:
-            cmd = [
-                "iperf3",
-                "-c", self.server_ip,
-                "-p", str(self.port),
-                "-u",
-                "-b", f"{rate}M",
-                "-t", str(epoch_duration),
-                "-J"
-            ]
-            try:
-                proc = subprocess.run(cmd, capture_output=True, text=True, timeout=epoch_duration + timeout_margin)
-                returncode = proc.returncode
-                stderr = (proc.stderr or "")[:1000]  # corta para log
-                stdout_snippet = (proc.stdout or "")[:2000]
-                bytes_sent, real_duration = self._parse_iperf_json(proc.stdout)
-            except subprocess.TimeoutExpired as e:
-                stderr = f"timeout: {e}"
-                returncode = -1
-            except Exception as e:
-                stderr = f"exception: {e}"
-                returncode = -2
+            if self.backend == 'udp':
+                returncode, stderr, stdout_snippet, bytes_sent, real_duration, startup = \
+                    self._run_udp(rate, epoch_duration)
+            elif self.backend == 'iperf-pipeline':
+                returncode, stderr, stdout_snippet, bytes_sent, real_duration, startup = \
+                    self._run_iperf_pipelined(step_idx, rate, epoch_duration, timeout_margin)
+            else:
+                returncode, stderr, stdout_snippet, bytes_sent, real_duration, startup = \
+                    self._run_iperf(rate, epoch_duration, timeout_margin)
         else:
             # estado ocioso -> simula a espera de epoch_duration
             # opcional: se quiser que o script espere mesmo em idle, descomente:
@@ -125,25 +256,93 @@ class MarkovTrafficGenerator:
             'achieved_Mbps': achieved_mbps,
             'wall_start': wall_start,
             'wall_end': wall_end,
-            'wall_duration': wall_duration
+            'wall_duration': wall_duration,
+            'startup_s': startup
         }
 
         self._write_row(row)
 
         # transição
-        self.current_state = int(self.rng.choice([0, 1, 2], p=self.P[self.current_state]))
+        self.current_state = self._next_state(step_idx)
         return row
 
-    def run(self, steps=50, epoch_duration=5):
+    def theory(self, steps, n_sources=1):
+        """
+        Estimativas teóricas da taxa média (Mbps) para a superposição de
+        `n_sources` cadeias independentes iguais a esta (n_sources=1: uma fonte).
+        """
+        rates = rates_vector(self.rates, self.P.shape[0])
+        # distribuição estacionária
+        pi = stationary(self.P)
+        stationary_mbps = float(pi.dot(rates))
+        # desvio da taxa agregada em regime: fontes independentes -> variâncias somam
+        stationary_std = float(np.sqrt(n_sources * pi.dot((rates - stationary_mbps) ** 2)))
+
+        # média finita iniciando no estado inicial (por comparação), em forma fechada
+        finite_avg = expected_average(self.P, rates, steps, self.initial_state)
+        # média por tempo de parede: épocas ociosas (taxa 0) não ocupam tempo nos
+        # backends, então a taxa vista no relógio é a condicionada aos estados ativos
+        busy = rates > 0
+        busy_mbps = float(pi[busy].dot(rates[busy]) / pi[busy].sum()) if pi[busy].sum() > 0 else 0.0
+        return {
+            'pi': pi,
+            'stationary_Mbps': n_sources * stationary_mbps,
+            'busy_Mbps': n_sources * busy_mbps,
+            'stationary_std_Mbps': stationary_std,
+            'finite_Mbps': n_sources * finite_avg,
+        }
+
+    def run_sim(self, steps, epoch_duration=5):
+        """
+        Backend 'sim': sintetiza todas as épocas de uma vez a partir da
+        trajetória pré-amostrada e do sim_model. Devolve um dict de arrays.
+        """
+        states = self.plan(steps)
+        rates = rates_vector(self.rates, self.P.shape[0])
+        sim = simulate_epochs(states[:steps], rates, epoch_duration, self.sim_model,
+                              self.rng, t0=time.time())
+        self.current_state = int(states[steps])
+        return sim
+
+    def _sim_rows(self, sim):
+        # arrays -> linhas no mesmo esquema do CSV dos outros backends
+        rows = []
+        for step, state, rate, dur, nbytes, ach, ws, we in zip(
+                sim['step'].tolist(), sim['state'].tolist(), sim['rate_Mbps'].tolist(),
+                sim['duration_s'].tolist(), sim['bytes_sent'].tolist(),
+                sim['achieved_Mbps'].tolist(), sim['wall_start'].tolist(), sim['wall_end'].tolist()):
+            rows.append({
+                'run_id': self.run_id, 'step': step, 'state': state, 'rate_Mbps': rate,
+                'iperf_returncode': None, 'iperf_stderr': '', 'iperf_stdout_snippet': '',
+                'duration_s': dur, 'bytes_sent': nbytes, 'achieved_Mbps': ach,
+                'wall_start': ws, 'wall_end': we, 'wall_duration': dur, 'startup_s': None
+            })
+        return rows
+
+    def run(self, steps=50, epoch_duration=5, verbose=True):
         run_wall_start = time.time()
         rows = []
-        for i in range(steps):
-            print(f"Step {i+1}/{steps}  state={self.current_state}")
-            r = self.step(i+1, epoch_duration=epoch_duration)
-            rows.append(r)
-        run_wall_end = time.time()
+        if self.backend == 'sim':
+            sim = self.run_sim(steps, epoch_duration)
+            rows = self._sim_rows(sim)
+            for r in rows:
+                self._write_row(r)
+            self.close()
+            total_wall = float(sim['duration_s'].sum())  # tempo simulado, não o de parede
+        else:
+            self.plan(steps)
+            try:
+                for i in range(steps):
+                    if verbose:
+                        print(f"Step {i+1}/{steps}  state={self.current_state}")
+                    r = self.step(i+1, epoch_duration=epoch_duration)
+                    rows.append(r)
+            finally:
+                self.close()
+            total_wall = time.time() - run_wall_start
+        if not verbose:
+            return rows
         total_bytes = sum(r['bytes_sent'] for r in rows)
-        total_wall = run_wall_end - run_wall_start
         overall_mbps = total_bytes * 8 / total_wall / 1e6 if total_wall > 0 else 0.0
 
         print("=== Resultado ===")
@@ -152,40 +351,85 @@ class MarkovTrafficGenerator:
         print(f"Throughput medida (total_bytes / wall_time): {overall_mbps:.3f} Mbps")
 
         # estimativas teóricas
-        rates = np.array([self.rates[0], self.rates[1], self.rates[2]])
-        # distribuição estacionária
-        w, v = np.linalg.eig(self.P.T)
-        idx = next(i for i, val in enumerate(w) if abs(val - 1) < 1e-8)
-        v1 = np.real(v[:, idx])
-        pi = v1 / v1.sum()
-        stationary_mbps = float(pi.dot(rates))
-        print(f"Est. estacionária (pi): {pi}")
-        print(f"Taxa média teórica (estacionária): {stationary_mbps:.3f} Mbps")
-
-        # média finita iniciando em estado 0 (por comparação)
-        cur = np.array([1.0, 0.0, 0.0])
-        avg_list = []
-        for _ in range(steps):
-            avg_list.append(cur.dot(rates))
-            cur = cur.dot(self.P)
-        finite_avg = sum(avg_list) / steps
-        print(f"Taxa média teórica (50 passos iniciando em 0): {finite_avg:.3f} Mbps")
+        th = self.theory(steps)
+        print(f"Est. estacionária (pi): {th['pi']}")
+        print(f"Taxa média teórica (estacionária): {th['stationary_Mbps']:.3f} Mbps")
+        print(f"Taxa média teórica ({steps} passos iniciando em {self.initial_state}): {th['finite_Mbps']:.3f} Mbps")
+
+        # dispersão esperada entre runs do mesmo tamanho (Monte Carlo) e posição deste run
+        if self.mc_chains and rows:
+            # cadeias x passos limitado: runs longos (soak) não passam minutos no resumo
+            chains = min(self.mc_chains, max(1, MC_MAX_CHAIN_STEPS // steps))
+            if chains < self.mc_chains:
+                print(f"Monte Carlo reduzido a {chains} cadeias ({steps} passos cada)")
+            mc = finite_horizon_distribution(self.P, self.rates, steps, chains, self.initial_state,
+                                             workers=self.mc_workers)
+            measured = sum(r['achieved_Mbps'] for r in rows) / len(rows)
+            pl = place(measured, mc)
+            print(f"Banda 95% entre runs ({chains} cadeias): "
+                  f"[{mc['band95'][0]:.3f}, {mc['band95'][1]:.3f}] Mbps")
+            print(f"Taxa média deste run: {measured:.3f} Mbps -> percentil {pl['percentile']:.1f} (p={pl['p_value']:.3f})")
 
         return rows
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--server-ip', default='127.0.0.1')
-    parser.add_argument('--port', type=int, default=5201)
+    parser.add_argument('--port', type=int, nargs='+', default=[5201],
+                        help="uma ou mais portas; no modo iperf-pipeline (mín. 2) as épocas alternam entre elas")
     parser.add_argument('--steps', type=int, default=50)
-    parser.add_argument('--epoch', type=int, default=5)
+    parser.add_argument('--epoch', type=float, default=5,
+                        help="duração da época (s); nos backends iperf precisa ser inteira (o -t do iperf3 é inteiro)")
     parser.add_argument('--outfile', default='traffic_log_debug.csv')
     parser.add_argument('--no-append', action='store_true')
+    parser.add_argument('--backend', choices=['iperf', 'iperf-pipeline', 'udp', 'sim'], default='iperf',
+                        help="udp: envio em processo (rode udp_engine.py no servidor); "
+                             "iperf-pipeline: lança o próximo iperf3 antes do fim da época atual; "
+                             "sim: sem rede, épocas sintetizadas pelo modelo de eficiência/perda")
+    parser.add_argument('--sim-calibrate', default=None,
+                        help="CSV de referência (ex.: loopback.csv) para calibrar o backend sim")
+    parser.add_argument('--sim-efficiency', type=float, default=None)
+    parser.add_argument('--sim-loss', type=float, default=0.0, help="fração média perdida por época")
+    parser.add_argument('--sim-loss-std', type=float, default=0.0)
+    parser.add_argument('--columnar', choices=['npz', 'parquet'], default=None,
+                        help="cópia colunar das colunas numéricas ao fim do run")
+    parser.add_argument('--inline-raw', action='store_true',
+                        help="mantém a saída bruta do iperf dentro do CSV (formato antigo)")
+    parser.add_argument('--pipeline-lead', type=float, default=0.5,
+                        help="segundos de antecedência para lançar o próximo cliente (iperf-pipeline)")
+    parser.add_argument('--matrix', default=None,
+                        help="CSV com a matriz de transição N x N (padrão: a matriz 3x3 do exemplo)")
+    parser.add_argument('--rates', type=float, nargs='+', default=[0, 10, 50],
+                        help="taxa (Mbps) de cada estado, na ordem dos estados")
+    parser.add_argument('--mc-chains', type=int, default=0,
+                        help="cadeias do Monte Carlo (banda 95%% entre runs) no resumo; 0 desliga")
+    parser.add_argument('--workers', type=int, default=1, help="processos do Monte Carlo")
     args = parser.parse_args()
+    if args.backend in ('iperf', 'iperf-pipeline') and not float(args.epoch).is_integer():
+        parser.error("--epoch precisa ser inteiro nos backends iperf (o -t do iperf3 é inteiro)")
+    if args.backend == 'iperf-pipeline' and len(args.port) < 2:
+        parser.error("--backend iperf-pipeline precisa de pelo menos 2 portas em --port "
+                     "(um iperf3 -s por porta): o servidor atende um teste por vez")
 
     P = [[0.7,0.2,0.1],[0.3,0.4,0.3],[0.2,0.3,0.5]]
-    gen = MarkovTrafficGenerator(P, server_ip=args.server_ip, port=args.port,
-                                 out_file=args.outfile, append=not args.no_append)
+    if args.matrix:
+        P = np.loadtxt(args.matrix, delimiter=',', ndmin=2)
+    if len(args.rates) != np.shape(P)[0]:
+        parser.error(f"--rates tem {len(args.rates)} taxas, mas a matriz tem {np.shape(P)[0]} estados")
+    sim_kwargs = {'loss': args.sim_loss, 'loss_std': args.sim_loss_std}
+    if args.sim_efficiency is not None:
+        sim_kwargs['efficiency'] = args.sim_efficiency
+    if args.sim_calibrate:
+        sim_model = SimModel.calibrate(args.sim_calibrate, **sim_kwargs)
+    else:
+        sim_model = SimModel(**sim_kwargs)
+    gen = MarkovTrafficGenerator(P, server_ip=args.server_ip, port=args.port, rates=args.rates,
+                                 sim_model=sim_model,
+                                 out_file=args.outfile, append=not args.no_append,
+                                 backend=args.backend, pipeline_lead=args.pipeline_lead,
+                                 columnar=args.columnar, inline_raw=args.inline_raw,
+                                 mc_chains=args.mc_chains, mc_workers=args.workers)
+    gen.sink.install_signal_handlers()
     gen.run(steps=args.steps, epoch_duration=args.epoch)
 
 if __name__ == '__main__':
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# monte_carlo.py — distribuição da taxa média em horizonte finito (M cadeias x N passos)
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from analytics import expected_average, rates_vector
+from trajectory import CHUNK_ELEMS, cumulative_table
+
+PERCENTILES = (1, 2.5, 5, 25, 50, 75, 95, 97.5, 99)
+
+
+def simulate_chains(P, rates, n_chains, steps, start_state=0, rng=None, seed=None,
+                    return_states=False):
+    """
+    Avança `n_chains` cadeias independentes por `steps` passos, todas juntas:
+    a cada passo, um vetor de uniformes e uma comparação com a linha acumulada
+    do estado atual de cada cadeia. Devolve a taxa média de cada cadeia
+    (média de r(X_t), t = 0..steps-1, com X_0 = start_state) e, se pedido,
+    a matriz de estados (n_chains x steps).
+    """
+    rng = np.random.default_rng(seed) if rng is None else rng
+    cum = cumulative_table(P)
+    n = cum.shape[0]
+    r = rates_vector(rates, n)
+    dtype = np.min_scalar_type(n - 1)
+    states_out = np.empty((n_chains, steps), dtype=dtype) if return_states else None
+    avg = np.empty(n_chains)
+
+    # blocos de cadeias para limitar a matriz (cadeias x estados) da comparação
+    chunk = max(1, CHUNK_ELEMS // n)
+    for lo in range(0, n_chains, chunk):
+        hi = min(lo + chunk, n_chains)
+        cur = np.full(hi - lo, start_state, dtype=np.intp)
+        acc = np.zeros(hi - lo)
+        for t in range(steps):
+            acc += r[cur]
+            if return_states:
+                states_out[lo:hi, t] = cur
+            if t + 1 < steps:
+                u = rng.random(hi - lo)
+                cur = (u[:, None] >= cum[cur]).sum(axis=1)
+                np.minimum(cur, n - 1, out=cur)
+        avg[lo:hi] = acc / steps
+    return (avg, states_out) if return_states else avg
+
+
+def _worker(P, rates, n_chains, steps, start_state, seed_seq):
+    return simulate_chains(P, rates, n_chains, steps, start_state, np.random.default_rng(seed_seq))
+
+
+def average_rate_samples(P, rates, n_chains, steps, start_state=0, seed=None, workers=1):
+    """Amostras da taxa média; com workers > 1, divide as cadeias entre processos."""
+    if workers <= 1:
+        return simulate_chains(P, rates, n_chains, steps, start_state, seed=seed)
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    sizes = [n_chains // workers + (1 if i < n_chains % workers else 0) for i in range(workers)]
+    P = np.asarray(P, dtype=float)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = pool.map(_worker, [P] * workers, [rates] * workers, sizes,
+                         [steps] * workers, [start_state] * workers, seeds)
+        return np.concatenate(list(parts))
+
+
+def finite_horizon_distribution(P, rates, steps, n_chains=100000, start_state=0,
+                                seed=None, workers=1, samples=None):
+    """
+    Resumo da distribuição da taxa média em `steps` passos:
+    média, desvio, percentis, IC 95% da média e o valor exato (analytics).
+    """
+    if samples is None:
+        samples = average_rate_samples(P, rates, n_chains, steps, start_state, seed, workers)
+    mean = float(samples.mean())
+    std = float(samples.std(ddof=1)) if len(samples) > 1 else 0.0
+    half = 1.96 * std / np.sqrt(len(samples)) if len(samples) else 0.0
+    return {
+        'n_chains': len(samples),
+        'steps': steps,
+        'start_state': start_state,
+        'mean': mean,
+        'std': std,
+        'mean_ci95': (mean - half, mean + half),
+        'band95': tuple(np.percentile(samples, [2.5, 97.5])),
+        'percentiles': dict(zip(PERCENTILES, np.percentile(samples, PERCENTILES))),
+        'exact_mean': expected_average(P, rates, steps, start_state),
+        'samples': samples,
+    }
+
+
+def place(measured, dist):
+    """
+    Posição de uma taxa medida na distribuição: percentil empírico e
+    p-valor bilateral (quão atípico é o run).
+    """
+    samples = dist['samples']
+    below = np.count_nonzero(samples < measured)
+    equal = np.count_nonzero(samples == measured)
+    pct = 100.0 * (below + 0.5 * equal) / len(samples)
+    p_two_sided = min(1.0, 2 * min(pct, 100.0 - pct) / 100.0)
+    return {'measured': measured, 'percentile': pct, 'p_value': p_two_sided}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo da taxa média em horizonte finito")
+    parser.add_argument('-m', '--chains', type=int, default=1000000)
+    parser.add_argument('--steps', type=int, default=50)
+    parser.add_argument('--start', type=int, default=0, help="estado inicial")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--rates', type=float, nargs='+', default=[0, 10, 50])
+    parser.add_argument('--measured', type=float, default=None,
+                        help="taxa média medida (Mbps) para posicionar na distribuição")
+    args = parser.parse_args()
+
+    P = [[0.7,0.2,0.1],[0.3,0.4,0.3],[0.2,0.3,0.5]]
+    d = finite_horizon_distribution(P, args.rates, args.steps, args.chains, args.start,
+                                    args.seed, args.workers)
+    print(f"Cadeias: {d['n_chains']}  passos: {args.steps}  estado inicial: {args.start}")
+    print(f"Taxa média (exata): {d['exact_mean']:.3f} Mbps")
+    print(f"Taxa média (Monte Carlo): {d['mean']:.3f} Mbps  IC95% [{d['mean_ci95'][0]:.3f}, {d['mean_ci95'][1]:.3f}]")
+    print(f"Desvio entre runs: {d['std']:.3f} Mbps  banda 95%: [{d['band95'][0]:.3f}, {d['band95'][1]:.3f}]")
+    for q, v in d['percentiles'].items():
+        print(f"  p{q:g}: {v:.3f} Mbps")
+    if args.measured is not None:
+        pl = place(args.measured, d)
+        print(f"Medido {pl['measured']:.3f} Mbps -> percentil {pl['percentile']:.1f}, p={pl['p_value']:.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# multi_source.py — K fontes Markov independentes em paralelo (um processo por fonte)
+import argparse
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+from markov_chainv2 import MarkovTrafficGenerator
+
+AGG_FIELDS = [
+    'run_id', 'step', 'wall_start', 'sources_active', 'offered_Mbps', 'achieved_Mbps',
+    'bytes_sent', 'expected_Mbps'
+]
+
+
+def source_out_file(out_file, k):
+    # traffic_log.csv -> traffic_log_src0.csv, um log por fonte
+    base, ext = os.path.splitext(out_file)
+    return f"{base}_src{k}{ext or '.csv'}"
+
+
+def _run_source(k, P, seed_seq, gen_kwargs, steps, epoch_duration):
+    # roda em um processo separado; cada fonte tem estado, RNG e log próprios
+    gen = MarkovTrafficGenerator(P, seed=seed_seq, **gen_kwargs)
+    return k, gen.run(steps=steps, epoch_duration=epoch_duration, verbose=False)
+
+
+def aggregate_rows(per_source, run_id, expected_mbps=None, window=5.0):
+    """
+    Visão agregada em janelas de parede de `window` s a partir do primeiro
+    wall_start: épocas ociosas não ocupam tempo, então o passo i de cada fonte
+    cai em instantes diferentes e somar por índice de passo misturaria épocas
+    que não foram simultâneas. Os bytes de cada época são distribuídos
+    uniformemente no intervalo em que ela transmitiu ([wall_end - duration_s,
+    wall_end]); a taxa oferecida entra proporcional à sobreposição.
+    """
+    spans = []  # (início, fim, taxa oferecida, bytes, fonte)
+    for k, rows in enumerate(per_source):
+        for r in rows:
+            dur = r['duration_s'] or 0.0
+            if r['rate_Mbps'] > 0 and dur > 0:
+                spans.append((r['wall_end'] - dur, r['wall_end'], r['rate_Mbps'], r['bytes_sent'], k))
+    if not spans or window <= 0:
+        return []
+    t0 = min(s[0] for s in spans)
+    n = int(np.ceil((max(s[1] for s in spans) - t0) / window))
+    offered = np.zeros(n)
+    nbytes = np.zeros(n)
+    active = [set() for _ in range(n)]
+    for ini, fim, rate, b, k in spans:
+        for w in range(int((ini - t0) // window), min(n, int(np.ceil((fim - t0) / window)))):
+            w_ini = t0 + w * window
+            overlap = min(fim, w_ini + window) - max(ini, w_ini)
+            if overlap <= 0:
+                continue
+            offered[w] += rate * overlap / window
+            nbytes[w] += b * overlap / (fim - ini)
+            active[w].add(k)
+    return [{
+        'run_id': run_id,
+        'step': w + 1,  # índice da janela
+        'wall_start': t0 + w * window,
+        'sources_active': len(active[w]),
+        'offered_Mbps': float(offered[w]),
+        'achieved_Mbps': float(nbytes[w] * 8 / window / 1e6),
+        'bytes_sent': int(round(nbytes[w])),
+        'expected_Mbps': expected_mbps,
+    } for w in range(n)]
+
+
+def source_ports(base_port, k, backend):
+    """Portas da fonte k: uma por fonte, ou um bloco de 2 no iperf-pipeline (que alterna entre elas)."""
+    block = 2 if backend == 'iperf-pipeline' else 1
+    return [base_port + k * block + i for i in range(block)]
+
+
+def run_sources(P, n_sources, steps=50, epoch_duration=5, master_seed=None,
+                server_ip='127.0.0.1', base_port=5201, out_file='traffic_log.csv',
+                backend='iperf', run_id=None, workers=None, append=True):
+    """
+    Roda `n_sources` geradores em paralelo. As sementes são derivadas de
+    `master_seed` via SeedSequence.spawn (fontes independentes, run reprodutível).
+    A fonte k usa as portas de source_ports() (um servidor por porta).
+    Retorna (linhas por fonte, linhas agregadas, teoria para K fontes).
+    O esperado das janelas agregadas é busy_Mbps (K·E[r | estado ativo]):
+    as janelas só contêm tempo de transmissão.
+    """
+    run_id = run_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+    seeds = np.random.SeedSequence(master_seed).spawn(n_sources)
+    futures = []
+    per_source = [None] * n_sources
+    with ProcessPoolExecutor(max_workers=workers or n_sources) as pool:
+        for k in range(n_sources):
+            kwargs = {
+                'server_ip': server_ip,
+                'port': source_ports(base_port, k, backend),
+                'out_file': source_out_file(out_file, k),
+                'run_id': f"{run_id}_s{k}",
+                'append': append,
+                'backend': backend,
+            }
+            futures.append(pool.submit(_run_source, k, P, seeds[k], kwargs, steps, epoch_duration))
+        for fut in futures:
+            k, rows = fut.result()
+            per_source[k] = rows
+
+    theory = MarkovTrafficGenerator(P, out_file=os.devnull).theory(steps, n_sources=n_sources)
+    agg = aggregate_rows(per_source, run_id, theory['busy_Mbps'], epoch_duration)
+    return per_source, agg, theory
+
+
+def write_aggregate(agg, out_file, append=True):
+    file_exists = os.path.isfile(out_file) and append
+    with open(out_file, 'a' if append else 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=AGG_FIELDS)
+        if not file_exists:
+            writer.writeheader()
+        writer.writerows(agg)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="K fontes Markov independentes em paralelo")
+    parser.add_argument('-k', '--sources', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=None, help="semente mestre")
+    parser.add_argument('--server-ip', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5201,
+                        help="porta da fonte 0; fonte k usa port+k (port+2k e port+2k+1 no iperf-pipeline)")
+    parser.add_argument('--steps', type=int, default=50)
+    parser.add_argument('--epoch', type=float, default=5)
+    parser.add_argument('--outfile', default='traffic_log_debug.csv')
+    parser.add_argument('--aggfile', default='traffic_log_aggregate.csv')
+    parser.add_argument('--backend', choices=['iperf', 'iperf-pipeline', 'udp', 'sim'], default='iperf')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--no-append', action='store_true')
+    args = parser.parse_args()
+
+    P = [[0.7,0.2,0.1],[0.3,0.4,0.3],[0.2,0.3,0.5]]
+    per_source, agg, theory = run_sources(
+        P, args.sources, steps=args.steps, epoch_duration=args.epoch,
+        master_seed=args.seed, server_ip=args.server_ip, base_port=args.port,
+        out_file=args.outfile, backend=args.backend, workers=args.workers,
+        append=not args.no_append)
+    write_aggregate(agg, args.aggfile, append=not args.no_append)
+
+    offered = np.mean([a['offered_Mbps'] for a in agg]) if agg else 0.0
+    achieved = np.mean([a['achieved_Mbps'] for a in agg]) if agg else 0.0
+    print("=== Resultado agregado ===")
+    print(f"Fontes: {args.sources}  passos: {args.steps}")
+    print(f"Taxa oferecida média: {offered:.3f} Mbps")
+    print(f"Taxa obtida média: {achieved:.3f} Mbps")
+    print(f"Taxa teórica K·π·r (estacionária): {theory['stationary_Mbps']:.3f} Mbps "
+          f"(desvio {theory['stationary_std_Mbps']:.3f})")
+    print(f"Taxa teórica por tempo de parede (só estados ativos; compare com a obtida): "
+          f"{theory['busy_Mbps']:.3f} Mbps")
+    print(f"Taxa teórica ({args.steps} passos iniciando em 0): {theory['finite_Mbps']:.3f} Mbps")
+    print(f"Logs por fonte: {source_out_file(args.outfile, 0)} ... ; agregado em {args.aggfile}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# sim_backend.py — backend offline: sintetiza as épocas sem tocar a rede
+import csv
+import numpy as np
+from analytics import rates_vector
+from trajectory import sample_trajectory
+
+# loopback.csv: 10 Mbps por ~5 s -> 6258688 bytes (764 blocos de 8192 bytes)
+LOOPBACK_BLOCK = 8192
+
+
+class SimModel:
+    """
+    Modelo de eficiência/perda de uma época:
+      duration_s = epoch + overhead (exponencial, média `overhead_s`)
+      bytes      = rate * duration * efficiency * (1 - perda), em blocos de block_size
+    perda ~ Normal(loss, loss_std) truncada em [0, 1], sorteada por época.
+    """
+
+    def __init__(self, efficiency=1.0, loss=0.0, loss_std=0.0, overhead_s=0.002,
+                 block_size=LOOPBACK_BLOCK):
+        self.efficiency = efficiency
+        self.loss = loss
+        self.loss_std = loss_std
+        self.overhead_s = overhead_s
+        self.block_size = block_size
+
+    @classmethod
+    def calibrate(cls, csv_path, **kwargs):
+        """
+        Ajusta eficiência e overhead a partir de um log (ex.: loopback.csv),
+        usando só as épocas com taxa > 0. A duração nominal é a duração medida
+        arredondada para o segundo inteiro mais próximo.
+        """
+        eff, over = [], []
+        with open(csv_path, newline='') as f:
+            for row in csv.DictReader(f):
+                try:
+                    rate = float(row['rate_Mbps'])
+                    dur = float(row['duration_s'])
+                    nbytes = float(row['bytes_sent'])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if rate <= 0 or dur <= 0:
+                    continue
+                eff.append(nbytes * 8 / (rate * 1e6 * dur))
+                over.append(dur - round(dur))
+        if eff:
+            kwargs.setdefault('efficiency', float(np.mean(eff)))
+            kwargs.setdefault('overhead_s', max(0.0, float(np.mean(over))))
+        return cls(**kwargs)
+
+    def epochs(self, rate_Mbps, epoch_duration, rng):
+        """Vetorizado: rate_Mbps é um array (uma entrada por época)."""
+        rate = np.asarray(rate_Mbps, dtype=float)
+        busy = rate > 0
+        n = rate.shape[0]
+        overhead = rng.exponential(self.overhead_s, n) if self.overhead_s > 0 else np.zeros(n)
+        duration = np.where(busy, epoch_duration + overhead, 0.0)
+        if self.loss_std > 0:
+            loss = np.clip(rng.normal(self.loss, self.loss_std, n), 0.0, 1.0)
+        else:
+            loss = np.full(n, self.loss)
+        nbytes = rate * 1e6 / 8 * duration * self.efficiency * (1 - loss)
+        if self.block_size:
+            nbytes = np.floor(nbytes / self.block_size) * self.block_size
+        return nbytes.astype(np.int64), duration
+
+
+def simulate_epochs(states, rates, epoch_duration=5, model=None, rng=None, t0=0.0):
+    """
+    Sintetiza as épocas de uma trajetória já amostrada, como arrays NumPy:
+    state, rate_Mbps, bytes_sent, duration_s, achieved_Mbps, wall_start, wall_end.
+    A linha do tempo é contínua: cada época começa quando a anterior termina.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    model = model or SimModel()
+    states = np.asarray(states)
+    rate = np.asarray(rates, dtype=float)[states]  # rates: vetor por estado (ver rates_vector)
+    nbytes, duration = model.epochs(rate, epoch_duration, rng)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        achieved = np.where(duration > 0, nbytes * 8 / duration / 1e6, 0.0)
+    wall_end = t0 + np.cumsum(duration)
+    return {
+        'step': np.arange(1, len(states) + 1),
+        'state': states,
+        'rate_Mbps': rate,
+        'bytes_sent': nbytes,
+        'duration_s': duration,
+        'achieved_Mbps': achieved,
+        'wall_start': wall_end - duration,
+        'wall_end': wall_end,
+    }
+
+
+def simulate_run(P, rates, steps, epoch_duration=5, model=None, seed=None,
+                 initial_state=0, rng=None, t0=0.0):
+    """Um run inteiro offline: trajetória + épocas sintetizadas, tudo vetorizado."""
+    rng = np.random.default_rng(seed) if rng is None else rng
+    P = np.asarray(P, dtype=float)
+    states = sample_trajectory(P, steps, initial_state, rng)
+    return simulate_epochs(states, rates_vector(rates, P.shape[0]), epoch_duration, model, rng, t0)
+
+
+def summarize(sim):
+    """Mesmo resumo que run() imprime: bytes totais, tempo e throughput."""
+    total_bytes = int(sim['bytes_sent'].sum())
+    total_time = float(sim['duration_s'].sum())
+    return {
+        'total_bytes': total_bytes,
+        'total_time_s': total_time,
+        'throughput_Mbps': total_bytes * 8 / total_time / 1e6 if total_time > 0 else 0.0,
+        'avg_rate_Mbps': float(sim['achieved_Mbps'].mean()) if len(sim['achieved_Mbps']) else 0.0,
+    }
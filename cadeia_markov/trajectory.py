@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# trajectory.py — amostragem vetorizada da trajetória completa da DTMC
+from bisect import bisect_right
+import numpy as np
+
+# limite de elementos (cadeias x estados) por bloco no Monte Carlo (monte_carlo.py)
+CHUNK_ELEMS = 1 << 22
+
+
+def cumulative_table(P):
+    """Tabela de probabilidades acumuladas por linha (última coluna fixada em 1)."""
+    P = np.asarray(P, dtype=float)
+    cum = np.cumsum(P, axis=1)
+    cum[:, -1] = 1.0  # evita que erro de arredondamento "escape" da última coluna
+    return cum
+
+
+def _walk(cum, u, start):
+    """
+    Segue a cadeia a partir de `start`: o próximo estado é a busca binária de
+    u[t] na linha acumulada do estado atual (= searchsorted(..., side='right')).
+    O(T log n) em listas Python; compor mapas por passo custa O(T n log T).
+    """
+    rows = cum.tolist()
+    out = []
+    append = out.append
+    cur = start
+    for x in u.tolist():
+        cur = bisect_right(rows[cur], x)
+        append(cur)
+    return out
+
+
+def sample_trajectory(P, steps, start_state=0, rng=None, seed=None):
+    """
+    Amostra `steps` estados da DTMC de uma só vez.
+    P: matriz de transição (n x n)
+    steps: tamanho da trajetória (inclui o estado inicial)
+    start_state: estado no passo 0
+    rng: np.random.Generator (se None, criado a partir de `seed`)
+    Mesma semente -> mesma sequência. Usa um lote de uniformes e a
+    tabela acumulada por linha, sem rng.choice por passo.
+    """
+    if rng is None:
+        rng = np.random.default_rng(seed)
+    steps = int(steps)
+    states = np.empty(max(steps, 0), dtype=np.intp)
+    if steps <= 0:
+        return states
+    states[0] = start_state
+    if steps == 1:
+        return states
+
+    cum = cumulative_table(P)
+    u = rng.random(steps - 1)
+    states[1:] = _walk(cum, u, int(start_state))
+    return states
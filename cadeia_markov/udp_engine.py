@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# udp_engine.py — gerador UDP em processo (substitui o iperf3 por época)
+import argparse
+import socket
+import struct
+import time
+
+# cabeçalho de cada datagrama: magic, época, seq, timestamp (ns)
+HEADER = struct.Struct('!IIQQ')
+MAGIC = 0x4D4B5631  # "MKV1"
+DEFAULT_PACKET_SIZE = 1470  # mesmo tamanho padrão de datagrama UDP do iperf3
+
+
+class UdpPacedSender:
+    """
+    Mantém um único socket UDP aberto durante todo o run e envia cada época
+    a uma taxa fixa, controlada por token bucket. Trocar de taxa entre épocas
+    é só chamar send_epoch() com outro rate_Mbps; nada é recriado.
+    """
+
+    def __init__(self, server_ip='127.0.0.1', port=5201,
+                 packet_size=DEFAULT_PACKET_SIZE, burst_packets=8):
+        if packet_size < HEADER.size:
+            raise ValueError(f"packet_size deve ser >= {HEADER.size}")
+        self.addr = (server_ip, port)
+        self.packet_size = packet_size
+        self.burst_bytes = burst_packets * packet_size
+        self.buf = bytearray(packet_size)
+        self.epoch = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.connect(self.addr)
+
+    def send_epoch(self, rate_Mbps, duration):
+        """
+        Envia por `duration` segundos a `rate_Mbps`.
+        Retorna (bytes_sent, seconds), no mesmo sentido do resumo do iperf3.
+        """
+        self.epoch += 1
+        rate_Bps = rate_Mbps * 1e6 / 8
+        size = self.packet_size
+        buf = self.buf
+        sock = self.sock
+        bytes_sent = 0
+        seq = 0
+
+        t0 = time.perf_counter()
+        end = t0 + duration
+        last = t0
+        tokens = float(size)  # permite o primeiro pacote imediatamente
+        while True:
+            now = time.perf_counter()
+            if now >= end:
+                break
+            tokens = min(self.burst_bytes, tokens + (now - last) * rate_Bps)
+            last = now
+            if tokens >= size:
+                HEADER.pack_into(buf, 0, MAGIC, self.epoch, seq, time.time_ns())
+                try:
+                    bytes_sent += sock.send(buf)
+                except OSError:
+                    # buffer cheio / ICMP port unreachable: conta como não enviado
+                    pass
+                seq += 1
+                tokens -= size
+            else:
+                time.sleep(min((size - tokens) / rate_Bps, end - now))
+        return bytes_sent, time.perf_counter() - t0
+
+    def close(self):
+        self.sock.close()
+
+
+class UdpCounterReceiver:
+    """Receptor leve: conta datagramas/bytes por época do UdpPacedSender."""
+
+    def __init__(self, bind_ip='0.0.0.0', port=5201, bufsize=65535):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.sock.bind((bind_ip, port))
+        self.buf = bytearray(bufsize)
+        self.view = memoryview(self.buf)
+        self.epochs = {}  # época -> [pacotes, bytes, maior_seq, t_primeiro, t_ultimo]
+
+    def poll(self, timeout=1.0):
+        """Recebe um datagrama (ou nada no timeout) e atualiza os contadores."""
+        self.sock.settimeout(timeout)
+        try:
+            n = self.sock.recv_into(self.buf)
+        except socket.timeout:
+            return None
+        if n < HEADER.size:
+            return None
+        magic, epoch, seq, _ = HEADER.unpack_from(self.view)
+        if magic != MAGIC:
+            return None
+        now = time.time()
+        st = self.epochs.get(epoch)
+        if st is None:
+            st = self.epochs[epoch] = [0, 0, -1, now, now]
+        st[0] += 1
+        st[1] += n
+        if seq > st[2]:
+            st[2] = seq
+        st[4] = now
+        return epoch
+
+    def summary(self, epoch):
+        pkts, nbytes, max_seq, t_first, t_last = self.epochs[epoch]
+        expected = max_seq + 1
+        lost = max(0, expected - pkts)
+        dur = t_last - t_first
+        mbps = nbytes * 8 / dur / 1e6 if dur > 0 else 0.0
+        return {'epoch': epoch, 'packets': pkts, 'bytes': nbytes,
+                'lost': lost, 'seconds': dur, 'Mbps': mbps}
+
+    def close(self):
+        self.sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Receptor UDP leve para o backend udp do markov_chainv2")
+    parser.add_argument('--bind', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5201)
+    args = parser.parse_args()
+
+    rx = UdpCounterReceiver(args.bind, args.port)
+    print(f"Receptor UDP escutando em {args.bind}:{args.port}")
+    current = None
+    try:
+        while True:
+            epoch = rx.poll()
+            if epoch is not None and epoch != current:
+                if current is not None:
+                    print(rx.summary(current))
+                current = epoch
+    except KeyboardInterrupt:
+        if current is not None:
+            print(rx.summary(current))
+        print("Receptor encerrado.")
+    finally:
+        rx.close()
+
+
+if __name__ == '__main__':
+    main()
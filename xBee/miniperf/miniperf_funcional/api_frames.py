@@ -0,0 +1,294 @@
+# api_frames.py
+# Caminho de recepção enxuto: pyserial direto, sem a digi-xbee.
+# A biblioteca cria por quadro um XBeeMessage, procura/cria o RemoteXBeeDevice
+# e o endereço; a 115200+ baud isso vira o gargalo e o miniperf passa a medir
+# a biblioteca em vez do rádio.
+#
+# Porta "raw:/dev/ttyUSB0[?ap=1]" no lugar de /dev/ttyUSB* (módulo em modo API,
+# AP=2 com escape por padrão):
+#   python3 main.py -s raw:/dev/ttyUSB0 --baud 230400
+#
+# A serial é lida em blocos para um bytearray fixo (o desescape do AP=2 é feito
+# na cópia para esse buffer), os quadros são delimitados pelo campo de tamanho,
+# o checksum conferido e o corpo entregue como memoryview do próprio buffer.
+# Quadros RX viram tuplas (origem, rssi, dados); só os dados que seguem para as
+# filas do servidor são copiados.
+import threading
+from collections import namedtuple
+from urllib.parse import parse_qsl
+
+PREFIX = "raw:"
+START = 0x7E
+ESCAPE = 0x7D
+XON = 0x11
+XOFF = 0x13
+NEEDS_ESCAPE = (START, ESCAPE, XON, XOFF)
+
+CHUNK = 4096            # bytes por leitura da serial
+BUF_SIZE = 64 * 1024
+MAX_FRAME = 1024        # maior tamanho de quadro aceito (acima disso = lixo, ressincroniza)
+
+# tipos de quadro API
+TX_REQUEST = 0x10
+TX_64 = 0x00            # 802.15.4 legado: destino 64 bits
+TX_16 = 0x01            # 802.15.4 legado: destino 16 bits
+TX_STATUS = 0x8B
+RX_64 = 0x80            # 802.15.4 legado: origem 64 bits + RSSI
+RX_16 = 0x81            # 802.15.4 legado: origem 16 bits + RSSI
+RX_PACKET = 0x90        # Zigbee/DigiMesh/802.15.4 novo
+RX_EXPLICIT = 0x91
+
+RawMessage = namedtuple("RawMessage", "data remote_device")
+
+
+class ApiFrameReader:
+    """
+    Parser incremental de quadros API. `poll()` lê o que houver na serial e
+    devolve [(tipo, corpo)], com corpo = memoryview sem o tipo e sem o
+    checksum. As views apontam para o buffer interno e só valem até a
+    próxima chamada de poll().
+    """
+
+    def __init__(self, ser, escaped=True, chunk=CHUNK, size=BUF_SIZE):
+        self.ser = ser
+        self.escaped = escaped
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+        self.chunk = bytearray(chunk)
+        self.chunk_view = memoryview(self.chunk)
+        self.r = 0              # início do que ainda não foi consumido
+        self.w = 0              # fim dos dados válidos
+        self.esc_pending = False
+        self.frames = 0
+        self.checksum_errors = 0
+        self.discarded = 0      # bytes fora de quadro (ressincronização)
+        self.overflows = 0
+
+    def poll(self):
+        n = self.ser.readinto(self.chunk_view[:min(len(self.chunk), max(1, self.ser.in_waiting))])
+        if not n:
+            return []
+        self.feed(n)
+        return self._parse()
+
+    def feed(self, n):
+        """Copia (desescapando) os n primeiros bytes de self.chunk para o buffer."""
+        if self.r == self.w:
+            self.r = self.w = 0
+        elif self.w + n > len(self.buf):
+            # compacta: o pedaço de quadro pendente volta para o início (mesmo
+            # tamanho de fatia, então vale mesmo com memoryviews exportadas)
+            pend = self.w - self.r
+            self.buf[:pend] = self.view[self.r:self.w]
+            self.r, self.w = 0, pend
+            if self.w + n > len(self.buf):
+                self.overflows += 1
+                self.discarded += pend
+                self.r = self.w = 0
+        if not self.escaped:
+            self.buf[self.w:self.w + n] = self.chunk_view[:n]
+            self.w += n
+            return
+        src, buf, w, i = self.chunk, self.buf, self.w, 0
+        if self.esc_pending:
+            buf[w] = src[0] ^ 0x20
+            w += 1
+            i = 1
+            self.esc_pending = False
+        while i < n:
+            j = src.find(ESCAPE, i, n)
+            if j < 0:
+                j = n
+            buf[w:w + j - i] = self.chunk_view[i:j]
+            w += j - i
+            if j >= n:
+                break
+            if j + 1 < n:
+                buf[w] = src[j + 1] ^ 0x20
+                w += 1
+            else:
+                self.esc_pending = True  # o byte escapado vem no próximo bloco
+            i = j + 2
+        self.w = w
+
+    def _parse(self):
+        buf, view, r, w = self.buf, self.view, self.r, self.w
+        out = []
+        while r < w:
+            if buf[r] != START:
+                j = buf.find(START, r, w)
+                if j < 0:
+                    self.discarded += w - r
+                    r = w
+                    break
+                self.discarded += j - r
+                r = j
+            if w - r < 4:
+                break
+            length = (buf[r + 1] << 8) | buf[r + 2]
+            if not length or length > MAX_FRAME:
+                self.discarded += 1
+                r += 1
+                continue
+            end = r + 4 + length  # delimitador + 2 de tamanho + dados + checksum
+            if end > w:
+                break
+            if sum(view[r + 3:end]) & 0xFF != 0xFF:
+                # 0x7E no meio de um quadro ruim: tenta de novo a partir do próximo delimitador
+                self.checksum_errors += 1
+                self.discarded += 1
+                r += 1
+                continue
+            out.append((buf[r + 3], view[r + 4:end - 1]))
+            self.frames += 1
+            r = end
+        self.r = r
+        return out
+
+
+def parse_rx(ftype, body):
+    """(origem, rssi em dBm ou None, dados) de um quadro RX; None para os demais tipos."""
+    if ftype == RX_PACKET:
+        return body[0:8], None, body[11:]
+    if ftype == RX_EXPLICIT:
+        return body[0:8], None, body[17:]
+    if ftype == RX_64:
+        return body[0:8], -body[8], body[10:]
+    if ftype == RX_16:
+        return body[0:2], -body[2], body[4:]
+    return None
+
+
+def escape(frame):
+    out = bytearray((frame[0],))
+    for b in frame[1:]:
+        if b in NEEDS_ESCAPE:
+            out += bytes((ESCAPE, b ^ 0x20))
+        else:
+            out.append(b)
+    return bytes(out)
+
+
+def encode_tx_request(dest: bytes, data, frame_id=0, escaped=True, legacy=False) -> bytes:
+    """
+    Transmit Request (0x10) para um endereço de 8 bytes, ou de 2 (origem de um
+    RX_16: vai como 16 bits, com o de 64 em 0xFFFFFFFFFFFFFFFF). Com legacy
+    (remoto que chegou em RX_64/RX_16: firmware 802.15.4 antigo, sem 0x10),
+    TX_64 ou TX_16 conforme o tamanho do endereço. frame_id 0 = sem TX Status.
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    if legacy:
+        body = bytes((TX_64 if len(dest) == 8 else TX_16, frame_id)) + dest + b"\x00" + bytes(data)
+    else:
+        if len(dest) == 2:
+            addr = b"\xff" * 8 + dest
+        else:
+            addr = dest + b"\xff\xfe"
+        body = bytes((TX_REQUEST, frame_id)) + addr + b"\x00\x00" + bytes(data)
+    frame = bytes((START, len(body) >> 8, len(body) & 0xFF)) + body + bytes((0xFF - (sum(body) & 0xFF),))
+    return escape(frame) if escaped else frame
+
+
+def is_raw(port) -> bool:
+    return str(port).startswith(PREFIX)
+
+
+def parse_port(port):
+    """'raw:/dev/ttyUSB0?ap=1' -> (porta serial, escaped)."""
+    path, _, query = port[len(PREFIX):].partition("?")
+    params = dict(parse_qsl(query))
+    return path, params.get("ap", "2") == "2"
+
+
+class RawXBeeDevice:
+    """
+    Dispositivo local sobre o parser acima, com o pedaço da interface do
+    XBeeDevice que o servidor usa (open/close, send_data, callback de dados).
+    Os remotos são o endereço 64 bits em hex (str), como remote_id() espera.
+    send_data só escreve o Transmit Request (frame_id 0): não espera TX Status;
+    para remotos vistos em RX_64/RX_16 usa TX_64/TX_16.
+    """
+
+    def __init__(self, port, baud_rate=115200):
+        self.port, self.escaped = parse_port(port)
+        self.baud_rate = baud_rate
+        self.ser = None
+        self.reader = None
+        self.thread = None
+        self.running = False
+        self.frame_callbacks = []
+        self.data_callbacks = []
+        self.names = {}   # origem (bytes) -> hex, para não formatar a cada quadro
+        self.legacy = set()   # remotos (hex) que chegaram em RX_64/RX_16
+        self.write_lock = threading.Lock()
+
+    def open(self):
+        import serial
+        self.ser = serial.Serial(self.port, self.baud_rate, timeout=0.05)
+        self.reader = ApiFrameReader(self.ser, self.escaped)
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(1)
+        if self.ser:
+            self.ser.close()
+
+    def add_frame_callback(self, callback):
+        """callback(dados: bytes, remoto: str) — sem objeto por quadro (ex.: RxDispatcher.submit)."""
+        self.frame_callbacks.append(callback)
+
+    def del_frame_callback(self, callback):
+        self.frame_callbacks.remove(callback)
+
+    def add_data_received_callback(self, callback):
+        self.data_callbacks.append(callback)
+
+    def del_data_received_callback(self, callback):
+        self.data_callbacks.remove(callback)
+
+    def get_64bit_addr(self):
+        return None
+
+    def send_data(self, remote, data):
+        remote = str(remote)
+        frame = encode_tx_request(bytes.fromhex(remote), data, escaped=self.escaped, legacy=remote in self.legacy)
+        with self.write_lock:
+            self.ser.write(frame)
+
+    def stats(self):
+        rd = self.reader
+        return {"quadros": rd.frames, "checksum": rd.checksum_errors, "descartados": rd.discarded,
+                "overflows": rd.overflows}
+
+    def _loop(self):
+        names = self.names
+        while self.running:
+            try:
+                frames = self.reader.poll()
+            except Exception as e:
+                if self.running:
+                    print("Erro na leitura da serial:", e)
+                break
+            for ftype, body in frames:
+                rx = parse_rx(ftype, body)
+                if rx is None:
+                    continue
+                src, _, data = rx
+                src = bytes(src)
+                remote = names.get(src)
+                if remote is None:
+                    remote = names[src] = src.hex().upper()
+                    if ftype in (RX_64, RX_16):
+                        self.legacy.add(remote)
+                data = bytes(data)  # o buffer é reaproveitado: as filas precisam de cópia
+                for cb in self.frame_callbacks:
+                    cb(data, remote)
+                if self.data_callbacks:
+                    msg = RawMessage(data, remote)
+                    for cb in self.data_callbacks:
+                        cb(msg)
@@ -1,88 +1,275 @@
 # client.py
 import csv
+import os
 import time
 import sys
-from digi.xbee.devices import XBeeDevice, RemoteXBeeDevice, XBee64BitAddress
 from session import load_session_counter, save_session_counter
-from utils import CSV_FILE, BAUD_RATE
+from utils import CSV_FILE, BAUD_RATE, DB_FILE, INTERVAL_FIELDS, intervals_path, sibling_path, max_rf_payload
+import frames
+from tx_window import AsyncTxWindow
+from pacing import Pacer
+from virtual_xbee import make_device, make_remote
+from results_db import ResultsDB
 
-def run_client(port, remote_addr, num_pacotes, max_tempo, packets_per_second, baud_rate=BAUD_RATE, csv_file=CSV_FILE):
-    session_counter = load_session_counter() + 1
-    save_session_counter(session_counter)
+START_RETRIES = 5  # tentativas de START quando o servidor responde BUSY
+PAYLOAD_SIZE = 50
+FLUSH_TIMEOUT = 0.05  # s máximos que um pacote lógico espera num quadro agregado incompleto
+
+REPORT_FIELDS = ["SessionID", "EnviadosCliente", "UnicosRecebidos", "TotalRecebidos", "Duplicados",
+                 "Perda(%)", "Goodput(kbps)", "ForaDeOrdem", "MaiorGap", "Rajadas",
+                 "QuadrosEnviados", "QuadrosRecebidos"]
+
+
+def parse_report(report_str):
+    """REPORT;... -> lista na ordem de REPORT_FIELDS (campos que o servidor não mandou ficam vazios)."""
+    parts = report_str.split(";")
+    if len(parts) < 8:
+        return None
+    # campos extras (SeqTracker, quadros); servidor antigo manda só os 8
+    n = len(REPORT_FIELDS)
+    return (parts[1:n + 1] + [""] * n)[:n]
+
+
+def check_payload(device, payload_size, data_format=frames.FORMAT_BIN, aggregate=0, session_id="", max_seq=0):
+    """Mensagem de erro se o quadro DATA não cabe no NP do módulo, ou None."""
+    np_max = max_rf_payload(device)
+    size = frames.data_size(data_format, payload_size, aggregate, session_id, max_seq)
+    if size > np_max:
+        return f"payload de {payload_size} bytes gera quadros de {size} bytes, acima do NP do módulo ({np_max})"
+    return None
+
+
+def run_session(device, remote, num_pacotes, packets_per_second, data_format=frames.FORMAT_BIN, tx_window=0,
+                tx_log=None, interval=0, payload_size=PAYLOAD_SIZE, aggregate=0, flush_timeout=FLUSH_TIMEOUT,
+                db=None):
+    """
+    Uma sessão START/DATA/END num dispositivo já aberto (que continua aberto:
+    o sweep.py reaproveita o mesmo para vários pontos). Devolve um dict com
+    o REPORT (lista em REPORT_FIELDS, ou None), os IREPORTs e o resumo de TX.
+    Com aggregate > 0, até `aggregate` pacotes lógicos (limitado pelo NP do
+    módulo) vão num só quadro; um quadro incompleto sai após flush_timeout.
+    Com db (results_db.ResultsDB) o sessionID sai do contador atômico do banco.
+    """
+    if db is not None:
+        session_counter = db.next_session_id()
+    else:
+        session_counter = load_session_counter() + 1
+        save_session_counter(session_counter)
     sessionID = str(session_counter)
     print(f"Iniciando sessão #{sessionID}")
 
-    device = XBeeDevice(port, baud_rate)
-    device.open()
-    remote = RemoteXBeeDevice(device, XBee64BitAddress.from_hex_string(remote_addr))
-
     ok_received = False
+    busy_retry = None
     report_str = None
+    intervalos = []  # IREPORTs recebidos durante a sessão
+    result = {"session_id": sessionID, "enviados": 0, "quadros": 0, "report": None, "intervalos": intervalos,
+              "tx": None, "duracao_envio": 0.0, "pacer": None, "ts": time.time(),
+              "config": {"rate": packets_per_second, "payload": payload_size, "formato": data_format,
+                         "janela": tx_window, "agregacao": aggregate}}
+    if aggregate and data_format != frames.FORMAT_BIN:
+        print("Agregação só existe no formato binário; usando --format bin")
+        data_format = frames.FORMAT_BIN
+    # acima do NP todo send_data falharia: nem começa (result["erro"], sem START)
+    erro = check_payload(device, payload_size, data_format, aggregate, sessionID, num_pacotes)
+    if erro:
+        print(f"Sessão #{sessionID} não iniciada: {erro}")
+        result["erro"] = erro
+        return result
 
     def client_callback(msg):
-        nonlocal ok_received, report_str
+        nonlocal ok_received, busy_retry, report_str
         data = msg.data.decode(errors="ignore")
         if data == "OK":
             ok_received = True
+        elif data.startswith("BUSY"):
+            # servidor no limite de sessões: BUSY;sid;segundos_para_tentar_de_novo
+            parts = data.split(";")
+            busy_retry = float(parts[2]) if len(parts) > 2 else 2.0
+        elif data.startswith("IREPORT"):
+            # IREPORT;sid;idx;ini;fim;recebidos;unicos;duplicados;perda;goodput
+            parts = data.split(";")[1:]
+            intervalos.append(parts)
+            if len(parts) >= 9:
+                perda = f"{parts[7]}%" if parts[7] else "?"  # fatia sem pacotes: perda desconhecida
+                print(f"[{parts[2]}-{parts[3]} s] goodput {parts[8]} kbps, perda {perda}, dup {parts[6]}")
         elif data.startswith("REPORT"):
             report_str = data
 
     device.add_data_received_callback(client_callback)
+    try:
+        # START;sid;n;intervalo;payload (intervalo vazio = padrão do servidor)
+        intervalo = f"{interval:g}" if interval else ""
+        start_msg = f"START;{sessionID};{num_pacotes};{intervalo};{payload_size}"
+        for tentativa in range(START_RETRIES):
+            busy_retry = None
+            device.send_data(remote, start_msg)
+            print("START enviado, aguardando OK...")
+
+            wait_until = time.time() + 5
+            while not ok_received and busy_retry is None and time.time() < wait_until:
+                time.sleep(0.1)
+            if ok_received or busy_retry is None:
+                break
+            print(f"Servidor ocupado, nova tentativa em {busy_retry:g} s")
+            time.sleep(busy_retry)
+
+        if not ok_received:
+            print("Servidor não respondeu OK. Abortando.")
+            return result
+
+        payload = b"X" * payload_size
+        # quadro binário: payload fixo, só o cabeçalho é reescrito a cada envio
+        frame_buf = bytearray(frames.HEADER_SIZE) + payload
+        seq = 0
+        enviados = 0
+        quadros = 0
+        inicio = time.time()
+        pacer = result["pacer"] = Pacer(packets_per_second)
+
+        # tx_window > 0: até tx_window quadros em voo, sem esperar o TX Status de cada um
+        window = AsyncTxWindow(device, remote, tx_window) if tx_window else None
+
+        def send_frame(first_seq, msg):
+            nonlocal quadros
+            if window:
+                window.send(first_seq, msg.encode() if isinstance(msg, str) else msg)
+            else:
+                device.send_data(remote, msg)
+            quadros += 1
+
+        if aggregate:
+            capacity = min(aggregate, frames.agg_capacity(max_rf_payload(device), payload_size))
+            agg_buf = frames.agg_buffer(payload, capacity)
+            print(f"Agregação: até {capacity} pacotes de {payload_size} bytes por quadro")
+        batch_first = batch_n = 0
+        batch_deadline = 0.0
 
-    start_msg = f"START;{sessionID};{num_pacotes}"
-    device.send_data(remote, start_msg)
-    print("START enviado, aguardando OK...")
+        def flush():
+            nonlocal batch_n
+            send_frame(batch_first, frames.encode_agg_into(agg_buf, sessionID, batch_first, batch_n, payload_size))
+            batch_n = 0
 
-    wait_until = time.time() + 5
-    while not ok_received and time.time() < wait_until:
-        time.sleep(0.1)
+        while enviados < num_pacotes:
+            if batch_n and pacer.next_t is not None and pacer.next_t > batch_deadline:
+                # o próximo pacote lógico só sai depois do flush_timeout: fecha o quadro no prazo
+                delay = batch_deadline - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                flush()
+            pacer.wait()
+            seq += 1
+            if aggregate:
+                if not batch_n:
+                    batch_first = seq
+                    batch_deadline = time.perf_counter() + flush_timeout
+                batch_n += 1
+                pacer.sent()
+                enviados += 1
+                if batch_n == capacity or enviados == num_pacotes:
+                    flush()
+                continue
+            if data_format == frames.FORMAT_BIN:
+                msg = frames.encode_data_into(frame_buf, sessionID, seq)
+            else:
+                msg = f"DATA;{sessionID};{seq};{payload.decode()}"
+            send_frame(seq, msg)
+            pacer.sent()
+            enviados += 1
+        result["enviados"] = enviados
+        result["quadros"] = quadros
+        result["duracao_envio"] = time.time() - inicio
+        p = pacer.summary()
+        print(f"Cadência: {p['real_pps']:.2f} pps (alvo {p['alvo_pps'] or '-'}), IDT médio {p['idt_medio_ms']:.3f} ms "
+              f"± {p['idt_desvio_ms']:.3f}, p99 {p['idt_p99_ms']:.3f} ms, máx {p['idt_max_ms']:.3f} ms, "
+              f"{p['ressincronizacoes']} ressincronizações")
 
-    if not ok_received:
-        print("Servidor não respondeu OK. Abortando.")
+        if window:
+            tx = result["tx"] = window.drain()
+            print(f"TX Status: {tx['entregues']}/{tx['quadros']} entregues, {tx['falhas']} falhas, "
+                  f"{tx['retries']} retries, latência mediana {tx['latencia_mediana_ms']:.1f} ms {tx['status']}")
+            if tx_log:
+                window.write_log(tx_log)
+                print(f"Status por quadro salvo em {tx_log}")
+
+        device.send_data(remote, f"END;{sessionID};{quadros}")
+        print(f"Enviados {enviados} pacotes em {quadros} quadros. Aguardando REPORT...")
+
+        timeout = time.time() + 10
+        while report_str is None and time.time() < timeout:
+            time.sleep(0.1)
+
+        if report_str:
+            print("Relatório recebido:", report_str)
+            result["report"] = parse_report(report_str)
+        else:
+            print("Timeout aguardando REPORT.")
+        return result
+    finally:
+        device.del_data_received_callback(client_callback)
+
+
+def write_report(csv_file, report):
+    write_header = not os.path.exists(csv_file)
+    with open(csv_file, "a", newline="") as f:
+        writer = csv.writer(f)
+        if write_header:
+            writer.writerow(REPORT_FIELDS)
+        writer.writerow(report)
+    print(f"Relatório salvo em {csv_file}")
+
+
+def write_intervals(csv_file, intervalos):
+    path = intervals_path(csv_file)
+    write_header = not os.path.exists(path)
+    with open(path, "a", newline="") as f:
+        writer = csv.writer(f)
+        if write_header:
+            writer.writerow(INTERVAL_FIELDS)
+        writer.writerows(intervalos)
+    print(f"{len(intervalos)} intervalos salvos em {path}")
+
+
+def write_idt(csv_file, session_id, pacer):
+    """Histograma de IDT da sessão + resumo, ao lado do CSV de relatórios."""
+    path = sibling_path(csv_file, "idt")
+    write_header = not os.path.exists(path)
+    p = pacer.summary()
+    with open(path, "a", newline="") as f:
+        writer = csv.writer(f)
+        if write_header:
+            writer.writerow(["SessionID", "AlvoPps", "RealPps", "IDTMedio(ms)", "IDTDesvio(ms)", "IDTp99(ms)",
+                             "BinInicio(ms)", "BinFim(ms)", "Contagem"])
+        resumo = [session_id, p["alvo_pps"], f"{p['real_pps']:.3f}", f"{p['idt_medio_ms']:.4f}",
+                  f"{p['idt_desvio_ms']:.4f}", f"{p['idt_p99_ms']:.4f}"]
+        for row in pacer.histogram_rows():
+            writer.writerow(resumo + list(row))
+    print(f"Histograma de IDT salvo em {path}")
+
+
+def run_client(port, remote_addr, num_pacotes, max_tempo, packets_per_second, baud_rate=BAUD_RATE, csv_file=CSV_FILE,
+               data_format=frames.FORMAT_BIN, tx_window=0, tx_log=None, interval=0, payload_size=PAYLOAD_SIZE,
+               aggregate=0, flush_timeout=FLUSH_TIMEOUT, db_file=DB_FILE):
+    device = make_device(port, baud_rate)  # "sim:..." -> enlace virtual (virtual_xbee.py)
+    device.open()
+    remote = make_remote(device, remote_addr)
+    db = ResultsDB(db_file) if db_file else None
+
+    try:
+        result = run_session(device, remote, num_pacotes, packets_per_second, data_format, tx_window, tx_log,
+                             interval, payload_size, aggregate, flush_timeout, db)
+    finally:
         device.close()
-        return
 
-    payload = "X" * 50
-    seq = 0
-    enviados = 0
-    inicio = time.time()
-    interval = 1.0 / packets_per_second if packets_per_second else 0
-
-    next_send = time.time()
-    while enviados < num_pacotes:
-        seq += 1
-        msg = f"DATA;{sessionID};{seq};{payload}"
-        device.send_data(remote, msg)
-        enviados += 1
-
-        next_send += interval
-        delay = next_send - time.time()
-        if delay > 0:
-            time.sleep(delay)
-
-
-    device.send_data(remote, f"END;{sessionID}")
-    print(f"Enviados {enviados} pacotes. Aguardando REPORT...")
-
-    timeout = time.time() + 10
-    while report_str is None and time.time() < timeout:
-        time.sleep(0.1)
-
-    if report_str:
-        print("Relatório recebido:", report_str)
-        parts = report_str.split(";")
-        if len(parts) == 8:
-            _, sid, enviados_cli, unicos, total, duplicados, perda, goodput = parts
-            write_header = not os.path.exists(csv_file)
-            with open(csv_file, "a", newline="") as f:
-                writer = csv.writer(f)
-                if write_header:
-                    writer.writerow(["SessionID", "EnviadosCliente", "UnicosRecebidos",
-                                     "TotalRecebidos", "Duplicados", "Perda(%)", "Goodput(kbps)"])
-                writer.writerow([sid, enviados_cli, unicos, total, duplicados, perda, goodput])
-            print(f"Relatório salvo em {csv_file}")
-    else:
-        print("Timeout aguardando REPORT.")
+    if db is not None:
+        db.add_result(result, link=remote_addr, baud=baud_rate)
+        db.close()
 
-    device.close()
-    sys.exit(0)
\ No newline at end of file
+    if result["report"]:
+        write_report(csv_file, result["report"])
+    if result["intervalos"]:
+        write_intervals(csv_file, result["intervalos"])
+    if result["pacer"] and result["pacer"].count:
+        write_idt(csv_file, result["session_id"], result["pacer"])
+    if not result["enviados"]:
+        return
+    sys.exit(0)
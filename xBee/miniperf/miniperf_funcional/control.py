@@ -0,0 +1,75 @@
+# control.py
+# Canal de controle local dos processos de longa duração (daemon do cliente,
+# servidor): uma requisição JSON por linha, uma resposta JSON por linha.
+# Endereço = caminho de socket Unix, ou "host:porta" (TCP, para sistemas sem
+# AF_UNIX).
+import json
+import os
+import socket
+import socketserver
+import threading
+
+CONTROL = "/tmp/miniperf.sock"
+
+
+def _tcp(addr):
+    host, sep, port = str(addr).rpartition(":")
+    if sep and port.isdigit() and "/" not in addr:
+        return host or "127.0.0.1", int(port)
+    return None
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def serve(addr, handler):
+    """
+    Atende `addr` numa thread; handler(dict) -> dict é chamado numa thread por
+    conexão. Devolve o servidor (shutdown()/server_close() para encerrar).
+    """
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                try:
+                    resp = handler(json.loads(line))
+                except Exception as e:
+                    resp = {"erro": str(e)}
+                self.wfile.write((json.dumps(resp) + "\n").encode())
+                self.wfile.flush()
+
+    tcp = _tcp(addr)
+    if tcp:
+        server = _TCPServer(tcp, Handler)
+    else:
+        if os.path.exists(addr):
+            os.unlink(addr)  # socket de uma execução anterior
+        server = socketserver.ThreadingUnixStreamServer(addr, Handler)
+        server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def close(server, addr):
+    server.shutdown()
+    server.server_close()
+    if not _tcp(addr) and os.path.exists(addr):
+        os.unlink(addr)
+
+
+def request(addr, msg, timeout=None):
+    """Envia uma requisição e espera a resposta (timeout None = sem limite: sessões longas)."""
+    tcp = _tcp(addr)
+    sock = socket.create_connection(tcp, timeout) if tcp else socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    with sock:
+        if not tcp:
+            sock.settimeout(timeout)
+            sock.connect(addr)
+        sock.sendall((json.dumps(msg) + "\n").encode())
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError(f"{addr} fechou a conexão sem responder")
+    return json.loads(line)
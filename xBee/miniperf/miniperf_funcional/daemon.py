@@ -0,0 +1,170 @@
+# daemon.py
+# Cliente miniperf de longa duração: abre o XBee uma vez e atende pedidos de
+# sessão pelo canal de controle (control.py), um depois do outro, devolvendo o
+# REPORT a quem pediu. Em campanhas de centenas de sessões, abrir/fechar a
+# serial e subir o interpretador a cada sessão custava mais que a medição.
+#
+#   python3 daemon.py serve -c /dev/ttyUSB1 --control /tmp/miniperf.sock
+#   python3 daemon.py run --remote 0013A20041FBCD12 -n 1000 --rate 20 --payload 50
+#   python3 daemon.py status
+#   python3 daemon.py stop
+#
+# O servidor já é de longa duração; com --control no main.py ele responde a
+# status/stop pelo mesmo protocolo (daemon.py status --control ...).
+import argparse
+import json
+import sys
+import threading
+import time
+import frames
+import control
+from client import run_session, write_report, write_intervals, REPORT_FIELDS, PAYLOAD_SIZE, FLUSH_TIMEOUT
+from results_db import ResultsDB
+from utils import BAUD_RATE, DB_FILE
+from virtual_xbee import make_device, make_remote
+
+# campos de um pedido de sessão e seus padrões (mesmos do main.py)
+SESSION_DEFAULTS = {"num": 100, "rate": None, "payload": PAYLOAD_SIZE, "format": frames.FORMAT_BIN, "window": 0,
+                    "interval": 0, "aggregate": 0, "flush_ms": FLUSH_TIMEOUT * 1000}
+
+
+class ClientDaemon:
+
+    def __init__(self, port, baud_rate=BAUD_RATE, db_file=DB_FILE):
+        self.port = port
+        self.baud_rate = baud_rate
+        self.device = make_device(port, baud_rate)
+        self.device.open()
+        self.db_file = db_file
+        self.db = None
+        self.remotes = {}
+        self.lock = threading.Lock()   # um rádio: sessões uma de cada vez, na ordem de chegada
+        self.stop_event = threading.Event()
+        self.inicio = time.time()
+        self.sessoes = 0
+        self.atual = None
+
+    def handle(self, req):
+        cmd = req.get("cmd")
+        if cmd == "session":
+            return self.session(req)
+        if cmd == "status":
+            return {"porta": self.port, "baud": self.baud_rate, "sessoes": self.sessoes, "atual": self.atual,
+                    "no_ar_s": round(time.time() - self.inicio, 1)}
+        if cmd == "stop":
+            self.stop_event.set()
+            return {"ok": True}
+        return {"erro": f"comando desconhecido: {cmd}"}
+
+    def session(self, req):
+        unknown = set(req) - set(SESSION_DEFAULTS) - {"cmd", "remote"}
+        if unknown or not req.get("remote"):
+            return {"erro": f"pedido inválido (remote obrigatório; campos desconhecidos: {sorted(unknown)})"}
+        p = dict(SESSION_DEFAULTS, **req)
+        with self.lock:
+            # conferido com o lock: um pedido que esperava a sessão anterior não pega o rádio já fechado
+            if self.stop_event.is_set():
+                return {"erro": "daemon encerrando; sessão não iniciada"}
+            remote = self.remotes.get(p["remote"])
+            if remote is None:
+                remote = self.remotes[p["remote"]] = make_remote(self.device, p["remote"])
+            # a conexão SQLite fica na thread que a criou; cada sessão abre a sua (WAL, barato)
+            db = ResultsDB(self.db_file) if self.db_file else None
+            self.atual = p["remote"]
+            try:
+                result = run_session(self.device, remote, p["num"], p["rate"], p["format"], p["window"], None,
+                                     p["interval"], p["payload"], p["aggregate"], p["flush_ms"] / 1000, db)
+                if db is not None:
+                    db.add_result(result, link=p["remote"], baud=self.baud_rate, origem="daemon")
+            finally:
+                self.atual = None
+                if db is not None:
+                    db.close()
+            self.sessoes += 1
+        if result.get("erro"):
+            return {"erro": result["erro"], "session_id": result["session_id"]}
+        report = result["report"]
+        return {
+            "session_id": result["session_id"],
+            "enviados": result["enviados"],
+            "quadros": result["quadros"],
+            "report": dict(zip(REPORT_FIELDS, report)) if report else None,
+            "intervalos": result["intervalos"],
+            "tx": result["tx"],
+            "pacer": result["pacer"].summary() if result["pacer"] and result["pacer"].count else None,
+            "duracao_envio": result["duracao_envio"],
+        }
+
+    def serve(self, addr):
+        server = control.serve(addr, self.handle)
+        print(f"Daemon do cliente em {addr} (XBee {self.port} aberto)")
+        try:
+            while not self.stop_event.wait(0.5):
+                pass
+        except KeyboardInterrupt:
+            self.stop_event.set()
+        finally:
+            control.close(server, addr)
+            # espera a sessão em andamento terminar antes de fechar o rádio
+            with self.lock:
+                self.device.close()
+            print(f"Daemon encerrado após {self.sessoes} sessões.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Daemon do cliente miniperf (XBee aberto entre sessões)")
+    parser.add_argument("--control", default=control.CONTROL, help="Socket Unix (ou host:porta) de controle")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    sv = sub.add_parser("serve", help="Abre o XBee e atende pedidos de sessão")
+    sv.add_argument("-c", "--client", required=True, help="Porta serial do XBee cliente (ou sim:/raw:)")
+    sv.add_argument("--baud", type=int, default=BAUD_RATE)
+    sv.add_argument("--db", default=DB_FILE, help="Banco de resultados (\"\" = não grava)")
+
+    rn = sub.add_parser("run", help="Pede uma sessão ao daemon e espera o REPORT")
+    rn.add_argument("--remote", required=True)
+    rn.add_argument("-n", "--num", type=int, default=SESSION_DEFAULTS["num"])
+    rn.add_argument("--rate", type=float, default=None)
+    rn.add_argument("--payload", type=int, default=PAYLOAD_SIZE)
+    rn.add_argument("--format", choices=[frames.FORMAT_BIN, frames.FORMAT_TEXT], default=frames.FORMAT_BIN)
+    rn.add_argument("--window", type=int, default=0)
+    rn.add_argument("-i", "--interval", type=float, default=0)
+    rn.add_argument("--aggregate", type=int, default=0)
+    rn.add_argument("--flush-ms", type=float, default=SESSION_DEFAULTS["flush_ms"])
+    rn.add_argument("--csv", default=None, help="Também acrescenta o REPORT (e os IREPORTs) neste CSV")
+    rn.add_argument("--json", action="store_true", help="Imprime a resposta inteira em JSON")
+
+    sub.add_parser("status", help="Estado do daemon (ou do servidor com --control)")
+    sub.add_parser("stop", help="Encerra o daemon (ou o servidor)")
+    args = parser.parse_args()
+
+    if args.cmd == "serve":
+        ClientDaemon(args.client, args.baud, args.db).serve(args.control)
+        return
+    if args.cmd in ("status", "stop"):
+        print(json.dumps(control.request(args.control, {"cmd": args.cmd}, timeout=10), indent=2))
+        return
+
+    req = {"cmd": "session", "remote": args.remote, "num": args.num, "rate": args.rate, "payload": args.payload,
+           "format": args.format, "window": args.window, "interval": args.interval, "aggregate": args.aggregate,
+           "flush_ms": args.flush_ms}
+    resp = control.request(args.control, req)
+    if args.json:
+        print(json.dumps(resp, indent=2))
+    if "erro" in resp:
+        print("Erro:", resp["erro"])
+        sys.exit(1)
+    report = resp["report"]
+    if not report:
+        print(f"Sessão {resp['session_id']}: sem REPORT ({resp['enviados']} enviados)")
+        sys.exit(2)
+    if not args.json:
+        print("REPORT;" + ";".join(str(report[f]) for f in REPORT_FIELDS))
+    if args.csv:
+        write_report(args.csv, [report[f] for f in REPORT_FIELDS])
+        if resp["intervalos"]:
+            write_intervals(args.csv, resp["intervalos"])
+
+
+if __name__ == "__main__":
+    main()
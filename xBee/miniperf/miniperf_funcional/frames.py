@@ -0,0 +1,115 @@
+# frames.py
+# Formato binário dos quadros DATA (o handshake START/OK/END/REPORT continua em texto).
+#
+# byte 0 : 1 | versão (3 bits) | tipo (4 bits)  -> sempre >= 0x80, nunca ASCII,
+#          então o servidor distingue binário de texto só pelo primeiro byte
+# 1..2   : sessionID (u16, sessionID % 65536)
+# 3..6   : seq (u32)
+# 7..10  : timestamp do envio em ms (u32, relógio do cliente, com wrap)
+# 11..   : payload
+#
+# Quadro agregado (TYPE_AGG): vários pacotes lógicos de seqs consecutivos num
+# só quadro de rádio. Mesmo cabeçalho, com seq = primeiro seq, e em seguida
+# 11     : quantidade de pacotes lógicos (u8)
+# 12..   : quantidade x payload
+import struct
+import time
+
+VERSION = 1
+TYPE_DATA = 1
+TYPE_AGG = 2
+MAX_AGG = 255
+
+HEADER = struct.Struct("!BHII")
+HEADER_SIZE = HEADER.size  # 11 bytes
+
+FORMAT_TEXT = "text"
+FORMAT_BIN = "bin"
+
+
+def session_key(session_id) -> int:
+    """Chave da sessão como aparece no quadro binário (u16)."""
+    return int(session_id) & 0xFFFF
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000) & 0xFFFFFFFF
+
+
+def is_binary(data) -> bool:
+    return len(data) > 0 and data[0] & 0x80 != 0
+
+
+def route_key(data) -> int:
+    """
+    Chave da sessão de um quadro qualquer (binário ou texto) sem decodificá-lo
+    por inteiro; usada só para escolher o worker. Quadro ilegível -> 0.
+    """
+    if is_binary(data):
+        return (data[1] << 8) | data[2] if len(data) >= 3 else 0
+    parts = bytes(data).split(b";", 2)
+    try:
+        return session_key(parts[1])
+    except (IndexError, ValueError):
+        return 0
+
+
+def encode_data(session_id, seq, payload: bytes, ts_ms=None) -> bytes:
+    tipo = 0x80 | (VERSION << 4) | TYPE_DATA
+    ts = now_ms() if ts_ms is None else ts_ms
+    return HEADER.pack(tipo, session_key(session_id), seq & 0xFFFFFFFF, ts) + payload
+
+
+def encode_data_into(buf: bytearray, session_id, seq, ts_ms=None) -> bytearray:
+    """Reescreve só o cabeçalho de um buffer já com o payload (evita recriar o quadro)."""
+    tipo = 0x80 | (VERSION << 4) | TYPE_DATA
+    ts = now_ms() if ts_ms is None else ts_ms
+    HEADER.pack_into(buf, 0, tipo, session_key(session_id), seq & 0xFFFFFFFF, ts)
+    return buf
+
+
+def agg_capacity(max_payload, payload_size) -> int:
+    """Quantos pacotes lógicos de `payload_size` cabem num quadro de `max_payload` bytes (NP); 0 = nenhum."""
+    return max(0, min(MAX_AGG, (max_payload - HEADER_SIZE - 1) // max(1, payload_size)))
+
+
+def data_size(fmt, payload_size, aggregate=0, session_id="", max_seq=0) -> int:
+    """Bytes do maior quadro DATA de uma sessão (um pacote lógico, se agregada)."""
+    if fmt == FORMAT_BIN:
+        return HEADER_SIZE + (1 if aggregate else 0) + payload_size
+    return len(f"DATA;{session_id};{max_seq};") + payload_size
+
+
+def agg_buffer(payload: bytes, capacity) -> bytearray:
+    """Buffer de um quadro agregado cheio; só o cabeçalho e a contagem mudam a cada envio."""
+    return bytearray(HEADER_SIZE + 1) + payload * capacity
+
+
+def encode_agg_into(buf: bytearray, session_id, first_seq, count, payload_size, ts_ms=None) -> bytearray:
+    """Preenche cabeçalho + contagem e devolve o quadro com `count` pacotes lógicos."""
+    tipo = 0x80 | (VERSION << 4) | TYPE_AGG
+    ts = now_ms() if ts_ms is None else ts_ms
+    HEADER.pack_into(buf, 0, tipo, session_key(session_id), first_seq & 0xFFFFFFFF, ts)
+    buf[HEADER_SIZE] = count
+    return buf[:HEADER_SIZE + 1 + count * payload_size]
+
+
+def decode_data(data):
+    """
+    Decodifica um quadro binário sem criar strings intermediárias.
+    Retorna (versão, tipo, session_key, seq, ts_ms, payload_memoryview) ou None.
+    """
+    if len(data) < HEADER_SIZE:
+        return None
+    tipo, sid, seq, ts = HEADER.unpack_from(data)
+    version = (tipo >> 4) & 0x07
+    if version != VERSION:
+        return None
+    return version, tipo & 0x0F, sid, seq, ts, memoryview(data)[HEADER_SIZE:]
+
+
+def build_data(fmt, session_id, seq, payload: bytes):
+    """Quadro DATA no formato pedido (texto legado ou binário)."""
+    if fmt == FORMAT_BIN:
+        return encode_data(session_id, seq, payload)
+    return f"DATA;{session_id};{seq};{payload.decode(errors='ignore')}"
@@ -3,6 +3,8 @@ import argparse
 import sys
 from server import run_server
 from client import run_client
+import frames
+from utils import DB_FILE, server_intervals_path
 
 def main():
     parser = argparse.ArgumentParser(description="miniperf XBee modular")
@@ -16,15 +18,45 @@ def main():
     parser.add_argument("-n", "--num", type=int, default=100)
     parser.add_argument("-t", "--time", type=int, default=10)
     parser.add_argument("--rate", type=int, help="Pacotes por segundo")
+    parser.add_argument("--format", choices=[frames.FORMAT_BIN, frames.FORMAT_TEXT], default=frames.FORMAT_BIN,
+                        help="Formato dos quadros DATA (bin: cabeçalho binário de 11 bytes; text: legado DATA;sid;seq;payload)")
+    parser.add_argument("--window", type=int, default=0,
+                        help="Quadros DATA em voo sem esperar TX Status (0 = síncrono, um por vez; máx. 255)")
+    parser.add_argument("--tx-log", default=None, help="CSV com status/retries de cada quadro (com --window)")
+    parser.add_argument("--workers", type=int, default=2, help="Workers de processamento no servidor")
+    parser.add_argument("--queue", type=int, default=4096, help="Tamanho de cada fila de recepção do servidor")
+    parser.add_argument("--stats", type=float, default=0,
+                        help="Intervalo (s) para imprimir métricas da fila de recepção (0 = desligado)")
+    parser.add_argument("--max-sessions", type=int, default=32,
+                        help="Sessões simultâneas no servidor; acima disso o START recebe BUSY")
+    parser.add_argument("--idle-timeout", type=float, default=30.0,
+                        help="Segundos sem quadros até o servidor encerrar a sessão com REPORT parcial (0 = nunca)")
+    parser.add_argument("-i", "--interval", type=float, default=0,
+                        help="Segundos entre relatórios parciais (IREPORT) de goodput/perda (0 = só o REPORT final)")
+    parser.add_argument("--payload", type=int, default=50, help="Bytes de payload por pacote DATA")
+    parser.add_argument("--aggregate", type=int, default=0,
+                        help="Pacotes lógicos por quadro de rádio (0 = um por quadro; limitado pelo NP do módulo)")
+    parser.add_argument("--flush-ms", type=float, default=50,
+                        help="Tempo máximo (ms) de espera de um quadro agregado incompleto")
+    parser.add_argument("--db", default=DB_FILE,
+                        help="Banco SQLite de resultados e sessionIDs (\"\" = só CSV e session_counter.txt)")
+    parser.add_argument("--control", default=None,
+                        help="Servidor: socket Unix (ou host:porta) para status/stop (ver daemon.py)")
     args = parser.parse_args()
 
     if args.server:
-        run_server(args.server, args.num, args.baud)
+        run_server(args.server, args.num, args.baud, workers=args.workers, queue_size=args.queue,
+                   stats_interval=args.stats, max_sessions=args.max_sessions, idle_timeout=args.idle_timeout,
+                   interval=args.interval, interval_csv=server_intervals_path(args.csv),
+                   control_addr=args.control)
     elif args.client:
         if not args.remote:
             print("Cliente precisa do endereço remoto (--remote)")
             sys.exit(1)
-        run_client(args.client, args.remote, args.num, args.time, args.rate, args.baud, args.csv)
+        run_client(args.client, args.remote, args.num, args.time, args.rate, args.baud, args.csv,
+                   data_format=args.format, tx_window=args.window, tx_log=args.tx_log, interval=args.interval,
+                   payload_size=args.payload, aggregate=args.aggregate, flush_timeout=args.flush_ms / 1000,
+                   db_file=args.db)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
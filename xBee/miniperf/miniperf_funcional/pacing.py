@@ -0,0 +1,108 @@
+# pacing.py
+# Cadência de envio do cliente em relógio monotônico (perf_counter), com
+# sleep até perto do instante de saída e spin no final: o sleep do SO tem
+# granularidade de ~1 ms ou pior, o que a 50+ pps já vira jitter visível.
+# Atraso acumulado (send_data lento, janela cheia) é recuperado em rajada de no
+# máximo `max_burst` pacotes; o que passar disso é descartado do cronograma.
+# Os intervalos entre saídas (IDT) vão para um histograma, para comprovar que
+# a carga oferecida foi a configurada.
+import math
+import time
+from collections import Counter
+
+SPIN_S = 0.002     # últimos 2 ms em espera ativa
+MAX_BURST = 4
+BINS = 40          # bins do histograma entre 0 e 2x o intervalo alvo (+ overflow)
+
+
+class Pacer:
+
+    def __init__(self, rate, spin=SPIN_S, max_burst=MAX_BURST):
+        self.rate = rate or 0
+        self.interval = 1.0 / rate if rate else 0.0
+        self.spin = spin
+        self.max_burst = max_burst
+        # bins de 1/20 do intervalo alvo (sem taxa: 0,1 ms)
+        self.bin_width = self.interval * 2 / BINS if self.interval else 0.0001
+        self.hist = Counter()
+        self.next_t = None
+        self.last = None
+        self.first = None
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.max_idt = 0.0
+        self.resets = 0  # vezes em que o atraso passou de max_burst intervalos
+
+    def wait(self):
+        """Bloqueia até o instante da próxima saída."""
+        now = time.perf_counter()
+        if self.next_t is None:
+            self.next_t = now
+            return
+        remaining = self.next_t - now
+        if remaining > self.spin:
+            time.sleep(remaining - self.spin)
+        while time.perf_counter() < self.next_t:
+            pass
+
+    def sent(self):
+        """Registra a saída de um pacote (logo depois do send) e agenda o próximo."""
+        now = time.perf_counter()
+        if self.last is not None:
+            idt = now - self.last
+            self.hist[min(int(idt / self.bin_width), BINS)] += 1
+            # média/variância incrementais (Welford)
+            self.count += 1
+            d = idt - self.mean
+            self.mean += d / self.count
+            self.m2 += d * (idt - self.mean)
+            if idt > self.max_idt:
+                self.max_idt = idt
+        else:
+            self.first = now
+        self.last = now
+        if not self.interval:
+            self.next_t = now  # sem taxa: sem cronograma, nada a recuperar nem ressincronizar
+            return
+        if self.next_t is None:
+            self.next_t = now
+        self.next_t += self.interval
+        floor = now - self.max_burst * self.interval
+        if self.next_t < floor:
+            self.next_t = floor
+            self.resets += 1
+
+    def quantile(self, q):
+        """Quantil do IDT (s) pelo histograma (limite superior do bin)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        acc = 0
+        for b in sorted(self.hist):
+            acc += self.hist[b]
+            if acc >= target:
+                return (b + 1) * self.bin_width if b < BINS else self.max_idt
+        return self.max_idt
+
+    def summary(self):
+        elapsed = (self.last - self.first) if self.count else 0.0
+        return {
+            "alvo_pps": self.rate,
+            "real_pps": self.count / elapsed if elapsed > 0 else 0.0,
+            "idt_medio_ms": self.mean * 1000,
+            "idt_desvio_ms": math.sqrt(self.m2 / (self.count - 1)) * 1000 if self.count > 1 else 0.0,
+            "idt_p50_ms": self.quantile(0.5) * 1000,
+            "idt_p99_ms": self.quantile(0.99) * 1000,
+            "idt_max_ms": self.max_idt * 1000,
+            "ressincronizacoes": self.resets,
+        }
+
+    def histogram_rows(self):
+        """(início_ms, fim_ms, contagem) de cada bin não vazio; o último bin é o overflow."""
+        rows = []
+        for b in sorted(self.hist):
+            ini = b * self.bin_width * 1000
+            fim = (b + 1) * self.bin_width * 1000 if b < BINS else self.max_idt * 1000
+            rows.append((f"{ini:.3f}", f"{fim:.3f}", self.hist[b]))
+        return rows
@@ -0,0 +1,400 @@
+# results_db.py
+# Banco único de resultados (SQLite em modo WAL) para o miniperf e o gerador
+# Markov (cadeia_markov), no lugar de reler todos os CSVs a cada consulta:
+#   - sessions   : um REPORT por linha (cliente, sweep ou CSV importado), com
+#                  instante, enlace (local->remoto), taxa e configuração;
+#   - intervals  : série de IREPORTs de cada sessão;
+#   - markov_steps: passos dos traffic_log*/debug*.csv do gerador;
+#   - counters   : contador de sessionID, incrementado dentro de uma transação
+#                  BEGIN IMMEDIATE (vários clientes ao mesmo tempo não repetem ID).
+# Inserções em lote (executemany numa transação só). Índices por sessão/run,
+# instante, enlace e configuração, então "goodput por taxa no último mês" é um
+# range scan no índice de ts.
+#
+# Sessões que o cliente/sweep já gravaram não entram de novo pelo import do
+# CSV delas (mesmo session_id, e mesmo enlace quando o CSV traz o remoto); as
+# ignoradas são listadas, e `import --all` as importa (CSV de outra máquina).
+#
+#   python3 results_db.py import resultados.csv ../../../cadeia_markov/*.csv
+#   python3 results_db.py goodput --days 30
+#   python3 results_db.py markov --days 30
+import argparse
+import csv
+import itertools
+import os
+import sqlite3
+import time
+from session import load_session_counter
+from utils import DB_FILE
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    link TEXT,
+    config TEXT,
+    rate REAL,
+    payload INTEGER,
+    baud INTEGER,
+    enviados INTEGER,
+    unicos INTEGER,
+    total INTEGER,
+    duplicados INTEGER,
+    perda REAL,
+    goodput REAL,
+    fora_de_ordem INTEGER,
+    maior_gap INTEGER,
+    rajadas TEXT,
+    quadros_enviados INTEGER,
+    quadros_recebidos INTEGER,
+    taxa_real REAL,
+    origem TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_sid ON sessions (session_id);
+CREATE INDEX IF NOT EXISTS sessions_ts ON sessions (ts);
+CREATE INDEX IF NOT EXISTS sessions_link ON sessions (link, ts);
+CREATE INDEX IF NOT EXISTS sessions_config ON sessions (config, rate);
+CREATE TABLE IF NOT EXISTS intervals (
+    session_id TEXT NOT NULL,
+    link TEXT,
+    idx INTEGER,
+    inicio REAL,
+    fim REAL,
+    recebidos INTEGER,
+    unicos INTEGER,
+    duplicados INTEGER,
+    perda REAL,
+    goodput REAL,
+    ts REAL,
+    origem TEXT
+);
+CREATE INDEX IF NOT EXISTS intervals_sid ON intervals (session_id, idx);
+CREATE INDEX IF NOT EXISTS intervals_ts ON intervals (ts);
+CREATE TABLE IF NOT EXISTS markov_steps (
+    run_id TEXT,
+    step INTEGER,
+    state INTEGER,
+    rate_mbps REAL,
+    duration_s REAL,
+    bytes_sent INTEGER,
+    achieved_mbps REAL,
+    ts REAL,
+    origem TEXT
+);
+CREATE INDEX IF NOT EXISTS markov_run ON markov_steps (run_id, step);
+CREATE INDEX IF NOT EXISTS markov_ts ON markov_steps (ts);
+CREATE INDEX IF NOT EXISTS markov_rate ON markov_steps (rate_mbps, ts);
+-- CSVs já importados: linhas lidas, para reimportar só o que foi acrescentado
+CREATE TABLE IF NOT EXISTS imports (path TEXT PRIMARY KEY, rows INTEGER NOT NULL, ts REAL NOT NULL, size INTEGER);
+"""
+
+SESSION_COLUMNS = ["session_id", "ts", "link", "config", "rate", "payload", "baud", "enviados", "unicos", "total",
+                   "duplicados", "perda", "goodput", "fora_de_ordem", "maior_gap", "rajadas", "quadros_enviados",
+                   "quadros_recebidos", "taxa_real", "origem"]
+INTERVAL_COLUMNS = ["session_id", "link", "idx", "inicio", "fim", "recebidos", "unicos", "duplicados", "perda",
+                    "goodput", "ts", "origem"]
+MARKOV_COLUMNS = ["run_id", "step", "state", "rate_mbps", "duration_s", "bytes_sent", "achieved_mbps", "ts", "origem"]
+
+# coluna do CSV -> coluna do banco (REPORT_FIELDS do cliente, POINT_FIELDS do sweep, INTERVAL_FIELDS)
+CSV_SESSION = {
+    "SessionID": "session_id", "Timestamp": "ts", "Remoto": "link", "Taxa(pps)": "rate", "Payload": "payload",
+    "Baud": "baud", "EnviadosCliente": "enviados", "UnicosRecebidos": "unicos", "TotalRecebidos": "total",
+    "Duplicados": "duplicados", "Perda(%)": "perda", "Goodput(kbps)": "goodput", "ForaDeOrdem": "fora_de_ordem",
+    "MaiorGap": "maior_gap", "Rajadas": "rajadas", "QuadrosEnviados": "quadros_enviados",
+    "QuadrosRecebidos": "quadros_recebidos", "TaxaReal(pps)": "taxa_real",
+}
+CSV_INTERVAL = {
+    "SessionID": "session_id", "Remoto": "link", "Intervalo": "idx", "Inicio(s)": "inicio", "Fim(s)": "fim",
+    "Recebidos": "recebidos", "Unicos": "unicos", "Duplicados": "duplicados", "Perda(%)": "perda",
+    "Goodput(kbps)": "goodput",
+}
+# origem das sessões gravadas na hora (add_result); as importadas têm o nome do CSV
+LIVE_ORIGINS = ("cliente", "sweep", "daemon")
+# resultados.csv do miniperf.py: sem cabeçalho
+LEGACY_SESSION = ["session_id", "enviados", "unicos", "perda", "goodput"]
+
+
+def config_key(**kw) -> str:
+    """Configuração canônica (chaves em ordem) para agrupar sessões comparáveis."""
+    return ";".join(f"{k}={kw[k]}" for k in sorted(kw) if kw[k] not in (None, ""))
+
+
+def _num(v):
+    if v is None or v == "":
+        return None
+    try:
+        f = float(v)
+    except ValueError:
+        return v
+    return int(f) if f.is_integer() and "." not in str(v) else f
+
+
+class ResultsDB:
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)  # transações explícitas
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        if "size" not in [r[1] for r in self.conn.execute("PRAGMA table_info(imports)")]:
+            self.conn.execute("ALTER TABLE imports ADD COLUMN size INTEGER")  # banco de antes da coluna
+
+    def close(self):
+        self.conn.close()
+
+    def _insert(self, table, columns, rows):
+        rows = list(rows)
+        if not rows:
+            return 0
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        self.conn.execute("BEGIN")
+        try:
+            self.conn.executemany(sql, ([row.get(c) for c in columns] for row in rows))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return len(rows)
+
+    def next_session_id(self) -> int:
+        """
+        Próximo sessionID, atômico entre processos: BEGIN IMMEDIATE pega o lock
+        de escrita antes de ler o contador. Na primeira vez continua do
+        session_counter.txt (ou do maior ID já gravado).
+        """
+        c = self.conn
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            row = c.execute("SELECT value FROM counters WHERE name = 'session'").fetchone()
+            if row is None:
+                maior = c.execute("SELECT MAX(CAST(session_id AS INTEGER)) FROM sessions").fetchone()[0] or 0
+                value = max(load_session_counter(), maior) + 1
+                c.execute("INSERT INTO counters (name, value) VALUES ('session', ?)", (value,))
+            else:
+                value = row[0] + 1
+                c.execute("UPDATE counters SET value = ? WHERE name = 'session'", (value,))
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        return value
+
+    def add_sessions(self, rows):
+        return self._insert("sessions", SESSION_COLUMNS, rows)
+
+    def add_intervals(self, rows):
+        return self._insert("intervals", INTERVAL_COLUMNS, rows)
+
+    def add_markov_steps(self, rows):
+        return self._insert("markov_steps", MARKOV_COLUMNS, rows)
+
+    def add_result(self, result, link=None, baud=None, origem="cliente"):
+        """Grava uma sessão do client.run_session (REPORT + IREPORTs) numa transação por tabela."""
+        report = result.get("report")
+        if not report:
+            return
+        from client import REPORT_FIELDS  # aqui e não no topo: client.py importa este módulo
+        cfg = result.get("config", {})
+        row = {CSV_SESSION[f]: _num(v) for f, v in zip(REPORT_FIELDS, report)}
+        row.update(session_id=str(result["session_id"]), ts=result.get("ts") or time.time(), link=link,
+                   config=config_key(**{k: v for k, v in cfg.items() if k != "rate"}), rate=cfg.get("rate"),
+                   payload=cfg.get("payload"), baud=baud, origem=origem)
+        if result.get("pacer") and result["pacer"].count:
+            row["taxa_real"] = result["pacer"].summary()["real_pps"]
+        self.add_sessions([row])
+        # IREPORT: sid;idx;ini;fim;recebidos;unicos;duplicados;perda;goodput
+        self.add_intervals(dict(zip(INTERVAL_COLUMNS[2:10], map(_num, p[1:9])),
+                                session_id=row["session_id"], link=link, ts=row["ts"], origem=origem)
+                           for p in result.get("intervalos", []) if len(p) >= 9)
+
+    def import_csv(self, path, force=False, dedup=True):
+        """
+        Importa um CSV do miniperf (relatorio/resultados/sweep/intervalos) ou do
+        gerador Markov (traffic_log/loopback/debug), reconhecido pelo cabeçalho.
+        Só as linhas novas desde a última importação do mesmo arquivo; se ele
+        encolheu (truncado ou recriado), lê de novo desde o início. Com dedup,
+        sessões que o cliente/sweep/daemon já gravaram não entram de novo.
+        Devolve (tipo, linhas inseridas).
+        """
+        key = os.path.abspath(path)
+        size = os.path.getsize(path)
+        done = 0
+        if not force:
+            row = self.conn.execute("SELECT rows, size FROM imports WHERE path = ?", (key,)).fetchone()
+            if row and row[1] is not None and size < row[1]:
+                print(f"{path}: arquivo menor que na última importação; relendo desde o início")
+            elif row:
+                done = row[0]
+        kind, rows, total = self._read(path, done)
+        if kind is not None and total < done:
+            # menos linhas que as já importadas: outro arquivo com o mesmo nome
+            print(f"{path}: {total} linhas, menos que as {done} já importadas; relendo desde o início")
+            kind, rows, total = self._read(path, 0)
+        if kind is None:
+            return None, 0
+        if dedup and kind in ("sessoes", "intervalos"):
+            if kind == "sessoes":
+                rows, skipped = self._unseen(rows, "SELECT 1 FROM sessions WHERE session_id = ?")
+            else:
+                rows, skipped = self._unseen(rows, "SELECT 1 FROM intervals WHERE session_id = ? AND idx IS ?", "idx")
+            if skipped:
+                sids = sorted(set(skipped), key=lambda v: (len(v), v))
+                print(f"{path}: {len(skipped)} linhas de sessões já gravadas pelo cliente/sweep ignoradas "
+                      f"(session_id {', '.join(sids[:10])}{', ...' if len(sids) > 10 else ''}; "
+                      f"--all importa mesmo assim)")
+        table = {"sessoes": self.add_sessions, "intervalos": self.add_intervals, "markov": self.add_markov_steps}
+        n = table[kind](rows)
+        self.conn.execute("INSERT OR REPLACE INTO imports (path, rows, ts, size) VALUES (?, ?, ?, ?)",
+                          (key, total, time.time(), size))
+        return kind, n
+
+    def _read(self, path, done):
+        """(tipo, linhas convertidas depois das `done` primeiras, total de linhas de dados) de um CSV."""
+        mtime = os.path.getmtime(path)
+        csv.field_size_limit(2 ** 31 - 1)  # saída bruta do iperf nos debug*.csv (sys.maxsize estoura no Windows)
+        with open(path, newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return None, [], 0
+            kind, convert, data = self._layout(header, path, mtime)
+            if kind is None:
+                return None, [], 0
+            if data is not None:  # sem cabeçalho: a primeira linha é dado
+                reader = itertools.chain([data], reader)
+            total = 0
+            for _ in itertools.islice(reader, done):
+                total += 1
+            rows = []
+            for r in reader:
+                total += 1
+                row = convert(r)
+                if row is not None:
+                    rows.append(row)
+        return kind, rows, total
+
+    def _unseen(self, rows, sql, *keys):
+        """
+        (linhas novas, session_ids ignorados): o cliente, o sweep e o daemon já
+        gravam suas sessões, e o CSV delas traria uma cópia sem taxa/config.
+        Só contam como repetidas as sessões gravadas na hora (LIVE_ORIGINS),
+        não as de outro CSV importado; com o remoto no CSV, só as do mesmo
+        enlace. IDs de outra máquina podem coincidir: aí vale import --all.
+        """
+        sql += f" AND origem IN ({', '.join('?' * len(LIVE_ORIGINS))})"
+        out, skipped = [], []
+        for row in rows:
+            args = [row.get("session_id")] + [row.get(k) for k in keys] + list(LIVE_ORIGINS)
+            q = sql
+            if row.get("link") is not None:
+                q += " AND link = ?"
+                args.append(row["link"])
+            if self.conn.execute(q, args).fetchone() is None:
+                out.append(row)
+            else:
+                skipped.append(str(row.get("session_id")))
+        return out, skipped
+
+    def _layout(self, header, path, mtime):
+        """(tipo, conversor linha->dict, primeira linha se não era cabeçalho)."""
+        origem = os.path.basename(path)
+
+        def by_name(mapping, defaults):
+            idx = [(i, mapping[h]) for i, h in enumerate(header) if h in mapping]
+
+            def convert(r):
+                row = dict(defaults)
+                for i, col in idx:
+                    if i < len(r):
+                        row[col] = _num(r[i])
+                if row.get("session_id") is not None:
+                    row["session_id"] = str(row["session_id"])
+                return row
+            return convert
+
+        if "run_id" in header or "rate_Mbps" in header:
+            col = {h: i for i, h in enumerate(header)}
+
+            def markov(r):
+                g = lambda name: _num(r[col[name]]) if name in col and col[name] < len(r) else None
+                return {"run_id": g("run_id") if "run_id" in col else origem, "step": g("step"),
+                        "state": g("state"), "rate_mbps": g("rate_Mbps"), "duration_s": g("duration_s"),
+                        "bytes_sent": g("bytes_sent"), "achieved_mbps": g("achieved_Mbps"),
+                        "ts": g("wall_end") if "wall_end" in col else g("timestamp"), "origem": origem}
+            return "markov", markov, None
+        if "Intervalo" in header:
+            return "intervalos", by_name(CSV_INTERVAL, {"ts": mtime, "origem": origem}), None
+        if "SessionID" in header:
+            return "sessoes", by_name(CSV_SESSION, {"ts": mtime, "origem": origem}), None
+        if len(header) == len(LEGACY_SESSION):
+            def legacy(r):
+                if len(r) != len(LEGACY_SESSION):
+                    return None
+                row = dict(zip(LEGACY_SESSION, map(_num, r)), ts=mtime, origem=origem)
+                row["session_id"] = str(row["session_id"])
+                return row
+            return "sessoes", legacy, header
+        return None, None, None
+
+    def goodput_by_rate(self, since=0.0, link=None, config=None):
+        """(taxa, sessões, goodput médio, perda média) desde `since` (epoch)."""
+        sql = ("SELECT rate, COUNT(*), AVG(goodput), AVG(perda) FROM sessions WHERE ts >= ?"
+               + (" AND link = ?" if link else "") + (" AND config = ?" if config else "")
+               + " GROUP BY rate ORDER BY rate")
+        args = [since] + [v for v in (link, config) if v]
+        return self.conn.execute(sql, args).fetchall()
+
+    def markov_by_rate(self, since=0.0):
+        """(taxa pedida Mbps, passos, taxa obtida média) dos passos do gerador desde `since`."""
+        return self.conn.execute(
+            "SELECT rate_mbps, COUNT(*), AVG(COALESCE(achieved_mbps, bytes_sent * 8 / duration_s / 1e6)) "
+            "FROM markov_steps WHERE ts >= ? AND duration_s > 0 GROUP BY rate_mbps ORDER BY rate_mbps",
+            (since,)).fetchall()
+
+
+def _fmt(v, spec=".2f"):
+    return "-" if v is None else format(v, spec)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banco de resultados do miniperf / gerador Markov")
+    parser.add_argument("--db", default=DB_FILE)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("import", help="Importa CSVs (só as linhas novas de cada arquivo)")
+    imp.add_argument("files", nargs="+")
+    imp.add_argument("--force", action="store_true", help="Reimporta o arquivo inteiro")
+    imp.add_argument("--all", action="store_true",
+                     help="Não ignora sessões com session_id já gravado pelo cliente (CSV de outra máquina)")
+    gp = sub.add_parser("goodput", help="Goodput e perda médios por taxa")
+    gp.add_argument("--days", type=float, default=30)
+    gp.add_argument("--link")
+    gp.add_argument("--config")
+    mk = sub.add_parser("markov", help="Taxa obtida por taxa pedida nos passos do gerador")
+    mk.add_argument("--days", type=float, default=30)
+    args = parser.parse_args()
+
+    db = ResultsDB(args.db)
+    try:
+        if args.cmd == "import":
+            for path in args.files:
+                kind, n = db.import_csv(path, args.force, dedup=not args.all)
+                print(f"{path}: {n} linhas ({kind or 'formato desconhecido'})")
+        elif args.cmd == "goodput":
+            since = time.time() - args.days * 86400
+            print("Taxa(pps)  Sessões  Goodput(kbps)  Perda(%)")
+            for rate, n, goodput, perda in db.goodput_by_rate(since, args.link, args.config):
+                print(f"{_fmt(rate, 'g'):>9}  {n:>7}  {_fmt(goodput):>13}  {_fmt(perda):>8}")
+        elif args.cmd == "markov":
+            since = time.time() - args.days * 86400
+            print("Taxa(Mbps)  Passos  Obtida(Mbps)")
+            for rate, n, achieved in db.markov_by_rate(since):
+                print(f"{_fmt(rate, 'g'):>10}  {n:>6}  {_fmt(achieved, '.3f'):>12}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# rx_pipeline.py
+# Recepção desacoplada do processamento no servidor.
+# O callback da digi-xbee só enfileira (bytes, remoto, instante de chegada);
+# workers fazem parse/contabilidade e as respostas (OK/REPORT) saem por uma
+# thread de TX própria. Assim um send_data lento ou um print não seguram a
+# thread de leitura da biblioteca, e a perda medida é a do rádio.
+import queue
+import threading
+import time
+import frames
+
+QUEUE_SIZE = 4096
+WORKERS = 2
+
+
+class RxDispatcher:
+    """
+    Filas limitadas, uma por worker. O quadro vai para o worker da sua sessão
+    (frames.route_key), então uma sessão é sempre processada em ordem e por
+    uma única thread: START antes dos DATA, SeqTracker sem lock.
+    Fila cheia = quadro descartado e contado em `drops`.
+    """
+
+    def __init__(self, handler, workers=WORKERS, maxsize=QUEUE_SIZE):
+        self.handler = handler
+        self.queues = [queue.Queue(maxsize) for _ in range(max(1, workers))]
+        self.drops = 0
+        self.enqueued = 0
+        self.max_depth = 0
+        self.processed = [0] * len(self.queues)
+        self.running = True
+        self.threads = [threading.Thread(target=self._loop, args=(i,), daemon=True)
+                        for i in range(len(self.queues))]
+        for t in self.threads:
+            t.start()
+
+    def submit(self, raw, remote):
+        # chamado no callback da biblioteca: nada além de enfileirar
+        t = time.time()
+        q = self.queues[frames.route_key(raw) % len(self.queues)]
+        try:
+            q.put_nowait((raw, remote, t))
+        except queue.Full:
+            self.drops += 1
+            return
+        self.enqueued += 1
+        depth = q.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def _loop(self, i):
+        q = self.queues[i]
+        while self.running:
+            try:
+                raw, remote, t = q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self.handler(raw, remote, t)
+            except Exception as e:
+                print("Erro no worker:", e)
+            self.processed[i] += 1
+
+    def stats(self):
+        return {
+            "enfileirados": self.enqueued,
+            "processados": sum(self.processed),
+            "descartados": self.drops,
+            "fila": [q.qsize() for q in self.queues],
+            "fila_max": self.max_depth,
+        }
+
+    def stop(self):
+        self.running = False
+        for t in self.threads:
+            t.join(1)
+
+
+class TxWorker:
+    """Fila de respostas para o cliente, enviadas por uma thread só (send_data é bloqueante)."""
+
+    def __init__(self, device, maxsize=256):
+        self.device = device
+        self.queue = queue.Queue(maxsize)
+        self.sent = 0
+        self.errors = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def send(self, remote, data):
+        self.queue.put((remote, data))
+
+    def _loop(self):
+        while self.running or not self.queue.empty():
+            try:
+                remote, data = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self.device.send_data(remote, data)
+                self.sent += 1
+            except Exception as e:
+                self.errors += 1
+                print("Erro no envio:", e)
+
+    def stop(self, timeout=5):
+        self.running = False
+        self.thread.join(timeout)
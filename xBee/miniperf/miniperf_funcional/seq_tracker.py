@@ -0,0 +1,136 @@
+# seq_tracker.py
+# Rastreamento de seqs por sessão com memória limitada (bitmap circular).
+from collections import Counter
+
+MAX_WINDOW = 1 << 20  # bits (128 KiB por sessão no máximo)
+MIN_WINDOW = 1 << 10
+
+
+def _window_for(expected):
+    # menor potência de 2 que cobre a sessão, limitada a MAX_WINDOW;
+    # sessão sem tamanho conhecido usa a janela máxima
+    if not expected:
+        return MAX_WINDOW
+    w = MIN_WINDOW
+    while w < MAX_WINDOW and w <= expected:
+        w <<= 1
+    return w
+
+
+class SeqTracker:
+    """
+    Bitmap circular de `window` bits sobre os seqs [base, base + window).
+    Cada pacote custa O(1) (amortizado): marca o bit, conta duplicado/fora de
+    ordem e, se o seq passa do fim da janela, desliza a janela "finalizando"
+    os seqs que saem — é aí que as rajadas de perda são medidas, quando já não
+    há como o buraco ser preenchido por reordenação.
+    Seqs que chegam abaixo da janela não podem ser classificados: contam em `late`.
+    """
+
+    def __init__(self, expected=0, first_seq=1, window=None):
+        self.window = window or _window_for(expected)
+        self.mask = self.window - 1
+        self.bits = bytearray(self.window // 8)
+        self.base = first_seq         # menor seq ainda dentro da janela
+        self.first_seq = first_seq
+        self.highest = first_seq - 1  # maior seq visto
+        self.received = 0             # inclui duplicados
+        self.unique = 0
+        self.duplicates = 0
+        self.out_of_order = 0
+        self.late = 0
+        self.bursts = Counter()       # tamanho da rajada de perda -> ocorrências
+        self.longest_gap = 0
+        self._run = 0                 # rajada de perda em andamento (seqs finalizados)
+
+    def _test_and_set(self, seq):
+        i = seq & self.mask
+        byte, bit = i >> 3, 1 << (i & 7)
+        if self.bits[byte] & bit:
+            return True
+        self.bits[byte] |= bit
+        return False
+
+    def _retire(self, seq):
+        # tira o seq da janela, registrando se ele fez parte de uma perda
+        i = seq & self.mask
+        byte, bit = i >> 3, 1 << (i & 7)
+        if self.bits[byte] & bit:
+            self.bits[byte] &= ~bit
+            self._close_run()
+        else:
+            self._run += 1
+
+    def _close_run(self):
+        if self._run:
+            self.bursts[self._run] += 1
+            if self._run > self.longest_gap:
+                self.longest_gap = self._run
+            self._run = 0
+
+    def add(self, seq):
+        self.received += 1
+        if seq < self.base:
+            self.late += 1
+            return
+        if seq >= self.base + self.window:
+            new_base = seq - self.window + 1
+            # além de uma janela inteira: os seqs intermediários nunca entraram
+            stop = min(new_base, self.base + self.window)
+            for s in range(self.base, stop):
+                self._retire(s)
+            if new_base > stop:
+                self._run += new_base - stop
+            self.base = new_base
+        if self._test_and_set(seq):
+            self.duplicates += 1
+            return
+        self.unique += 1
+        if seq < self.highest:
+            self.out_of_order += 1
+        else:
+            self.highest = seq
+
+    def finalize(self, expected=None):
+        """
+        Fecha a sessão: finaliza o que resta na janela até o último seq
+        esperado (ou o maior visto) e devolve as estatísticas.
+        """
+        last = max(self.highest, (self.first_seq + expected - 1) if expected else 0)
+        s = self.base
+        while s <= last:
+            i = s & self.mask
+            # atalho por byte inteiro alinhado: 0xFF (sem perda) / 0x00 (8 perdas)
+            if i & 7 == 0 and s + 8 <= last + 1:
+                b = self.bits[i >> 3]
+                if b == 0:
+                    self._run += 8
+                    s += 8
+                    continue
+                if b == 0xFF:
+                    self._close_run()
+                    self.bits[i >> 3] = 0
+                    s += 8
+                    continue
+            self._retire(s)
+            s += 1
+        self._close_run()
+        self.base = last + 1
+        return self.stats()
+
+    def stats(self):
+        return {
+            "recebidos_total": self.received,
+            "unicos": self.unique,
+            "duplicados": self.duplicates,
+            "fora_de_ordem": self.out_of_order,
+            "atrasados": self.late,
+            "maior_gap": self.longest_gap,
+            "rajadas": dict(sorted(self.bursts.items())),
+        }
+
+
+def format_bursts(bursts, limit=8) -> str:
+    """Histograma compacto para o REPORT: 'tam:qtd' separados por vírgula."""
+    items = sorted(bursts.items())[:limit]
+    return ",".join(f"{k}:{v}" for k, v in items) or "-"
@@ -1,80 +1,271 @@
 # server.py
+import csv
+import os
+import threading
 import time
-from digi.xbee.devices import XBeeDevice
-from utils import BAUD_RATE
+from collections import deque
+from utils import BAUD_RATE, INTERVAL_FIELDS, max_rf_payload
+import frames
+from seq_tracker import SeqTracker, format_bursts
+from rx_pipeline import RxDispatcher, TxWorker, WORKERS, QUEUE_SIZE
+from virtual_xbee import make_device
+from session_table import SessionTable, remote_id, MAX_SESSIONS, IDLE_TIMEOUT, RETRY_AFTER
+import control
 
-def run_server(port, num_pacotes_fallback, baud_rate=BAUD_RATE):
-    device = XBeeDevice(port, baud_rate)
+TICK = 0.1  # s entre voltas do loop principal (IREPORTs); expiração de sessões a cada 1 s
+
+
+def build_report(info, fim, st, max_len=None):
+    """
+    REPORT da sessão. Com max_len (NP do módulo), o histograma de rajadas perde
+    as maiores faixas até o REPORT caber num quadro: acima do NP o send_data
+    falha e o cliente fica sem relatório.
+    """
+    sessionID = info["session_id"]
+    duracao = fim - info["inicio"]
+    enviados = info["enviados_pelo_cliente"]
+    unicos = st["unicos"]
+    duplicados = st["duplicados"]
+    perda_pct = 100 * (1 - (unicos / enviados)) if enviados > 0 else 0
+    goodput_kbps = ((unicos * info["payload_size"] * 8) / duracao) / 1000 if duracao > 0 else 0
+
+    # 8 campos originais + fora_de_ordem;maior_gap;histograma de rajadas (tam:qtd,...)
+    # + quadros enviados (informado no END) e recebidos
+    head = (f"REPORT;{sessionID};{enviados};{unicos};{st['recebidos_total']};{duplicados};"
+            f"{perda_pct:.2f};{goodput_kbps:.2f};"
+            f"{st['fora_de_ordem']};{st['maior_gap']};")
+    # quadros de rádio (com agregação, vários pacotes lógicos por quadro)
+    tail = f";{info['quadros_enviados']};{info['quadros']}"
+    for limit in range(8, -1, -1):
+        report = head + format_bursts(st["rajadas"], limit) + tail
+        if max_len is None or len(report) <= max_len:
+            return report
+    # nem sem rajadas coube: os campos de quadros saem (o cliente completa com vazio)
+    return head + format_bursts({})
+
+
+def interval_report(info, now):
+    """
+    IREPORT da fatia desde o último: diferença entre os contadores do
+    SeqTracker agora e no fim da fatia anterior (O(1), nada por pacote).
+    Esperados na fatia = avanço do maior seq; reordenados contam na fatia
+    em que chegam. Fatia sem avanço do maior seq (nada chegou, ou só
+    atrasados) não tem como estimar a perda: o campo sai vazio.
+    """
+    seqs = info["seqs"]
+    t0, rec0, uni0, dup0, hi0 = info["intervalo_snap"]
+    info["intervalo_snap"] = (now, seqs.received, seqs.unique, seqs.duplicates, seqs.highest)
+    info["intervalo_idx"] += 1
+    dt = now - t0
+    unicos = seqs.unique - uni0
+    esperados = seqs.highest - hi0
+    perda = f"{100 * max(0, esperados - unicos) / esperados:.2f}" if esperados > 0 else ""
+    goodput_kbps = (unicos * info["payload_size"] * 8 / dt) / 1000 if dt > 0 else 0
+    return [info["session_id"], info["intervalo_idx"], f"{t0 - info['inicio']:.3f}", f"{now - info['inicio']:.3f}",
+            seqs.received - rec0, unicos, seqs.duplicates - dup0, perda, f"{goodput_kbps:.2f}"]
+
+
+def run_server(port, num_pacotes_fallback, baud_rate=BAUD_RATE, workers=WORKERS, queue_size=QUEUE_SIZE,
+               stats_interval=0, max_sessions=MAX_SESSIONS, idle_timeout=IDLE_TIMEOUT, interval=0,
+               interval_csv=None, control_addr=None):
+    device = make_device(port, baud_rate)  # "sim:..." -> enlace virtual (virtual_xbee.py)
     device.open()
-    print(f"Servidor aguardando mensagens na porta {port}... (baud {baud_rate})")
+    max_len = max_rf_payload(device)  # REPORT/IREPORT precisam caber num quadro
+    print(f"Servidor aguardando mensagens na porta {port}... (baud {baud_rate}, {workers} workers, "
+          f"até {max_sessions} sessões)")
 
-    session_data = {}
+    # (remoto, frames.session_key(sessionID)) -> info
+    sessions = SessionTable(max_sessions, idle_timeout)
+    tx = TxWorker(device)
+    interval_rows = deque()  # [remoto] + INTERVAL_FIELDS, gravadas em interval_csv pelo loop principal
 
-    def callback(xbee_message):
-        try:
-            data = xbee_message.data.decode(errors="ignore")
-            remote = xbee_message.remote_device.get_64bit_addr()
-            parts = data.split(";")
-            if len(parts) < 2:
-                print(f"[WARN] Mensagem inválida: {data}")
-                return
+    def emit_interval(key, info, now):
+        # com o lock da sessão
+        row = interval_report(info, now)
+        tx.send(info["remote"], "IREPORT;" + ";".join(str(v) for v in row))
+        if interval_csv:
+            interval_rows.append([key[0]] + row)
 
-            kind = parts[0]
-
-            if kind == "START":
-                sessionID = parts[1]
-                expected = int(parts[2]) if len(parts) > 2 else num_pacotes_fallback
-                session_data[sessionID] = {
-                    "enviados_pelo_cliente": expected,
-                    "recebidos_total": 0,
-                    "unique_seqs": set(),
-                    "payload_size": 50,
-                    "inicio": time.time(),
-                    "remote": xbee_message.remote_device
-                }
-                print(f"Nova sessão: {sessionID}, esperando {expected} pacotes")
-                device.send_data(xbee_message.remote_device, "OK")
-
-            elif kind == "DATA":
-                if len(parts) < 3:
-                    return
-                sessionID, seq_num = parts[1], int(parts[2])
-                info = session_data.get(sessionID)
-                if info is None:
-                    print(f"[{sessionID}] DATA para sessão desconhecida.")
-                    return
+    def account_data(key, seq_num, t_chegada, count=1, agg_len=None):
+        # um quadro com `count` pacotes lógicos de seqs consecutivos a partir de seq_num;
+        # agg_len = bytes de payload de um quadro agregado (confere com count x payload)
+        info = sessions.get(key)
+        if info is None:
+            print(f"[{key[0]}/{key[1]}] DATA para sessão desconhecida.")
+            return
+        if agg_len is not None and (count == 0 or agg_len != count * info["payload_size"]):
+            print(f"[WARN] Quadro agregado inválido: {count} x {info['payload_size']} != {agg_len} bytes")
+            return
+        with info["lock"]:
+            add = info["seqs"].add
+            for seq in range(seq_num, seq_num + count):
+                add(seq)
+            info["quadros"] += 1
+            info["ultimo"] = t_chegada
 
-                info["recebidos_total"] += 1
-                info["unique_seqs"].add(seq_num)
+    def finish(key, info, fim, motivo):
+        # chamado por um worker (END) ou pelo reaper (timeout), com a sessão já fora da tabela
+        with info["lock"]:
+            info["fechada"] = True  # o loop principal pode ter pego a sessão antes do pop: sem IREPORT depois daqui
+            if info["intervalo"] and fim > info["intervalo_snap"][0]:
+                emit_interval(key, info, fim)  # última fatia, até o END
+            st = info["seqs"].finalize(info["enviados_pelo_cliente"])
+        report = build_report(info, fim, st, max_len)
+        tx.send(info["remote"], report)
+        print(f"Relatório {motivo} enviado: {report}")
 
-            elif kind == "END":
-                sessionID = parts[1]
-                info = session_data.get(sessionID)
-                if not info:
+    def handle(raw, remote, t_chegada):
+        # roda num worker do RxDispatcher; cada sessão fica sempre no mesmo worker
+        if frames.is_binary(raw):
+            # caminho rápido: cabeçalho struct, sem decode/split/int
+            frame = frames.decode_data(raw)
+            if frame is None or frame[1] not in (frames.TYPE_DATA, frames.TYPE_AGG):
+                print(f"[WARN] Quadro binário inválido ({len(raw)} bytes)")
+                return
+            key = (remote_id(remote), frame[2])
+            if frame[1] == frames.TYPE_AGG:
+                body = frame[5]
+                if not len(body):
+                    print(f"[WARN] Quadro agregado sem contagem ({len(raw)} bytes)")
                     return
+                account_data(key, frame[3], t_chegada, body[0], len(body) - 1)
+            else:
+                account_data(key, frame[3], t_chegada)
+            return
+
+        data = raw.decode(errors="ignore")
+        parts = data.split(";")
+        if len(parts) < 2:
+            print(f"[WARN] Mensagem inválida: {data}")
+            return
+
+        kind = parts[0]
+        key = (remote_id(remote), frames.session_key(parts[1]))
+
+        if kind == "START":
+            sessionID = parts[1]
+            expected = int(parts[2]) if len(parts) > 2 else num_pacotes_fallback
+            # START;sid;n;intervalo;payload — o cliente pode pedir IREPORTs (como o -i do iperf)
+            intervalo = float(parts[3]) if len(parts) > 3 and parts[3] else interval
+            payload_size = int(parts[4]) if len(parts) > 4 and parts[4] else 50
+            seqs = SeqTracker(expected)
+            info = sessions.open(key, {
+                "session_id": sessionID,
+                "enviados_pelo_cliente": expected,
+                "seqs": seqs,  # bitmap: únicos/duplicados/ordem/rajadas
+                "payload_size": payload_size,
+                "quadros": 0,
+                "quadros_enviados": "",
+                "inicio": t_chegada,
+                "remote": remote,
+                "intervalo": intervalo,
+                "intervalo_idx": 0,
+                "intervalo_snap": (t_chegada, 0, 0, 0, seqs.highest),
+                "fechada": False,
+            })
+            if info is None:
+                # limite de sessões: o cliente tenta de novo depois de RETRY_AFTER s
+                print(f"Sessão {sessionID} recusada: {len(sessions)} sessões abertas")
+                tx.send(remote, f"BUSY;{sessionID};{RETRY_AFTER}")
+                return
+            print(f"Nova sessão: {sessionID} de {key[0]}, esperando {expected} pacotes")
+            tx.send(remote, "OK")
+
+        elif kind == "DATA":
+            if len(parts) < 3:
+                return
+            account_data(key, int(parts[2]), t_chegada)
+
+        elif kind == "END":
+            info = sessions.pop(key)
+            if not info:
+                return
+            # END;sid;quadros_enviados (cliente antigo manda só END;sid)
+            info["quadros_enviados"] = parts[2] if len(parts) > 2 else ""
+            finish(key, info, t_chegada, "final")
+
+    rx = RxDispatcher(handle, workers, queue_size)
+
+    def callback(xbee_message):
+        rx.submit(xbee_message.data, xbee_message.remote_device)
 
-                fim = time.time()
-                duracao = fim - info["inicio"]
-                enviados = info["enviados_pelo_cliente"]
-                unicos = len(info["unique_seqs"])
-                duplicados = info["recebidos_total"] - unicos
-                perda_pct = 100 * (1 - (unicos / enviados)) if enviados > 0 else 0
-                goodput_kbps = ((unicos * info["payload_size"] * 8) / duracao) / 1000 if duracao > 0 else 0
+    # porta "raw:..." (api_frames.py): os quadros vão direto para as filas, sem XBeeMessage
+    raw = hasattr(device, "add_frame_callback")
+    if raw:
+        device.add_frame_callback(rx.submit)
+    else:
+        device.add_data_received_callback(callback)
 
-                report = f"REPORT;{sessionID};{enviados};{unicos};{info['recebidos_total']};{duplicados};{perda_pct:.2f};{goodput_kbps:.2f}"
-                device.send_data(info["remote"], report)
-                print(f"Relatório enviado: {report}")
-                del session_data[sessionID]
+    stop = threading.Event()
 
-        except Exception as e:
-            print("Erro no callback:", e)
+    def handle_control(req):
+        # canal de controle (control.py): estado do servidor sem parar as sessões
+        cmd = req.get("cmd")
+        if cmd == "status":
+            return {"rx": rx.stats(), "tx_enviados": tx.sent, "tx_erros": tx.errors,
+                    "sessoes": [{"remoto": k[0], "session_id": info["session_id"],
+                                 "recebidos": info["seqs"].received} for k, info in sessions.items()],
+                    "recusadas": sessions.rejected, "expiradas": sessions.evicted}
+        if cmd == "stop":
+            stop.set()
+            return {"ok": True}
+        return {"erro": f"comando desconhecido: {cmd}"}
 
-    device.add_data_received_callback(callback)
+    ctl = control.serve(control_addr, handle_control) if control_addr else None
+    if ctl:
+        print(f"Controle em {control_addr}")
 
     try:
-        while True:
-            time.sleep(1)
+        last_stats = time.time()
+        last_reap = time.time()
+        while not stop.wait(TICK):
+            now = time.time()
+            # IREPORTs: disparados pelo relógio, então uma fatia sem nenhum pacote também sai (goodput 0)
+            for key, info in sessions.items():
+                if info["intervalo"] and now - info["intervalo_snap"][0] >= info["intervalo"]:
+                    with info["lock"]:
+                        if not info["fechada"]:
+                            emit_interval(key, info, now)
+            if interval_rows:
+                write_header = not os.path.exists(interval_csv)
+                with open(interval_csv, "a", newline="") as f:
+                    writer = csv.writer(f)
+                    if write_header:
+                        writer.writerow(["Remoto"] + INTERVAL_FIELDS)
+                    while interval_rows:
+                        writer.writerow(interval_rows.popleft())
+            if now - last_reap < 1:
+                continue
+            last_reap = now
+            # sessões abandonadas (END perdido): REPORT parcial até o último quadro recebido
+            for key, info in sessions.expire(now):
+                print(f"Sessão {info['session_id']} de {key[0]} ociosa há mais de {idle_timeout:g} s")
+                finish(key, info, info["ultimo"], "parcial")
+            if stats_interval and time.time() - last_stats >= stats_interval:
+                last_stats = time.time()
+                st = rx.stats()
+                print(f"[RX] enfileirados={st['enfileirados']} processados={st['processados']} "
+                      f"descartados={st['descartados']} fila={st['fila']} fila_max={st['fila_max']} "
+                      f"tx_enviados={tx.sent} tx_erros={tx.errors} sessões={len(sessions)} "
+                      f"recusadas={sessions.rejected} expiradas={sessions.evicted}")
+                if raw:
+                    ap = device.stats()
+                    print(f"[API] quadros={ap['quadros']} checksum={ap['checksum']} "
+                          f"descartados={ap['descartados']} overflows={ap['overflows']}")
     except KeyboardInterrupt:
         print("Servidor encerrado.")
+    else:
+        print("Servidor encerrado pelo canal de controle.")
     finally:
-        device.close()
\ No newline at end of file
+        if raw:
+            device.del_frame_callback(rx.submit)
+        else:
+            device.del_data_received_callback(callback)
+        rx.stop()
+        tx.stop()
+        st = rx.stats()
+        if st["descartados"]:
+            print(f"[RX] {st['descartados']} quadros descartados com a fila cheia (fila_max={st['fila_max']})")
+        if ctl:
+            control.close(ctl, control_addr)
+        device.close()
@@ -0,0 +1,70 @@
+# session_table.py
+# Sessões abertas no servidor: várias ao mesmo tempo, de vários clientes.
+# Chave = (endereço 64-bit do remoto, sessionID % 65536), já que cada cliente
+# tem seu próprio contador de sessão. Cada sessão tem seu lock (o worker da
+# sessão e o reaper de sessões ociosas mexem nela); a tabela tem outro lock
+# só para inserir/remover/varrer.
+import threading
+
+MAX_SESSIONS = 32
+IDLE_TIMEOUT = 30.0  # s sem nenhum quadro -> sessão finalizada com REPORT parcial
+RETRY_AFTER = 2      # s sugeridos ao cliente no BUSY
+
+
+def remote_id(remote) -> str:
+    try:
+        return str(remote.get_64bit_addr())
+    except AttributeError:
+        return str(remote)
+
+
+class SessionTable:
+
+    def __init__(self, max_sessions=MAX_SESSIONS, idle_timeout=IDLE_TIMEOUT):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.rejected = 0
+        self.evicted = 0
+
+    def open(self, key, info):
+        """
+        Registra a sessão. Devolve a sessão (a já existente, se o START veio
+        repetido) ou None se o limite de sessões simultâneas foi atingido.
+        """
+        with self.lock:
+            cur = self.sessions.get(key)
+            if cur is not None:
+                return cur
+            if len(self.sessions) >= self.max_sessions:
+                self.rejected += 1
+                return None
+            info["lock"] = threading.Lock()
+            info.setdefault("ultimo", info["inicio"])
+            self.sessions[key] = info
+            return info
+
+    def get(self, key):
+        return self.sessions.get(key)
+
+    def pop(self, key):
+        with self.lock:
+            return self.sessions.pop(key, None)
+
+    def expire(self, now):
+        """Remove e devolve as sessões sem atividade há mais de idle_timeout."""
+        if not self.idle_timeout:
+            return []
+        with self.lock:
+            idle = [k for k, info in self.sessions.items() if now - info["ultimo"] > self.idle_timeout]
+            out = [(k, self.sessions.pop(k)) for k in idle]
+        self.evicted += len(out)
+        return out
+
+    def items(self):
+        with self.lock:
+            return list(self.sessions.items())
+
+    def __len__(self):
+        return len(self.sessions)
@@ -0,0 +1,192 @@
+# sweep.py
+# Varredura de taxa (pps) x payload x baud com busca do ponto de saturação:
+# a maior taxa que ainda fica dentro do limiar de perda. Cada ponto é uma
+# sessão normal do miniperf (client.run_session) no mesmo dispositivo aberto;
+# todos os pontos vão para um único CSV (curva goodput x carga oferecida).
+#
+#   python3 sweep.py -c /dev/ttyUSB1 --remote 0013A20041FBCD12 --payloads 20 50 70 \
+#       --rates 5 10 20 40 --search --rate-max 200 --loss 1 --duration 10 --out sweep.csv
+#
+# Payloads cujo quadro DATA não cabe no NP do módulo são pulados.
+#
+# --bauds só vale com o enlace virtual (sim:): a varredura reabre a porta
+# local em cada baud, mas não muda o BD dos módulos.
+import argparse
+import csv
+import math
+import os
+import time
+import frames
+from client import run_session, check_payload, REPORT_FIELDS
+from utils import BAUD_RATE, DB_FILE
+from virtual_xbee import make_device, make_remote, is_virtual
+from results_db import ResultsDB
+
+POINT_FIELDS = ["Timestamp", "Remoto", "Baud", "Payload", "Taxa(pps)", "Oferecido(kbps)", "Pacotes",
+                "TaxaReal(pps)", "Fase", "DentroDoLimiar"] + REPORT_FIELDS
+SATURATION_FIELDS = ["Remoto", "Baud", "Payload", "LimiarPerda(%)", "TaxaMaxima(pps)", "Goodput(kbps)",
+                     "Perda(%)", "Pontos"]
+
+
+def _append(path, fields, rows):
+    write_header = not os.path.exists(path)
+    with open(path, "a", newline="") as f:
+        writer = csv.writer(f)
+        if write_header:
+            writer.writerow(fields)
+        writer.writerows(rows)
+
+
+class Sweep:
+
+    def __init__(self, device, remote_addr, baud, args, db=None):
+        self.device = device
+        self.db = db
+        self.remote = make_remote(device, remote_addr)
+        self.remote_addr = remote_addr
+        self.baud = baud
+        self.args = args
+
+    def point(self, payload, rate, fase):
+        """
+        Roda uma sessão na taxa dada e devolve (dentro, perda %, goodput kbps).
+        Dentro do limiar = perda <= --loss e a taxa realmente enviada chegou a
+        --min-achieved da pedida (com send_data síncrono o cliente simplesmente
+        não consegue enviar mais rápido que o enlace, sem perder nada).
+        """
+        a = self.args
+        n = max(a.min_packets, math.ceil(rate * a.duration))
+        for tentativa in range(1 + a.point_retries):
+            res = run_session(self.device, self.remote, n, rate, a.format, a.window, None, 0, payload,
+                              a.aggregate, db=self.db)
+            if res["report"] or res.get("erro"):
+                break
+            # START/OK ou REPORT perdido: o ponto não foi medido, repete
+            print(f"Ponto {rate:g} pps sem REPORT (tentativa {tentativa + 1})")
+            time.sleep(a.gap)
+        if res.get("erro"):
+            # no formato texto o quadro cresce com o seq: taxas maiores (mais pacotes) também não cabem
+            print(f"[baud {self.baud} payload {payload}] {rate:g} pps não medido: {res['erro']}")
+            return False, 100.0, 0.0
+        report = res["report"]
+        perda = float(report[5]) if report and report[5] else 100.0
+        goodput = float(report[6]) if report and report[6] else 0.0
+        taxa_real = res["pacer"].summary()["real_pps"] if res["pacer"] else 0.0
+        dentro = perda <= a.loss and taxa_real >= a.min_achieved * rate
+        row = [f"{time.time():.3f}", self.remote_addr, self.baud, payload, rate,
+               f"{rate * payload * 8 / 1000:.2f}", n, f"{taxa_real:.2f}", fase, int(dentro)]
+        row += report if report else [res["session_id"]] + [""] * (len(REPORT_FIELDS) - 1)
+        _append(a.out, POINT_FIELDS, [row])
+        if self.db is not None:
+            self.db.add_result(res, link=self.remote_addr, baud=self.baud, origem="sweep")
+        print(f"[baud {self.baud} payload {payload}] {rate:g} pps (enviados a {taxa_real:.1f} pps) -> "
+              f"perda {perda:.2f}%, goodput {goodput:.2f} kbps")
+        time.sleep(a.gap)
+        return dentro, perda, goodput
+
+    def saturation(self, payload, grid):
+        """
+        Bissecção na taxa entre o maior ponto da grade dentro do limiar e o
+        menor fora dele (ou rate_min/rate_max), até a distância ser <= tol.
+        Supõe que passar do limiar é monotônico na taxa.
+        """
+        a = self.args
+        ok = [r for r, v in grid.items() if v[0]]
+        bad = [r for r, v in grid.items() if not v[0]]
+        lo = max(ok) if ok else None
+        hi = min((r for r in bad if lo is None or r > lo), default=None)
+        probes = dict(grid)
+
+        if lo is None:
+            lo = a.rate_min
+            probes[lo] = self.point(payload, lo, "busca")
+            if not probes[lo][0]:
+                return 0.0, probes[lo], len(probes)
+        if hi is None:
+            hi = a.rate_max
+            if hi not in probes:
+                probes[hi] = self.point(payload, hi, "busca")
+            if probes[hi][0]:
+                return hi, probes[hi], len(probes)  # não saturou até rate_max
+        while hi - lo > a.tol:
+            mid = round((lo + hi) / 2, 3)
+            probes[mid] = self.point(payload, mid, "busca")
+            if probes[mid][0]:
+                lo = mid
+            else:
+                hi = mid
+        return lo, probes[lo], len(probes)
+
+    def run(self):
+        a = self.args
+        rows = []
+        for payload in a.payloads:
+            erro = check_payload(self.device, payload, a.format, a.aggregate)
+            if erro:
+                print(f"[baud {self.baud}] payload {payload} pulado: {erro}")
+                continue
+            grid = {rate: self.point(payload, rate, "grade") for rate in a.rates}
+            if not a.search:
+                continue
+            rate, (_, perda, goodput), pontos = self.saturation(payload, grid)
+            print(f"[baud {self.baud} payload {payload}] saturação: {rate:g} pps "
+                  f"(goodput {goodput:.2f} kbps, perda {perda:.2f}%, {pontos} pontos)")
+            rows.append([self.remote_addr, self.baud, payload, a.loss, rate, f"{goodput:.2f}", f"{perda:.2f}", pontos])
+        return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Varredura de taxa/payload/baud do miniperf com busca de saturação")
+    parser.add_argument("-c", "--client", required=True, help="Porta serial do XBee cliente (ou sim:...)")
+    parser.add_argument("--remote", required=True, help="Endereço 64-bit do XBee servidor")
+    parser.add_argument("--bauds", type=int, nargs="+", default=[BAUD_RATE],
+                        help="Bauds da varredura (só com sim:; o BD dos módulos reais não é alterado)")
+    parser.add_argument("--payloads", type=int, nargs="+", default=[50])
+    parser.add_argument("--rates", type=float, nargs="*", default=[], help="Taxas (pps) da grade")
+    parser.add_argument("--search", action="store_true", help="Busca a taxa máxima dentro do limiar de perda")
+    parser.add_argument("--rate-min", type=float, default=1)
+    parser.add_argument("--rate-max", type=float, default=200)
+    parser.add_argument("--tol", type=float, default=1, help="Precisão da busca (pps)")
+    parser.add_argument("--loss", type=float, default=1.0, help="Limiar de perda (%%)")
+    parser.add_argument("--min-achieved", type=float, default=0.95,
+                        help="Fração da taxa pedida que precisa ser efetivamente enviada")
+    parser.add_argument("--duration", type=float, default=10, help="Segundos por ponto")
+    parser.add_argument("--min-packets", type=int, default=20,
+                        help="Mínimo de pacotes por ponto (em taxas baixas alonga o ponto além de --duration)")
+    parser.add_argument("--point-retries", type=int, default=2,
+                        help="Repetições de um ponto sem REPORT (handshake perdido)")
+    parser.add_argument("--gap", type=float, default=1.0, help="Pausa entre pontos (s)")
+    parser.add_argument("--window", type=int, default=0)
+    parser.add_argument("--aggregate", type=int, default=0, help="Pacotes lógicos por quadro (ver main.py)")
+    parser.add_argument("--format", choices=[frames.FORMAT_BIN, frames.FORMAT_TEXT], default=frames.FORMAT_BIN)
+    parser.add_argument("--out", default="sweep.csv")
+    parser.add_argument("--db", default=DB_FILE, help="Banco SQLite de resultados (\"\" = só CSV)")
+    args = parser.parse_args()
+    if not args.rates and not args.search:
+        parser.error("informe --rates e/ou --search")
+    if len(args.bauds) > 1 and not is_virtual(args.client):
+        parser.error("--bauds com mais de um valor só vale com o enlace virtual (sim:): o BD dos módulos não é alterado")
+
+    saturation = []
+    db = ResultsDB(args.db) if args.db else None
+    for baud in args.bauds:
+        # um dispositivo por baud, reaproveitado em todos os pontos
+        device = make_device(args.client, baud)
+        device.open()
+        try:
+            saturation += Sweep(device, args.remote, baud, args, db).run()
+        finally:
+            device.close()
+    if db is not None:
+        db.close()
+
+    if saturation:
+        stem, ext = os.path.splitext(args.out)
+        path = f"{stem}_saturacao{ext or '.csv'}"
+        _append(path, SATURATION_FIELDS, saturation)
+        print(f"Saturação salva em {path}")
+    print(f"Pontos salvos em {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# tx_window.py
+# Envio assíncrono em janela: até `window` quadros DATA em voo, sem esperar o
+# TX Status de cada um (send_data espera, o que limita a 1 pacote por ida e volta).
+# Cada quadro sai com um frame ID próprio; os TX Status que voltam são casados
+# com o seq numa thread separada, que registra status de entrega e retries.
+import csv
+import queue
+import threading
+import time
+from collections import Counter, deque
+from digi.xbee.models.address import XBee16BitAddress
+from digi.xbee.models.options import TransmitOptions
+from digi.xbee.models.protocol import XBeeProtocol
+from digi.xbee.models.status import TransmitStatus
+from digi.xbee.packets.common import TransmitPacket, TransmitStatusPacket
+from digi.xbee.packets.raw import TX64Packet, TXStatusPacket
+
+MAX_WINDOW = 255        # frame IDs 1..255 (0 = sem TX Status)
+STATUS_TIMEOUT = 5.0    # s sem TX Status -> quadro dado como perdido localmente
+
+
+class AsyncTxWindow:
+    """
+    Janela de envio com frame IDs. send() bloqueia só quando há `window`
+    quadros sem TX Status; drain() espera os que faltam e devolve o resumo.
+    Registros por quadro: (seq, frame_id, status, retries, latência_ms).
+    """
+
+    def __init__(self, device, remote, window=32, status_timeout=STATUS_TIMEOUT):
+        self.device = device
+        self.remote = remote
+        self.window = max(1, min(int(window), MAX_WINDOW))
+        self.status_timeout = status_timeout
+        self.raw_802 = device.get_protocol() == XBeeProtocol.RAW_802_15_4
+        self.x64 = remote.get_64bit_addr()
+
+        self.free_ids = deque(range(1, MAX_WINDOW + 1))
+        self.pending = {}  # frame_id -> (seq, t_envio)
+        self.lock = threading.Lock()
+        self.slots = threading.Semaphore(self.window)
+        self.statuses = queue.SimpleQueue()
+        self.records = []
+        self.status_count = Counter()
+        self.retries_total = 0
+
+        self.running = True
+        self.matcher = threading.Thread(target=self._match_loop, daemon=True)
+        self.matcher.start()
+        device.add_packet_received_callback(self._on_packet)
+
+    def _build(self, frame_id, data):
+        opts = TransmitOptions.NONE.value
+        if self.raw_802:
+            return TX64Packet(frame_id, self.x64, opts, rf_data=bytearray(data))
+        return TransmitPacket(frame_id, self.x64, XBee16BitAddress.UNKNOWN_ADDRESS, 0, opts,
+                              rf_data=bytearray(data))
+
+    def _on_packet(self, packet):
+        # thread de leitura da biblioteca: só enfileira, o casamento é feito em _match_loop
+        if isinstance(packet, (TransmitStatusPacket, TXStatusPacket)):
+            retries = getattr(packet, "transmit_retry_count", None)
+            self.statuses.put((packet.frame_id, packet.transmit_status, retries, time.time()))
+
+    def _match_loop(self):
+        last_expire = time.time()
+        while self.running or self.pending:
+            try:
+                frame_id, status, retries, t = self.statuses.get(timeout=0.2)
+            except queue.Empty:
+                frame_id = None
+            if time.time() - last_expire > 0.5:
+                self._expire()
+                last_expire = time.time()
+            if frame_id is None:
+                continue
+            with self.lock:
+                entry = self.pending.pop(frame_id, None)
+                if entry is None:
+                    continue  # status de um quadro que não é nosso (START/END síncronos)
+                self.free_ids.append(frame_id)
+            seq, t_sent = entry
+            self._record(seq, frame_id, status.name if status is not None else "?", retries,
+                         (t - t_sent) * 1000)
+            self.slots.release()
+
+    def _expire(self):
+        # quadros cujo TX Status nunca voltou liberam a janela depois de status_timeout
+        now = time.time()
+        with self.lock:
+            stale = [(fid, e) for fid, e in self.pending.items() if now - e[1] > self.status_timeout]
+            for fid, _ in stale:
+                del self.pending[fid]
+                self.free_ids.append(fid)
+        for fid, (seq, t_sent) in stale:
+            self._record(seq, fid, "TIMEOUT", None, (now - t_sent) * 1000)
+            self.slots.release()
+
+    def _record(self, seq, frame_id, status, retries, latency_ms):
+        self.records.append((seq, frame_id, status, retries, round(latency_ms, 3)))
+        self.status_count[status] += 1
+        if retries:
+            self.retries_total += retries
+
+    def send(self, seq, data):
+        self.slots.acquire()
+        with self.lock:
+            frame_id = self.free_ids.popleft()
+            self.pending[frame_id] = (seq, time.time())
+        self.device.send_packet(self._build(frame_id, data), sync=False)
+
+    def in_flight(self) -> int:
+        return len(self.pending)
+
+    def drain(self, timeout=None):
+        """Espera os TX Status pendentes (ou o timeout) e para a thread de casamento."""
+        deadline = time.time() + (self.status_timeout if timeout is None else timeout)
+        while self.pending and time.time() < deadline:
+            time.sleep(0.01)
+        self.running = False
+        self.matcher.join(self.status_timeout + 1)
+        self.device.del_packet_received_callback(self._on_packet)
+        return self.summary()
+
+    def summary(self):
+        ok = self.status_count.get(TransmitStatus.SUCCESS.name, 0)
+        lat = sorted(r[4] for r in self.records if r[2] == TransmitStatus.SUCCESS.name)
+        return {
+            "quadros": len(self.records),
+            "entregues": ok,
+            "falhas": len(self.records) - ok,
+            "retries": self.retries_total,
+            "status": dict(self.status_count),
+            "latencia_mediana_ms": lat[len(lat) // 2] if lat else 0.0,
+        }
+
+    def write_log(self, path):
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Seq", "FrameID", "Status", "Retries", "Latencia(ms)"])
+            writer.writerows(sorted(self.records))
@@ -1,4 +1,34 @@
 # utils.py
+import os
+
 BAUD_RATE = 115200
 CSV_FILE = "relatorio.csv"
-SESSION_COUNTER_FILE = "session_counter.txt"
\ No newline at end of file
+SESSION_COUNTER_FILE = "session_counter.txt"
+DB_FILE = "miniperf.db"  # banco de resultados (results_db.py); sessionIDs saem dele
+# colunas da série de IREPORTs (mesma ordem dos campos do IREPORT)
+INTERVAL_FIELDS = ["SessionID", "Intervalo", "Inicio(s)", "Fim(s)", "Recebidos", "Unicos",
+                   "Duplicados", "Perda(%)", "Goodput(kbps)"]
+
+
+def max_rf_payload(device, default=84):
+    """NP do módulo (maior payload de RF por quadro), ou `default` se não der para ler."""
+    try:
+        return int.from_bytes(device.get_parameter("NP"), "big")
+    except Exception:
+        return default
+
+
+def sibling_path(csv_file, suffix) -> str:
+    """Arquivo ao lado do CSV de relatórios (relatorio.csv -> relatorio_<suffix>.csv)."""
+    stem, ext = os.path.splitext(csv_file)
+    return f"{stem}_{suffix}{ext or '.csv'}"
+
+
+def intervals_path(csv_file) -> str:
+    """Série temporal dos IREPORTs."""
+    return sibling_path(csv_file, "intervalos")
+
+
+def server_intervals_path(csv_file) -> str:
+    """IREPORTs do lado do servidor (com a coluna Remoto): arquivo próprio, não o do cliente."""
+    return sibling_path(csv_file, "intervalos_servidor")
@@ -0,0 +1,318 @@
+# virtual_xbee.py
+# Enlace XBee virtual, para rodar cliente e servidor sem rádio (CI, benchmarks).
+#
+# Porta "sim:<ENDEREÇO64>[?parâmetros]" no lugar de /dev/ttyUSB*, por exemplo
+#   python3 main.py -s "sim:0013A20041FBCD12"
+#   python3 main.py -c "sim:0013A200AAAAAAAA?p_gb=0.02&p_bg=0.3" --remote 0013A20041FBCD12 -n 1000
+# e, sem limite de taxa/latência (velocidade máxima do protocolo):
+#   "sim:0013A200AAAAAAAA?bitrate=0&serial=0&latency=0"
+# Cada dispositivo virtual escuta em UDP 127.0.0.1 numa porta derivada do
+# endereço, então cliente e servidor podem estar em processos diferentes.
+# O enlace é modelado no lado de quem envia:
+#   - taxa (bitrate + overhead por quadro) e o baud da serial, ocupando o canal;
+#   - latência fixa + jitter uniforme;
+#   - perda em rajadas Gilbert-Elliott: cadeia de Markov de 2 estados
+#     (bom/ruim, como a de cadeia_markov) com probabilidade de perda por estado;
+#   - retransmissões de MAC: cada tentativa perdida é repetida até `retries`
+#     vezes; ACK perdido (`dup`) gera retransmissão de um quadro que já chegou,
+#     ou seja, duplicado no receptor.
+# send_data não levanta exceção quando todas as tentativas falham (o miniperf não
+# trata); a falha aparece no TX Status do send_packet assíncrono e em stats.
+import heapq
+import random
+import socket
+import threading
+import time
+from urllib.parse import parse_qsl
+from digi.xbee.exception import XBeeException
+from digi.xbee.models.address import XBee16BitAddress, XBee64BitAddress
+from digi.xbee.models.message import XBeeMessage
+from digi.xbee.models.protocol import XBeeProtocol
+from digi.xbee.models.status import TransmitStatus
+from digi.xbee.packets.common import TransmitStatusPacket
+import api_frames
+
+PREFIX = "sim:"
+HOST = "127.0.0.1"
+BASE_PORT = 47000
+
+LINK_DEFAULTS = {
+    "bitrate": 250000.0,   # bits/s no ar (802.15.4); 0 = sem limite
+    "overhead": 30,        # bytes de MAC/NWK/APS por quadro
+    "latency": 0.002,      # s
+    "jitter": 0.0,         # s (uniforme em [0, jitter])
+    "p_gb": 0.0,           # P(bom -> ruim) por tentativa
+    "p_bg": 1.0,           # P(ruim -> bom) por tentativa
+    "loss_good": 0.0,      # perda por tentativa no estado bom
+    "loss_bad": 1.0,       # perda por tentativa no estado ruim
+    "dup": 0.0,            # P(ACK perdido) -> retransmissão/duplicado
+    "retries": 3,          # retransmissões de MAC
+    "ack_wait": 0.001,     # s perdidos por tentativa sem ACK
+    "max_payload": 84,     # NP
+    "serial": 1,           # 1 = limita também pela UART no baud do dispositivo; 0 = sem limite
+    "seed": None,
+}
+
+
+def is_virtual(port) -> bool:
+    return str(port).startswith(PREFIX)
+
+
+def udp_port(addr64) -> int:
+    return BASE_PORT + int(str(addr64), 16) % 10000
+
+
+def parse_port(port):
+    """'sim:ADDR64?k=v&...' -> (endereço, parâmetros do enlace)."""
+    spec = port[len(PREFIX):]
+    addr, _, query = spec.partition("?")
+    params = dict(LINK_DEFAULTS)
+    for k, v in parse_qsl(query):
+        if k not in LINK_DEFAULTS:
+            raise ValueError(f"Parâmetro de enlace desconhecido: {k}")
+        params[k] = int(v) if k in ("overhead", "retries", "max_payload", "serial", "seed") else float(v)
+    return addr, params
+
+
+class GilbertElliott:
+    """Perda em rajadas: estado bom/ruim avança a cada tentativa de transmissão."""
+
+    def __init__(self, p_gb, p_bg, loss_good, loss_bad, rng):
+        self.P = ((1 - p_gb, p_gb), (p_bg, 1 - p_bg))
+        self.loss = (loss_good, loss_bad)
+        self.state = 0
+        self.rng = rng
+
+    def lost(self) -> bool:
+        other = 1 - self.state
+        if self.rng.random() < self.P[self.state][other]:
+            self.state = other
+        return self.rng.random() < self.loss[self.state]
+
+
+class VirtualRemoteXBeeDevice:
+
+    def __init__(self, local, x64bit_addr):
+        self.local = local
+        self.x64 = x64bit_addr if isinstance(x64bit_addr, XBee64BitAddress) \
+            else XBee64BitAddress.from_hex_string(str(x64bit_addr))
+
+    def get_64bit_addr(self):
+        return self.x64
+
+    def get_16bit_addr(self):
+        return XBee16BitAddress.UNKNOWN_ADDRESS
+
+    def __str__(self):
+        return str(self.x64)
+
+
+class VirtualXBeeDevice:
+    """
+    Mesma interface que o miniperf usa de XBeeDevice: open/close, send_data,
+    send_data_async, send_packet(sync=False) com TX Status, callbacks de dados
+    e de pacotes, get_protocol, get_64bit_addr e get_parameter("NP").
+    """
+
+    def __init__(self, port, baud_rate=115200):
+        addr, self.link = parse_port(port)
+        self.x64 = XBee64BitAddress.from_hex_string(addr)
+        self.baud_rate = baud_rate
+        self.rng = random.Random(self.link["seed"])
+        self.channel = GilbertElliott(self.link["p_gb"], self.link["p_bg"],
+                                      self.link["loss_good"], self.link["loss_bad"], self.rng)
+        self.data_callbacks = []
+        self.packet_callbacks = []
+        self.sock = None
+        self.lock = threading.Lock()     # ocupação do canal (serialização das tentativas)
+        self.link_free_at = 0.0
+        self.heap = []                   # (instante, ordem, destino, bytes) a entregar
+        self.heap_cv = threading.Condition()
+        self.order = 0
+        self.running = False
+        self.stats = {"quadros": 0, "tentativas": 0, "entregues": 0, "duplicados": 0, "falhas": 0}
+
+    # --- ciclo de vida -------------------------------------------------
+
+    def open(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+        self.sock.bind((HOST, udp_port(self.x64)))
+        self.sock.settimeout(0.2)
+        self.running = True
+        self.threads = [threading.Thread(target=self._rx_loop, daemon=True),
+                        threading.Thread(target=self._wire_loop, daemon=True)]
+        for t in self.threads:
+            t.start()
+
+    def close(self):
+        self.running = False
+        with self.heap_cv:
+            self.heap_cv.notify()
+        for t in getattr(self, "threads", []):
+            t.join(1)
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    def is_open(self):
+        return self.running
+
+    # --- consultas -----------------------------------------------------
+
+    def get_protocol(self):
+        return XBeeProtocol.ZIGBEE
+
+    def get_64bit_addr(self):
+        return self.x64
+
+    def get_parameter(self, name):
+        if name == "NP":
+            return bytearray(self.link["max_payload"].to_bytes(2, "big"))
+        raise XBeeException(f"Parâmetro {name} não emulado")
+
+    # --- callbacks -----------------------------------------------------
+
+    def add_data_received_callback(self, cb):
+        self.data_callbacks.append(cb)
+
+    def del_data_received_callback(self, cb):
+        if cb in self.data_callbacks:
+            self.data_callbacks.remove(cb)
+
+    def add_packet_received_callback(self, cb):
+        self.packet_callbacks.append(cb)
+
+    def del_packet_received_callback(self, cb):
+        if cb in self.packet_callbacks:
+            self.packet_callbacks.remove(cb)
+
+    # --- envio ---------------------------------------------------------
+
+    def _airtime(self, n):
+        # o gargalo é o ar (bitrate + overhead) ou a UART (8N1 = 10 bits por byte)
+        t_air = (n + self.link["overhead"]) * 8 / self.link["bitrate"] if self.link["bitrate"] else 0.0
+        t_uart = (n + 18) * 10 / self.baud_rate if self.link["serial"] and self.baud_rate else 0.0  # 18 = cabeçalho do API frame
+        return max(t_air, t_uart)
+
+    def _transmit(self, dest, data, wait):
+        """
+        Ocupa o canal com as tentativas, agenda a entrega e devolve
+        (status, retries, instante em que o TX Status sai).
+        """
+        data = data.encode() if isinstance(data, str) else bytes(data)
+        if len(data) > self.link["max_payload"]:
+            return TransmitStatus.PAYLOAD_TOO_LARGE, 0, time.monotonic()
+        air = self._airtime(len(data))
+        delivered = 0
+        with self.lock:
+            t = max(time.monotonic(), self.link_free_at)
+            status = TransmitStatus.NO_ACK
+            attempts = 0
+            for attempts in range(1, self.link["retries"] + 2):
+                t += air
+                if self.channel.lost():
+                    t += self.link["ack_wait"]
+                    continue
+                delivered += 1
+                self._schedule(t + self.link["latency"] + self.rng.random() * self.link["jitter"],
+                               udp_port(dest), data)
+                if self.rng.random() < self.link["dup"]:
+                    t += self.link["ack_wait"]  # ACK perdido: o quadro vai de novo
+                    continue
+                status = TransmitStatus.SUCCESS
+                break
+            self.link_free_at = t
+            self.stats["quadros"] += 1
+            self.stats["tentativas"] += attempts
+            self.stats["entregues"] += min(delivered, 1)
+            self.stats["duplicados"] += max(delivered - 1, 0)
+            if status != TransmitStatus.SUCCESS:
+                self.stats["falhas"] += 1
+        if wait:
+            delay = t - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return status, attempts - 1, t
+
+    def _schedule(self, due, port, item):
+        # port None = TX Status para os callbacks de pacote locais
+        with self.heap_cv:
+            self.order += 1
+            heapq.heappush(self.heap, (due, self.order, port, item))
+            self.heap_cv.notify()
+
+    def send_data(self, remote, data, transmit_options=None):
+        status, _, _ = self._transmit(remote.get_64bit_addr(), data, wait=True)
+        if status == TransmitStatus.PAYLOAD_TOO_LARGE:
+            raise XBeeException(f"Payload maior que NP ({self.link['max_payload']} bytes)")
+
+    def send_data_async(self, remote, data, transmit_options=None):
+        self._transmit(remote.get_64bit_addr(), data, wait=False)
+
+    def send_packet(self, packet, sync=False):
+        """Só quadros de transmissão (TransmitPacket/TX64Packet); o TX Status vai para os callbacks de pacote."""
+        dest = packet.x64bit_dest_addr
+        status, retries, t_status = self._transmit(dest, packet.rf_data or b"", wait=sync)
+        if packet.frame_id:
+            st = TransmitStatusPacket(packet.frame_id, XBee16BitAddress.UNKNOWN_ADDRESS, retries, status)
+            self._schedule(t_status, None, st)
+
+    # --- threads ---------------------------------------------------------
+
+    def _wire_loop(self):
+        # entrega no instante agendado: datagrama para o destino ou TX Status local
+        while self.running:
+            with self.heap_cv:
+                while self.running and not self.heap:
+                    self.heap_cv.wait(0.2)
+                if not self.running:
+                    return
+                due, _, port, item = self.heap[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self.heap_cv.wait(delay)
+                    continue
+                heapq.heappop(self.heap)
+            if port is None:
+                for cb in list(self.packet_callbacks):
+                    cb(item)
+            else:
+                self.sock.sendto(self.x64.address + item, (HOST, port))
+
+    def _rx_loop(self):
+        while self.running:
+            try:
+                pkt = self.sock.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            if len(pkt) < 8:
+                continue
+            remote = VirtualRemoteXBeeDevice(self, XBee64BitAddress(pkt[:8]))
+            msg = XBeeMessage(bytearray(pkt[8:]), remote, time.time())
+            for cb in list(self.data_callbacks):
+                try:
+                    cb(msg)
+                except Exception as e:
+                    print("Erro no callback:", e)
+
+
+def make_device(port, baud_rate):
+    """XBeeDevice real, o virtual se a porta for 'sim:...' ou o parser enxuto se for 'raw:...'."""
+    if is_virtual(port):
+        return VirtualXBeeDevice(port, baud_rate)
+    if api_frames.is_raw(port):
+        return api_frames.RawXBeeDevice(port, baud_rate)
+    from digi.xbee.devices import XBeeDevice
+    return XBeeDevice(port, baud_rate)
+
+
+def make_remote(device, remote_addr):
+    if isinstance(device, VirtualXBeeDevice):
+        return VirtualRemoteXBeeDevice(device, remote_addr)
+    if isinstance(device, api_frames.RawXBeeDevice):
+        return remote_addr
+    from digi.xbee.devices import RemoteXBeeDevice
+    return RemoteXBeeDevice(device, XBee64BitAddress.from_hex_string(remote_addr))
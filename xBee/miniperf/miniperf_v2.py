@@ -11,12 +11,6 @@ from digi.xbee.devices import XBeeDevice, RemoteXBeeDevice, XBee64BitAddress
 # BAUD_RATE = 115200
 # CSV_FILE = "relatorio.csv"
 
-dev = XBeeDevice("/dev/ttyUSB0", 115200)
-dev.open()
-print(dev.get_64bit_addr())
-dev.close()
-
-
 SESSION_COUNTER_FILE = "session_counter.txt"
 
 def load_session_counter() -> int:
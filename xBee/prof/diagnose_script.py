@@ -1,55 +1,216 @@
+#!/usr/bin/env python3
+# diagnose_script.py — inventário de todos os XBee ligados na máquina
+#
+# Cada porta serial candidata é examinada numa thread própria, então o tempo
+# total é o de uma porta, não portas x comandos. Em cada porta:
+#   1. modo API: para cada baud, um único write com todos os comandos AT em
+#      quadros 0x08 e espera pelas respostas 0x88 proporcional ao baud (o lote
+#      e as respostas atravessam a UART; ~0,33 s a 9600) — não tem guard time;
+#   2. se nenhum baud respondeu, modo AT (transparente): silêncio de GT, "+++",
+#      OK, e todos os comandos numa só linha "ATSH,SL,ID,...", depois ATCN.
+# Resultado: endereço 64 bits, PAN, firmware/hardware, RSSI do último pacote,
+# AP, canal e NI de cada módulo, na tela e, com --json, em arquivo.
 import serial
+import serial.tools.list_ports
+import glob
+import json
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-def send_at_command(ser, command):
-    """Envia um comando AT e retorna a resposta"""
-    ser.write((command + "\r").encode('utf-8'))
-    time.sleep(0.1)
-    resposta = ser.readline().decode('utf-8').strip()
-    return resposta
+BAUDS = [9600, 115200, 57600, 38400, 19200, 230400]
+COMMANDS = ["SH", "SL", "ID", "VR", "HV", "DB", "AP", "CH", "NI"]
+GUARD_TIME = 1.0   # GT padrão do XBee (s)
+API_MARGIN = 0.1   # folga (s) além do tempo de UART do lote API e das respostas
+RESPONSE_BYTES = 150  # respostas 0x88 dos COMMANDS (NI de até 20 caracteres)
+NEEDS_ESCAPE = (0x7E, 0x7D, 0x11, 0x13)
 
-def main():
-    ser = serial.Serial(
-        port='/dev/ttyUSB0',
-        baudrate=9600,
-        timeout=1
-    )
 
-    if ser.is_open:
-        print(f"Conectado ao XBee em {ser.port}")
+def candidate_ports():
+    ports = [p.device for p in serial.tools.list_ports.comports()]
+    for pattern in ("/dev/ttyUSB*", "/dev/ttyACM*"):
+        ports += [p for p in glob.glob(pattern) if p not in ports]
+    return sorted(ports)
 
+
+def at_frame(frame_id, cmd):
+    body = bytes((0x08, frame_id)) + cmd.encode()
+    return bytes((0x7E, 0, len(body))) + body + bytes((0xFF - (sum(body) & 0xFF),))
+
+
+def api_batch():
+    """
+    Quadros 0x08 de todos os comandos, com frame_ids escolhidos para que
+    nenhum byte precise de escape: o mesmo lote vale para AP=1 e AP=2.
+    """
+    frames, ids, frame_id = [], {}, 1
+    for cmd in COMMANDS:
+        while any(b in NEEDS_ESCAPE for b in at_frame(frame_id, cmd)[1:]):
+            frame_id += 1
+        frames.append(at_frame(frame_id, cmd))
+        ids[frame_id] = cmd
+        frame_id += 1
+    return b"".join(frames), ids
+
+
+def parse_frames(raw, escaped):
+    """[(tipo, corpo)] dos quadros com checksum válido num bloco já lido."""
+    if escaped:
+        out, i = bytearray(), 0
+        while i < len(raw):
+            if raw[i] == 0x7D and i + 1 < len(raw):
+                out.append(raw[i + 1] ^ 0x20)
+                i += 2
+            else:
+                out.append(raw[i])
+                i += 1
+        raw = bytes(out)
+    frames, i = [], raw.find(0x7E)
+    while 0 <= i and i + 4 <= len(raw):
+        length = (raw[i + 1] << 8) | raw[i + 2]
+        end = i + 4 + length
+        if length and end <= len(raw) and sum(raw[i + 3:end]) & 0xFF == 0xFF:
+            frames.append((raw[i + 3], raw[i + 4:end - 1]))
+            i = raw.find(0x7E, end)
+        else:
+            i = raw.find(0x7E, i + 1)
+    return frames
+
+
+def format_value(cmd, value):
+    """Valor de um comando (bytes no modo API, texto hex no modo AT) para o inventário."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        if cmd == "NI":
+            return value
+        try:
+            value = bytes.fromhex(value.zfill(len(value) + len(value) % 2))
+        except ValueError:
+            return value
+    if cmd == "NI":
+        return value.decode("utf-8", "ignore")
+    if cmd in ("SH", "SL"):
+        return value.hex().upper().zfill(8)[-8:]
+    if cmd in ("DB", "AP"):
+        n = int.from_bytes(value, "big")
+        return -n if cmd == "DB" else n
+    return value.hex().upper()
+
+
+def api_wait(batch, baud):
+    """Espera pelas respostas de um lote: ida e volta na UART (8N1 = 10 bits/byte) + folga."""
+    return (len(batch) + RESPONSE_BYTES) * 10 / baud + API_MARGIN
+
+
+def probe_api(ser):
+    batch, ids = api_batch()
+    ser.reset_input_buffer()
+    ser.write(batch)
+    deadline = time.monotonic() + api_wait(batch, ser.baudrate)
+    raw = b""
+    while time.monotonic() < deadline:
+        raw += ser.read(ser.in_waiting or 1)
+        if len(parse_frames(raw, False)) >= len(ids):
+            break  # todas as respostas chegaram: não espera o resto do prazo
+    best = {}
+    for escaped in (False, True):
+        values = {}
+        for ftype, body in parse_frames(raw, escaped):
+            if ftype == 0x88 and len(body) >= 4 and body[0] in ids:
+                # frame_id, comando(2), status, valor; status != 0 = erro (ex.: DB sem pacote recebido)
+                values[ids[body[0]]] = bytes(body[4:]) if body[3] == 0 else None
+        if len(values) > len(best):
+            best = values
+    return best
+
+
+def probe_at(ser, guard, last_write):
+    # silêncio de GT antes do +++ (contando desde o último byte enviado)
+    time.sleep(max(0.0, last_write + guard - time.monotonic()))
+    ser.reset_input_buffer()
+    ser.write(b"+++")
+    ser.timeout = guard + 0.5
+    if b"OK" not in ser.read_until(b"\r"):
+        return None
+    ser.timeout = 0.5
+    ser.write(("AT" + ",".join(COMMANDS) + "\r").encode())
+    values = {}
+    for cmd in COMMANDS:
+        line = ser.read_until(b"\r").decode("utf-8", "ignore").strip()
+        values[cmd] = None if line in ("", "ERROR") else line
+    ser.write(b"ATCN\r")
+    ser.read_until(b"\r")
+    return values
+
+
+def diagnose(port, bauds, guard):
+    result = {"porta": port, "baud": None, "modo": None, "erro": None}
+    last_write = 0.0  # bytes em baud errado também contam como "não silêncio" para o módulo
     try:
-        # Entrar no modo de comando
-        time.sleep(1)
-        ser.write(b"+++")
-        time.sleep(1)
-        resposta = ser.read(10).decode('utf-8').strip()
-        if "OK" not in resposta:
-            print("Falha ao entrar no modo de comando. Resposta:", resposta)
-            return
-        print("Entrou no modo de comando AT.")
-
-        # Coletar informações
-        sh = send_at_command(ser, "ATSH")
-        sl = send_at_command(ser, "ATSL")
-        dh = send_at_command(ser, "ATDH")
-        dl = send_at_command(ser, "ATDL")
-        pan_id = send_at_command(ser, "ATID")
-
-        # Mostrar resultados
-        print("\n--- Diagnóstico do XBee ---")
-        print(f"Endereço do Nó (SH+SL): {sh}{sl}")
-        print(f"Endereço de Destino (DH+DL): {dh}{dl}")
-        print(f"PAN ID: {pan_id}")
-
-        # Sair do modo de comando
-        send_at_command(ser, "ATCN")
-
-    except KeyboardInterrupt:
-        print("\nInterrompido pelo usuário.")
-    finally:
-        ser.close()
-        print("Conexão fechada.")
+        for baud in bauds:
+            with serial.Serial(port, baud, timeout=0.05) as ser:
+                values = probe_api(ser)
+                last_write = time.monotonic()
+            if values:
+                result.update(baud=baud, modo="API")
+                break
+        else:
+            for baud in bauds:
+                with serial.Serial(port, baud, timeout=0.05) as ser:
+                    values = probe_at(ser, guard, last_write)
+                    last_write = time.monotonic()
+                if values:
+                    result.update(baud=baud, modo="AT")
+                    break
+            else:
+                result["erro"] = "nenhuma resposta"
+                return result
+    except (serial.SerialException, OSError) as e:
+        result["erro"] = str(e)
+        return result
+    v = {cmd: format_value(cmd, values.get(cmd)) for cmd in COMMANDS}
+    result.update({
+        "endereco64": (v["SH"] or "") + (v["SL"] or "") or None,
+        "pan": v["ID"],
+        "firmware": v["VR"],
+        "hardware": v["HV"],
+        "rssi_dbm": v["DB"],
+        "ap": v["AP"],
+        "canal": v["CH"],
+        "ni": v["NI"],
+    })
+    return result
+
+
+def main(ports=None, bauds=BAUDS, guard=GUARD_TIME, json_path=None):
+    ports = ports or candidate_ports()
+    if not ports:
+        print("Nenhuma porta serial encontrada.")
+        return []
+    print(f"Examinando {len(ports)} portas: {', '.join(ports)}")
+    inicio = time.monotonic()
+    with ThreadPoolExecutor(max_workers=len(ports)) as pool:
+        inventario = list(pool.map(lambda p: diagnose(p, bauds, guard), ports))
+    print(f"\n--- Diagnóstico dos XBee ({time.monotonic() - inicio:.1f} s) ---")
+    for r in inventario:
+        if r["erro"]:
+            print(f"{r['porta']}: {r['erro']}")
+            continue
+        rssi = f"{r['rssi_dbm']} dBm" if r["rssi_dbm"] is not None else "?"
+        print(f"{r['porta']}: {r['endereco64']} | PAN {r['pan']} | FW {r['firmware']} HW {r['hardware']} | "
+              f"RSSI {rssi} | {r['modo']} (AP={r['ap']}) @ {r['baud']} | CH {r['canal']} | NI '{r['ni'] or ''}'")
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(inventario, f, indent=2, ensure_ascii=False)
+        print(f"Inventário salvo em {json_path}")
+    return inventario
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ports", nargs="*", help="Portas a examinar (padrão: todas as seriais encontradas)")
+    ap.add_argument("--bauds", type=int, nargs="+", default=BAUDS, help="Bauds a tentar, na ordem")
+    ap.add_argument("--guard", type=float, default=GUARD_TIME, help="Guard time (GT) dos módulos em s")
+    ap.add_argument("--json", default=None, help="Grava o inventário neste arquivo")
+    a = ap.parse_args()
+    main(a.ports, a.bauds, a.guard, a.json)
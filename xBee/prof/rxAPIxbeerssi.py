@@ -1,31 +1,167 @@
 #!/usr/bin/env python3
-# rx_xbee_rssi.py — RX via digi-xbee com RSSI (ATDB)
-from digi.xbee.devices import ZigBeeDevice
+# rx_xbee_rssi.py — RX via digi-xbee com RSSI por origem
+#
+# O RSSI não é mais lido com ATDB a cada mensagem (um comando AT local por
+# quadro, que corta pela metade a taxa de drenagem e ainda devolve o RSSI do
+# "último pacote bom", que sob carga pode ser outro):
+#   - frame : quadros RX 64/16 bits do 802.15.4 (0x80/0x81) já trazem o RSSI
+#             do próprio pacote;
+#   - sample: uma thread lê DB a --db-rate Hz e cada mensagem recebe a amostra
+#             mais próxima no tempo (para quadros sem RSSI, ex. Zigbee 0x90);
+#   - auto  : RSSI do quadro quando houver, senão a amostra.
+# Os valores são agregados em memória por origem (mín/média/p95/máx) e o
+# resumo sai a cada --report s e ao encerrar, não uma linha por pacote.
+from digi.xbee.devices import XBeeDevice
+from collections import Counter, deque
+import threading
 import time
 
-def main(port="/dev/ttyUSB0", baud=9600):
-    dev = ZigBeeDevice(port, baud)
+
+class RssiStats:
+    """Histograma por origem: RSSI é inteiro em dBm, então o p95 sai exato do Counter."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hist = {}       # origem -> Counter(dBm -> n)
+        self.pacotes = Counter()
+        self.sem_rssi = Counter()
+
+    def add(self, src, rssi):
+        with self.lock:
+            self.pacotes[src] += 1
+            if rssi is None:
+                self.sem_rssi[src] += 1
+            else:
+                self.hist.setdefault(src, Counter())[rssi] += 1
+
+    def rows(self):
+        """(origem, pacotes, com_rssi, mín, média, p95, máx); p95 é o do sinal mais fraco."""
+        with self.lock:
+            out = []
+            for src in sorted(self.pacotes):
+                h = self.hist.get(src)
+                n = sum(h.values()) if h else 0
+                if not n:
+                    out.append((src, self.pacotes[src], 0, None, None, None, None))
+                    continue
+                media = sum(v * c for v, c in h.items()) / n
+                # RSSI negativo: 95% dos pacotes chegaram com sinal >= p95
+                acc, p95 = 0, None
+                for v in sorted(h, reverse=True):
+                    acc += h[v]
+                    if acc >= 0.95 * n:
+                        p95 = v
+                        break
+                out.append((src, self.pacotes[src], n, min(h), media, p95, max(h)))
+            return out
+
+    def print(self):
+        print(f"[{time.strftime('%H:%M:%S')}] RSSI por origem (dBm)")
+        for src, total, n, mn, media, p95, mx in self.rows():
+            if n:
+                print(f"  {src}: {total} pacotes, {n} com RSSI | mín {mn} média {media:.1f} p95 {p95} máx {mx}")
+            else:
+                print(f"  {src}: {total} pacotes, sem RSSI")
+
+
+class DbSampler(threading.Thread):
+    """
+    Lê ATDB a `rate` Hz. Mensagens sem RSSI no quadro ficam pendentes até
+    existir uma amostra posterior a elas e então recebem a mais próxima
+    (a anterior ou a posterior).
+    """
+
+    def __init__(self, dev, stats, rate):
+        super().__init__(daemon=True)
+        self.dev = dev
+        self.stats = stats
+        self.period = 1.0 / rate
+        self.pending = deque()   # (t_chegada, origem)
+        self.lock = threading.Lock()
+        self.last = None         # (t, rssi) da amostra anterior
+        self.stop_event = threading.Event()
+        self.erros = 0
+
+    def tag(self, t, src):
+        with self.lock:
+            self.pending.append((t, src))
+
+    def _read_db(self):
+        try:
+            db = self.dev.get_parameter("DB")  # bytes, p.ex. b'\x2C' -> -44 dBm
+            return -db[0] if db else None
+        except Exception:
+            self.erros += 1
+            return None
+
+    def _resolve(self, t_s, rssi):
+        with self.lock:
+            while self.pending and self.pending[0][0] <= t_s:
+                t, src = self.pending.popleft()
+                valor = rssi
+                if self.last is not None and t - self.last[0] < t_s - t:
+                    valor = self.last[1]
+                self.stats.add(src, valor)
+            self.last = (t_s, rssi)
+
+    def run(self):
+        next_t = time.monotonic()
+        while not self.stop_event.is_set():
+            rssi = self._read_db()
+            self._resolve(time.monotonic(), rssi)
+            next_t += self.period
+            self.stop_event.wait(max(0.0, next_t - time.monotonic()))
+
+    def stop(self):
+        self.stop_event.set()
+        self.join(timeout=2)
+        # o que sobrou fica com a última amostra
+        with self.lock:
+            ultima = self.last[1] if self.last else None
+            while self.pending:
+                self.stats.add(self.pending.popleft()[1], ultima)
+
+
+def main(port="/dev/ttyUSB0", baud=9600, mode="auto", db_rate=2.0, report=5.0):
+    dev = XBeeDevice(port, baud)
+    stats = RssiStats()
+    sampler = None
+
+    def on_packet(packet):
+        data = getattr(packet, "rf_data", None)
+        if data is None:
+            return  # TX Status, resposta AT etc.
+        t = time.monotonic()
+        src = getattr(packet, "x64bit_source_addr", None) or getattr(packet, "x16bit_source_addr", None)
+        src = str(src)
+        rssi = getattr(packet, "rssi", None)  # só nos quadros RX do 802.15.4
+        if rssi is not None and mode != "sample":
+            stats.add(src, -rssi)
+        elif sampler is not None:
+            sampler.tag(t, src)
+        else:
+            stats.add(src, None)
+
     try:
         dev.open()
-        print(f"RX em {port} @ {baud} usando digi-xbee")
+        if mode != "frame":
+            sampler = DbSampler(dev, stats, db_rate)
+            sampler.start()
+        dev.add_packet_received_callback(on_packet)
+        print(f"RX em {port} @ {baud} usando digi-xbee (RSSI: {mode})")
         while True:
-            msg = dev.read_data(timeout=10)   # XBeeMessage ou None
-            if msg is None:
-                continue
-            src64 = msg.remote_device.get_64bit_addr()
-            data  = msg.data
-            try:
-                txt = data.decode("utf-8","ignore")
-            except:
-                txt = ""
-            # RSSI do último pacote bom
-            db = dev.get_parameter("DB")  # bytes, p.ex. b'\x2C' -> -44 dBm
-            rssi = -db[0] if (db and len(db)>=1) else None
-            if rssi is not None:
-                print(f"[{time.strftime('%H:%M:%S')}] RX de {src64}: '{txt}' | RSSI={rssi} dBm | {data.hex().upper()}")
-            else:
-                print(f"[{time.strftime('%H:%M:%S')}] RX de {src64}: '{txt}' | RSSI=? | {data.hex().upper()}")
+            time.sleep(report)
+            stats.print()
+    except KeyboardInterrupt:
+        pass
     finally:
+        try: dev.del_packet_received_callback(on_packet)
+        except: pass
+        if sampler is not None:
+            sampler.stop()
+            if sampler.erros:
+                print(f"{sampler.erros} leituras de DB falharam")
+        stats.print()
         try: dev.close()
         except: pass
 
@@ -34,5 +170,9 @@ if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("--port", default="/dev/ttyUSB0")
     ap.add_argument("--baud", type=int, default=9600)
+    ap.add_argument("--rssi", choices=["auto", "frame", "sample"], default="auto",
+                    help="frame: RSSI do quadro RX (802.15.4); sample: ATDB amostrado; auto: quadro ou amostra")
+    ap.add_argument("--db-rate", type=float, default=2.0, help="Leituras de ATDB por segundo (modos sample/auto)")
+    ap.add_argument("--report", type=float, default=5.0, help="Segundos entre resumos")
     a = ap.parse_args()
-    main(a.port, a.baud)
+    main(a.port, a.baud, a.rssi, a.db_rate, a.report)